@@ -0,0 +1,204 @@
+"""
+.. module:: AsyncReceiver
+    :platform: Unix, Windows
+    :synopsis: Receive and decode many UDP streams in one asyncio event loop
+
+.. moduleauthor:: Diarmuid Collins <dcollins@curtisswright.com>
+
+"""
+
+__author__ = "Diarmuid Collins"
+__maintainer__ = "Diarmuid Collins"
+__email__ = "dcollins@curtisswright.com"
+__status__ = "Production"
+
+
+import typing
+import asyncio
+import logging
+from collections import deque
+import AcraNetwork.McastSocket as mcast
+
+
+logger = logging.getLogger(__name__)
+
+
+class PacketReceiver(asyncio.DatagramProtocol):
+    """
+    An asyncio datagram protocol that decodes each datagram received into a packet_class object, such as
+    :class:`AcraNetwork.iNetX.iNetX`, :class:`AcraNetwork.IENA.IENA`,
+    :class:`AcraNetwork.IRIG106.Chapter10.Chapter10UDP.Chapter10UDP` or
+    :class:`AcraNetwork.IRIG106.Chapter24.TmNSMessage`, and queues it to be read with ``async for``.
+
+    The queue holds at most maxsize packets. When it is full, reading from the socket is paused until the queue is
+    half empty, so a slow consumer leaves the datagrams in the socket receive buffer rather than using more memory.
+    Where the transport can not be paused, packets arriving to a full queue are dropped and counted.
+
+    Use :func:`open_receiver` to create one on a multicast group.
+
+    >>> import AcraNetwork.iNetX as inetx
+    >>> async def main():
+    ...     receiver = await open_receiver(inetx.iNetX, 0)
+    ...     port = receiver.sockname[1]
+    ...     sender = mcast.McastSocket()
+    ...     for sequence in range(3):
+    ...         sender.sendto(inetx.iNetX().pack(), ("127.0.0.1", port))
+    ...     async for packet in receiver:
+    ...         print(packet.packetlen)
+    ...         if receiver.received == 3 and not len(receiver):
+    ...             receiver.close()
+    ...     sender.close()
+    >>> asyncio.run(main())
+    28
+    28
+    28
+
+    :param packet_class: The class to decode the datagrams. Its unpack method is passed the UDP payload
+    :type packet_class: type
+    :param maxsize: The maximum number of decoded packets queued
+    :type maxsize: int
+    """
+
+    def __init__(self, packet_class: type, maxsize: int = 1024):
+        if maxsize < 1:
+            raise ValueError("maxsize should be at least 1")
+        self.packet_class: type = packet_class  #: The class that decodes the datagrams
+        self.maxsize: int = maxsize  #: The maximum number of packets queued
+        self.received: int = 0  #: Number of datagrams received
+        self.decode_errors: int = 0  #: Number of datagrams that packet_class failed to unpack
+        self.dropped: int = 0  #: Number of packets dropped because the queue was full
+        self.pauses: int = 0  #: Number of times reading was paused because the queue was full
+        self._queue: typing.Deque = deque()
+        self._waiter: typing.Optional[asyncio.Future] = None
+        self._transport: typing.Optional[asyncio.DatagramTransport] = None
+        self._paused = False
+        self._can_pause = True
+        self._closed = False
+
+    def __len__(self) -> int:
+        return len(self._queue)
+
+    @property
+    def sockname(self) -> typing.Tuple[str, int]:
+        """The local address and port of the socket"""
+        return self._transport.get_extra_info("sockname")
+
+    def _wakeup(self) -> None:
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+
+    def connection_made(self, transport: asyncio.DatagramTransport) -> None:
+        self._transport = transport
+
+    def connection_lost(self, exc: typing.Optional[Exception]) -> None:
+        self._closed = True
+        self._wakeup()
+
+    def error_received(self, exc: Exception) -> None:
+        logger.warning(f"Error on receiving socket. err={exc}")
+
+    def datagram_received(self, data: bytes, addr: typing.Tuple[str, int]) -> None:
+        self.received += 1
+        if len(self._queue) >= self.maxsize:
+            self.dropped += 1
+            return
+        packet = self.packet_class()
+        try:
+            packet.unpack(data)
+        except Exception as e:  # The decoders raise ValueError, struct.error or Exception
+            self.decode_errors += 1
+            logger.debug(f"Failed to unpack datagram from {addr} as {self.packet_class.__name__}. err={e}")
+            return
+        self._queue.append(packet)
+        if len(self._queue) >= self.maxsize and self._can_pause:
+            try:
+                self._transport.pause_reading()
+            except (AttributeError, NotImplementedError):
+                # Datagram transports before Python 3.11 inherit a pause_reading that is not implemented
+                self._can_pause = False
+            else:
+                self._paused = True
+                self.pauses += 1
+        self._wakeup()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        while not self._queue:
+            if self._closed:
+                raise StopAsyncIteration
+            self._waiter = asyncio.get_running_loop().create_future()
+            try:
+                await self._waiter
+            finally:
+                self._waiter = None
+        packet = self._queue.popleft()
+        if self._paused and len(self._queue) <= self.maxsize // 2:
+            self._paused = False
+            if not self._closed:
+                self._transport.resume_reading()
+        return packet
+
+    def close(self) -> None:
+        """
+        Close the socket. The packets already queued are still returned before the iteration stops
+        """
+        if self._transport is not None:
+            self._transport.close()
+
+
+async def open_receiver(
+    packet_class: type,
+    port: int,
+    group: typing.Optional[str] = None,
+    maxsize: int = 1024,
+) -> PacketReceiver:
+    """
+    Bind a :class:`AcraNetwork.McastSocket.McastSocket` to port, optionally join a multicast group, and return a
+    :class:`PacketReceiver` that decodes its datagrams in the running event loop. Open one per stream and consume
+    them in separate tasks, so a single thread can service many streams.
+
+    >>> import AcraNetwork.IENA as iena
+    >>> async def count(receiver, results):
+    ...     async for packet in receiver:
+    ...         results.append(packet.key)
+    >>> async def main():
+    ...     receivers = [await open_receiver(iena.IENA, 0) for i in range(3)]
+    ...     sender = mcast.McastSocket()
+    ...     for key, receiver in enumerate(receivers):
+    ...         p = iena.IENA()
+    ...         (p.key, p.keystatus, p.status, p.sequence, p.endfield, p.payload) = (key, 0, 0, 0, 0xDEAD, bytes(4))
+    ...         sender.sendto(p.pack(), ("127.0.0.1", receiver.sockname[1]))
+    ...     results = []
+    ...     tasks = [asyncio.create_task(count(r, results)) for r in receivers]
+    ...     await asyncio.sleep(0.1)
+    ...     for r in receivers:
+    ...         r.close()
+    ...     await asyncio.gather(*tasks)
+    ...     sender.close()
+    ...     return sorted(results)
+    >>> asyncio.run(main())
+    [0, 1, 2]
+
+    :param packet_class: The class to decode the datagrams, eg :class:`AcraNetwork.iNetX.iNetX`
+    :type packet_class: type
+    :param port: The UDP port to bind to. 0 for any free port
+    :type port: int
+    :param group: The multicast address to join
+    :type group: str
+    :param maxsize: The maximum number of decoded packets queued
+    :type maxsize: int
+    :rtype: PacketReceiver
+    """
+    sock = mcast.McastSocket(local_port=port, reuse=True)
+    try:
+        if group is not None:
+            sock.mcast_add(group)
+        sock.setblocking(False)
+        loop = asyncio.get_running_loop()
+        (_, protocol) = await loop.create_datagram_endpoint(lambda: PacketReceiver(packet_class, maxsize), sock=sock)
+    except Exception:
+        sock.close()
+        raise
+    return protocol
@@ -13,13 +13,23 @@ __email__ = "dcollins@curtisswright.com"
 __status__ = "Production"
 
 
+import abc
 import struct
+import warnings
 import datetime
 import time
 from collections import namedtuple
 import typing
 
 
+class IENAHeader(namedtuple("IENAHeader", "key, size, timeusec, keystatus, status, sequence")):
+    """
+    The header fields of an IENA packet, returned by :meth:`IENA.peek_header`
+    """
+
+    __slots__ = ()
+
+
 class IENA(object):
     """
     Class to :meth:`IENA.pack` and :meth:`IENA.unpack` IENA payloads.
@@ -59,8 +69,23 @@ class IENA(object):
 
     """
 
+    __slots__ = (
+        "_key",
+        "size",
+        "timeusec",
+        "keystatus",
+        "status",
+        "sequence",
+        "endfield",
+        "payload",
+        "_startOfYear",
+        "lengthError",
+        "_req_attr",
+    )
+
     IENA_HEADER_FORMAT = ">HHHIBBH"
     IENA_HEADER_LENGTH = struct.calcsize(IENA_HEADER_FORMAT)
+    _packetStrut = struct.Struct(IENA_HEADER_FORMAT)  # Shared by all instances
     TRAILER_LENGTH = 2
 
     REQ_ATTR = ("key", "timeusec", "keystatus", "status", "sequence", "endfield", "payload")
@@ -75,7 +100,6 @@ class IENA(object):
         self.endfield: int = 0xDEAD  #: Trailer field in the IENA packet
         self.payload: bytes = bytes()  #: Payload of the IENA packet
 
-        self._packetStrut = struct.Struct(IENA.IENA_HEADER_FORMAT)
         # only calculate this once TODO: This is wrong
         self._startOfYear = datetime.datetime(datetime.datetime.today().year, 1, 1, 0, 0, 0, 0)
         self.lengthError = True  # Flag to verify the buffer length
@@ -119,10 +143,11 @@ class IENA(object):
     def unpack(self, buf: bytes) -> bool:
         """
         Unpack a raw byte stream to an IENA object
-        Accepts a buffer to unpack as the required argument
+        Accepts a buffer to unpack as the required argument. A memoryview, such as the payload of a record from a
+        memory mapped :class:`AcraNetwork.Pcap.Pcap`, is not copied and the payload will be a view into it
 
         :param buf: The string buffer to unpack
-        :type buf: bytes
+        :type buf: bytes|memoryview
         :rtype: bool
         """
 
@@ -149,6 +174,29 @@ class IENA(object):
 
         return True
 
+    @staticmethod
+    def peek_header(buf: bytes, offset: int = 0) -> IENAHeader:
+        """
+        Decode only the header of an IENA packet, without creating an :class:`IENA` object, copying the payload or
+        reading the trailer. This is several times faster than :meth:`IENA.unpack` when only the key and sequence
+        number are needed, for example to route packets or check for losses. The size field is not checked
+
+        >>> from base64 import b64decode
+        >>> hdr = IENA.peek_header(b64decode('ANwADAAAAAAAAAAAAAIAAQACAAEAAN6t'))
+        >>> print(f"{hdr.key:#0X} {hdr.sequence} {hdr.size}")
+        0XDC 2 12
+
+        :param buf: The buffer containing the packet
+        :type buf: bytes|memoryview
+        :param offset: The offset of the IENA header in buf, eg 42 for an Ethernet frame
+        :type offset: int
+        :rtype: IENAHeader
+        """
+        if len(buf) < offset + IENA.IENA_HEADER_LENGTH:
+            raise ValueError("Buffer passed to peek_header is too small to be an IENA packet")
+        (key, size, timehi, timelo, keystatus, status, sequence) = IENA._packetStrut.unpack_from(buf, offset)
+        return IENAHeader(key, size, timelo + (timehi << 32), keystatus, status, sequence)
+
     def pack(self) -> bytes:
         """
         Pack the IENA payload into a binary string
@@ -206,6 +254,139 @@ class IENA(object):
         return len(self.pack())
 
 
+class _IENAParameters(IENA, metaclass=abc.ABCMeta):
+    """
+    The parameters of an IENA-M, IENA-Q, IENA-D or IENA-N packet.
+
+    Unpacking only records the offset of each parameter in the payload. A parameter is decoded when it is accessed, so
+    reading a few parameters of a large packet does not pay for the rest. Iterating or indexing the packet after
+    unpacking returns parameters whose datasets are memoryviews into the payload. The :attr:`parameters` list is built
+    on first use, with copies of the datasets, and can then be modified and packed. It is also built before the payload
+    is replaced, so the offsets never point into a different payload.
+    """
+
+    __slots__ = ("_parameters", "_offsets", "_paramids", "_payload", "_index")
+
+    _paramidStruct = struct.Struct(">H")
+
+    def __init__(self):
+        self._parameters = []
+        self._offsets = None  # The offset of each parameter in the payload until the parameter list is built
+        self._paramids = None  # The index of the first parameter with each paramid. Built on first use
+        self._index = 0  # The position of the deprecated next()
+        IENA.__init__(self)
+
+    @property
+    def payload(self) -> bytes:
+        """
+        Payload of the IENA packet
+        """
+        return self._payload
+
+    @payload.setter
+    def payload(self, payload: bytes):
+        if self._offsets is not None:
+            self.parameters  # Decode the parameters from the payload that they are in before it is replaced
+        self._payload = payload
+
+    def unpack(self, buf: bytes) -> bool:
+        # The parameters of the previous packet are replaced, so they are not decoded when the payload is
+        self._parameters, self._offsets, self._paramids = [], None, None
+        return IENA.unpack(self, buf)
+
+    @property
+    def parameters(self) -> list:
+        """
+        The list of all the parameters in the packet
+        """
+        if self._parameters is None:
+            self._parameters = [self._parameter_at(self.payload, offset) for offset in self._offsets]
+            self._offsets = self._paramids = None
+        return self._parameters
+
+    @parameters.setter
+    def parameters(self, parameters: list):
+        self._parameters = parameters
+        self._offsets = self._paramids = None
+
+    def _unpacked(self, offsets: typing.Sequence[int]) -> None:
+        """Record the offsets of the parameters found by unpack, instead of a list of parameters"""
+        self._offsets = offsets
+        self._parameters = self._paramids = None
+
+    @abc.abstractmethod
+    def _parameter_at(self, buf: bytes, offset: int):
+        """Decode the parameter at offset in the payload buf"""
+
+    def iter_parameters(self) -> typing.Iterator:
+        """
+        Iterate over the parameters, without building the :attr:`parameters` list. After :meth:`unpack` each parameter
+        is decoded as it is reached and the datasets are memoryviews into the payload, so nothing is copied.
+
+        :rtype: collections.Iterator
+        """
+        if self._parameters is not None:
+            return iter(self._parameters)
+        view = memoryview(self.payload)
+        return (self._parameter_at(view, offset) for offset in self._offsets)
+
+    def by_paramid(self, paramid: int):
+        """
+        Return the first parameter with a parameter ID. Integer keys index the packet by position, so this is the
+        lookup by parameter ID. After :meth:`unpack` the parameter IDs are indexed on the first call and each lookup
+        only decodes the parameter that is returned.
+
+        :param paramid: The parameter ID
+        :type paramid: int
+        :raises KeyError: If there is no parameter with this ID
+        """
+        if self._parameters is not None:
+            for parameter in self._parameters:
+                if parameter.paramid == paramid:
+                    return parameter
+            raise KeyError("No parameter with paramid {:#0X}".format(paramid))
+        if self._paramids is None:
+            paramids = [self._paramidStruct.unpack_from(self.payload, offset)[0] for offset in self._offsets]
+            # Reversed so that the first parameter with each paramid is the one kept
+            self._paramids = dict(zip(reversed(paramids), range(len(paramids) - 1, -1, -1)))
+        if paramid not in self._paramids:
+            raise KeyError("No parameter with paramid {:#0X}".format(paramid))
+        return self._parameter_at(memoryview(self.payload), self._offsets[self._paramids[paramid]])
+
+    def __iter__(self):
+        self._index = 0
+        return self.iter_parameters()
+
+    def next(self):
+        """
+        Deprecated. Return the next parameter after iter() was called on the packet. Use the iterator returned by
+        iter() or :meth:`iter_parameters` instead
+        """
+        warnings.warn(
+            "next() on an IENA packet is deprecated. Use the iterator returned by iter()", DeprecationWarning, 2
+        )
+        if self._index >= len(self):
+            raise StopIteration
+        parameter = self[self._index]
+        self._index += 1
+        return parameter
+
+    __next__ = next
+
+    def __len__(self):
+        if self._parameters is not None:
+            return len(self._parameters)
+        return len(self._offsets)
+
+    def __getitem__(self, key):
+        if self._parameters is not None:
+            return self._parameters[key]
+        view = memoryview(self.payload)
+        if isinstance(key, slice):
+            return [self._parameter_at(view, offset) for offset in self._offsets[key]]
+        return self._parameter_at(view, self._offsets[key])
+
+
 class MParameter(namedtuple("MParameter", "paramid, delay, dataset")):
     """
     The MParameter is a object representing each MParameter in an IENA-M packet
@@ -215,14 +396,14 @@ class MParameter(namedtuple("MParameter", "paramid, delay, dataset")):
     :param delay: The delay for this parameter
     :type delay: int
     :param dataset: The dataset payload as a string
-    :type dataset: bytes
+    :type dataset: bytes|memoryview
     """
 
     def __repr__(self):
         return "ParamID={:#0X} Delay={} Dataset Length={}".format(self.paramid, self.delay, len(self.dataset))
 
 
-class IENAM(IENA):
+class IENAM(_IENAParameters):
     """
     Support for IENA-M packets. Message Parameters with delay field
 
@@ -244,17 +425,23 @@ class IENAM(IENA):
     ...   print(param.paramid)
     1
 
+    Pick out parameters by position or by parameter ID, decoding only those
+
+    >>> print(i[0].delay, bytes(i.by_paramid(1).dataset))
+    2 b'\\x00'
+
+    :type parameters: list[MParameter]
     """
 
+    __slots__ = ()
+
     _FORMAT_ = ">HHH"
     _FORMAT_LEN_ = struct.calcsize(_FORMAT_)
+    _paramStruct = struct.Struct(_FORMAT_)
     REQ_ATTR = ("key", "timeusec", "keystatus", "status", "sequence", "endfield", "payload", "parameters")
 
     def __init__(self):
-        IENA.__init__(self)
-        self.parameters: typing.List[MParameter] = (
-            []
-        )  #: The list of all MParameters in thie IENA-M packet Each entry is of class :class:`MParameter`
+        _IENAParameters.__init__(self)
         self._req_attr = IENAM.REQ_ATTR
 
     def unpack(self, buf: bytes) -> None:
@@ -268,29 +455,28 @@ class IENAM(IENA):
         """
 
         super(IENAM, self).unpack(buf)
-        remaining_payload = self.payload
+        payload_length = len(self.payload)
+        offsets = []
+        offset = 0
 
-        while len(remaining_payload) > 0:
-            (_paramid, _delay, datasetlength) = struct.unpack(IENAM._FORMAT_, remaining_payload[: IENAM._FORMAT_LEN_])
+        while offset < payload_length:
+            (_paramid, _delay, datasetlength) = IENAM._paramStruct.unpack_from(self.payload, offset)
             # Check if we have enough payload in the remaining buffer
-            if len(remaining_payload) < IENAM._FORMAT_LEN_ + datasetlength:
+            if payload_length - offset < IENAM._FORMAT_LEN_ + datasetlength:
                 raise Exception(
                     "M Param dataset length {} larger than payload{}".format(
-                        datasetlength, len(remaining_payload[IENAM._FORMAT_LEN_ :])
+                        datasetlength, payload_length - offset - IENAM._FORMAT_LEN_
                     )
                 )
+            offsets.append(offset)
+            offset += IENAM._FORMAT_LEN_ + datasetlength + datasetlength % 2  # Datasets are padded to a word
 
-            mparam = MParameter(
-                paramid=_paramid,
-                delay=_delay,
-                dataset=remaining_payload[IENAM._FORMAT_LEN_ : IENAM._FORMAT_LEN_ + datasetlength],
-            )
-            self.parameters.append(mparam)
-            if datasetlength % 2 == 1:
-                padding = 1
-            else:
-                padding = 0
-            remaining_payload = remaining_payload[IENAM._FORMAT_LEN_ + datasetlength + padding :]
+        self._unpacked(offsets)
+
+    def _parameter_at(self, buf: bytes, offset: int) -> MParameter:
+        (_paramid, _delay, datasetlength) = IENAM._paramStruct.unpack_from(buf, offset)
+        offset += IENAM._FORMAT_LEN_
+        return MParameter(paramid=_paramid, delay=_delay, dataset=buf[offset : offset + datasetlength])
 
     def pack(self):
         """
@@ -298,13 +484,14 @@ class IENAM(IENA):
 
         :rtype: bytes
         """
-        self.payload = b""
-        for mparam in self:
+        payload = []
+        for mparam in self.parameters:
             datasetlength = len(mparam.dataset)
-            self.payload += struct.pack(IENAM._FORMAT_, mparam.paramid, mparam.delay, datasetlength)
-            self.payload += mparam.dataset
+            payload.append(IENAM._paramStruct.pack(mparam.paramid, mparam.delay, datasetlength))
+            payload.append(mparam.dataset)
             if datasetlength % 2 == 1:
-                self.payload += struct.pack(">B", 0)
+                payload.append(struct.pack(">B", 0))
+        self.payload = b"".join(payload)
 
         return super(IENAM, self).pack()
 
@@ -317,26 +504,6 @@ class IENAM(IENA):
 
         return txt
 
-    def __iter__(self):
-        self._index = 0
-        return self
-
-    def next(self):
-        if self._index < len(self.parameters):
-            _param = self.parameters[self._index]
-            self._index += 1
-            return _param
-        else:
-            raise StopIteration
-
-    __next__ = next
-
-    def __len__(self):
-        return len(self.parameters)
-
-    def __getitem__(self, key):
-        return self.parameters[key]
-
 
 class QParameter(namedtuple("QParameter", "paramid, dataset")):
     """
@@ -345,14 +512,14 @@ class QParameter(namedtuple("QParameter", "paramid, dataset")):
     :param paramid: The param ID for this parameter
     :type paramid: int
     :param dataset: The dataset payload as a string
-    :type dwords: bytes
+    :type dwords: bytes|memoryview
     """
 
     def __repr__(self):
         return "ParamID={:#0X} Dataset Length={}".format(self.paramid, len(self.dataset))
 
 
-class IENAQ(IENA):
+class IENAQ(_IENAParameters):
     """
     Support for IENA-Q packets. Message Parameters without delay field
 
@@ -374,17 +541,18 @@ class IENAQ(IENA):
     ...   print(param.paramid)
     2
 
+    :type parameters: list[QParameter]
     """
 
+    __slots__ = ()
+
     _FORMAT_ = ">HH"
     _FORMAT_LEN_ = struct.calcsize(_FORMAT_)
+    _paramStruct = struct.Struct(_FORMAT_)
     REQ_ATTR = ("key", "timeusec", "keystatus", "status", "sequence", "endfield", "payload", "parameters")
 
     def __init__(self):
-        IENA.__init__(self)
-        self.parameters = (
-            []
-        )  #: The list of all QParameters in thie IENA-Q packet Each entry is of class :class:`QParameter`
+        _IENAParameters.__init__(self)
         self._req_attr = IENAM.REQ_ATTR
 
     def unpack(self, buf: bytes):
@@ -398,27 +566,28 @@ class IENAQ(IENA):
         """
 
         super(IENAQ, self).unpack(buf)
-        remaining_payload = self.payload
+        payload_length = len(self.payload)
+        offsets = []
+        offset = 0
 
-        while len(remaining_payload) > 0:
-            (_paramid, datasetlength) = struct.unpack(IENAQ._FORMAT_, remaining_payload[: IENAQ._FORMAT_LEN_])
+        while offset < payload_length:
+            (_paramid, datasetlength) = IENAQ._paramStruct.unpack_from(self.payload, offset)
             # Check if we have enough payload in the remaining buffer
-            if len(remaining_payload) < IENAQ._FORMAT_LEN_ + datasetlength:
+            if payload_length - offset < IENAQ._FORMAT_LEN_ + datasetlength:
                 raise Exception(
                     "Q Param dataset length {} larger than payload{}".format(
-                        datasetlength, len(remaining_payload[IENAQ._FORMAT_LEN_ :])
+                        datasetlength, payload_length - offset - IENAQ._FORMAT_LEN_
                     )
                 )
+            offsets.append(offset)
+            offset += IENAQ._FORMAT_LEN_ + datasetlength + datasetlength % 2  # Datasets are padded to a word
 
-            qparam = QParameter(
-                paramid=_paramid, dataset=remaining_payload[IENAQ._FORMAT_LEN_ : IENAQ._FORMAT_LEN_ + datasetlength]
-            )
-            self.parameters.append(qparam)
-            if datasetlength % 2 == 1:
-                padding = 1
-            else:
-                padding = 0
-            remaining_payload = remaining_payload[IENAQ._FORMAT_LEN_ + datasetlength + padding :]
+        self._unpacked(offsets)
+
+    def _parameter_at(self, buf: bytes, offset: int) -> QParameter:
+        (_paramid, datasetlength) = IENAQ._paramStruct.unpack_from(buf, offset)
+        offset += IENAQ._FORMAT_LEN_
+        return QParameter(paramid=_paramid, dataset=buf[offset : offset + datasetlength])
 
     def pack(self) -> bytes:
         """
@@ -426,13 +595,14 @@ class IENAQ(IENA):
 
         :rtype: bytes
         """
-        self.payload = b""
-        for qparam in self:
+        payload = []
+        for qparam in self.parameters:
             datasetlength = len(qparam.dataset)
-            self.payload += struct.pack(IENAQ._FORMAT_, qparam.paramid, datasetlength)
-            self.payload += qparam.dataset
+            payload.append(IENAQ._paramStruct.pack(qparam.paramid, datasetlength))
+            payload.append(qparam.dataset)
             if datasetlength % 2 == 1:
-                self.payload += struct.pack(">B", 0)
+                payload.append(struct.pack(">B", 0))
+        self.payload = b"".join(payload)
 
         return super(IENAQ, self).pack()
 
@@ -445,26 +615,6 @@ class IENAQ(IENA):
 
         return txt
 
-    def __iter__(self):
-        self._index = 0
-        return self
-
-    def next(self):
-        if self._index < len(self.parameters):
-            _param = self.parameters[self._index]
-            self._index += 1
-            return _param
-        else:
-            raise StopIteration
-
-    __next__ = next
-
-    def __len__(self):
-        return len(self.parameters)
-
-    def __getitem__(self, key):
-        return self.parameters[key]
-
 
 class DParameter(namedtuple("DParameter", "paramid, delay, dwords")):
     """
@@ -479,7 +629,7 @@ class DParameter(namedtuple("DParameter", "paramid, delay, dwords")):
     """
 
 
-class IENAD(IENA):
+class IENAD(_IENAParameters):
     """
     Support for IENA-D packets. Std parameters with delay field
 
@@ -505,14 +655,14 @@ class IENAD(IENA):
     :type parameters: list[DParameter]
     """
 
+    __slots__ = ("_paramformat",)
+
     _FORMAT_ = ">HHH"
     REQ_ATTR = ("key", "timeusec", "keystatus", "status", "sequence", "endfield", "payload", "parameters")
 
     def __init__(self):
-        IENA.__init__(self)
-        self.parameters: typing.List[DParameter] = (
-            []
-        )  #: The list of all DParameters in thie IENA-D packet Each entry is of class :class:`DParameter`
+        _IENAParameters.__init__(self)
+        self._paramformat = None
         self._req_attr = IENAD.REQ_ATTR
 
     def unpack(self, buf: bytes):
@@ -537,43 +687,19 @@ class IENAD(IENA):
                 "Length IENA Payload={}".format(len_param_bytes, len(self.payload))
             )
 
-        # Loop through
-        for param in range(num_params):
-            try:
-                _dparams = struct.unpack_from(">{}H".format(dataword_count + 2), self.payload, param * len_param_bytes)
-            except Exception as e:
-                raise IndexError(
-                    "Could not unpack the payload from offset {}. Is the N2 field correct? "
-                    "Expected {} data words. Error={}".format(dataword_count, param * len_param_bytes, e)
-                )
-            dparam = DParameter(paramid=_dparams[0], delay=_dparams[1], dwords=list(_dparams[2:]))
-            self.parameters.append(dparam)
+        # The parameters are all the same size so the offsets are a range
+        self._paramformat = ">{}H".format(dataword_count + 2)
+        self._unpacked(range(0, len(self.payload), len_param_bytes))
+
+    def _parameter_at(self, buf: bytes, offset: int) -> DParameter:
+        _dparams = struct.unpack_from(self._paramformat, buf, offset)
+        return DParameter(paramid=_dparams[0], delay=_dparams[1], dwords=list(_dparams[2:]))
 
     def __repr__(self):
         return "IENAD: KEY={:#0X} SEQ={} TIMEUS={} NUM_DPARAM={}".format(
-            self.key, self.sequence, self.timeusec, len(self.parameters)
+            self.key, self.sequence, self.timeusec, len(self)
         )
 
-    def __iter__(self):
-        self._index = 0
-        return self
-
-    def next(self):
-        if self._index < len(self.parameters):
-            _param = self.parameters[self._index]
-            self._index += 1
-            return _param
-        else:
-            raise StopIteration
-
-    __next__ = next
-
-    def __len__(self):
-        return len(self.parameters)
-
-    def __getitem__(self, key):
-        return self.parameters[key]
-
 
 class NParameter(namedtuple("NParameter", "paramid, dwords")):
     """
@@ -586,7 +712,7 @@ class NParameter(namedtuple("NParameter", "paramid, dwords")):
     """
 
 
-class IENAN(IENA):
+class IENAN(_IENAParameters):
     """
     Support for IENA-N packets. Std parameters without delay field
 
@@ -615,14 +741,14 @@ class IENAN(IENA):
 
     """
 
+    __slots__ = ("_paramformat",)
+
     _FORMAT_ = ">HHH"
     REQ_ATTR = ("key", "timeusec", "keystatus", "status", "sequence", "endfield", "payload", "parameters")
 
     def __init__(self):
-        IENA.__init__(self)
-        self.parameters: typing.List[NParameter] = (
-            []
-        )  #: List of all N-type parameters. Each entry is of class :class:`NParameter`
+        _IENAParameters.__init__(self)
+        self._paramformat = None
         self._req_attr = IENAN.REQ_ATTR
 
     def unpack(self, buf: bytes) -> None:
@@ -649,39 +775,15 @@ class IENAN(IENA):
                 "Length IENA Payload={}".format(len_param_bytes, len(self.payload))
             )
 
-        # Loop through
-        for param in range(num_params):
-            try:
-                _nparams = struct.unpack_from(">{}H".format(dataword_count + 1), self.payload, param * len_param_bytes)
-            except Exception as e:
-                raise IndexError(
-                    "Could not unpack the payload from offset {}. Is the N2 field correct? "
-                    "Expected {} data words. Error={}".format(dataword_count, param * len_param_bytes, e)
-                )
-            nparam = NParameter(paramid=_nparams[0], dwords=list(_nparams[1:]))
-            self.parameters.append(nparam)
+        # The parameters are all the same size so the offsets are a range
+        self._paramformat = ">{}H".format(dataword_count + 1)
+        self._unpacked(range(0, len(self.payload), len_param_bytes))
+
+    def _parameter_at(self, buf: bytes, offset: int) -> NParameter:
+        _nparams = struct.unpack_from(self._paramformat, buf, offset)
+        return NParameter(paramid=_nparams[0], dwords=list(_nparams[1:]))
 
     def __repr__(self):
         return "IENAN: KEY={:#0X} SEQ={} TIMEUS={} NUM_DPARAM={}".format(
             self.key, self.sequence, self.timeusec, len(self)
         )
-
-    def __iter__(self):
-        self._index = 0
-        return self
-
-    def next(self):
-        if self._index < len(self.parameters):
-            _param = self.parameters[self._index]
-            self._index += 1
-            return _param
-        else:
-            raise StopIteration
-
-    __next__ = next
-
-    def __len__(self):
-        return len(self.parameters)
-
-    def __getitem__(self, key):
-        return self.parameters[key]
@@ -12,6 +12,8 @@ class ARINC429DataWord(object):
 
     """
 
+    __slots__ = ("gaptime", "format_error", "parity_error", "bus_speed", "bus", "payload")
+
     LO_SPEED = 0  #: Bus speed constant
     HI_SPEED = 1  #: Bus speed constant
 
@@ -10,6 +10,8 @@ class CANMessage(object):
         object (_type_): _description_
     """
 
+    __slots__ = ("subchannel", "data_error", "format_error", "ipts")
+
     def __init__(self, ipts_source=TS_CH4):
         if ipts_source == TS_CH4:
             self.ipts = RTCTime()
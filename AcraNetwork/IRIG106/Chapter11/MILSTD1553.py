@@ -16,6 +16,8 @@ class MILSTD1553Message(object):
     :type payload: str
     """
 
+    __slots__ = ("blockstatus", "gaptimes", "length", "message", "ipts")
+
     def __init__(self, ipts_source: int = TS_CH4):
         if ipts_source == TS_CH4:
             self.ipts = RTCTime()
@@ -15,6 +15,17 @@ class PCMMinorFrame(object):
     Object that represents the PCM minor frame in a PCMPayload.
     """
 
+    __slots__ = (
+        "_ipts_source",
+        "throughput",
+        "intra_packet_data_header",
+        "minor_frame_data",
+        "alignment",
+        "syncword",
+        "sfid",
+        "ipts",
+    )
+
     TS_LEN = 8
     ALIGN_16b = 0
     ALIGN_32b = 1
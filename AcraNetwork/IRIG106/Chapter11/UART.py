@@ -26,6 +26,8 @@ class UARTDataWord(object):
     :type payload: str
     """
 
+    __slots__ = ("parity_error", "subchannel", "datalength", "_payload", "data_endianness", "ipts")
+
     def __init__(self, ipts_source=TS_CH4, data_endianness: int = Endianness.BIG):
         if ipts_source == TS_CH4:
             self.ipts = RTCTime()
@@ -214,6 +214,24 @@ class Chapter11(object):
 
     """
 
+    __slots__ = (
+        "syncpattern",
+        "channelID",
+        "packetlen",
+        "datalen",
+        "datatypeversion",
+        "sequence",
+        "_packetflag",
+        "datatype",
+        "relativetimecounter",
+        "ptptime",
+        "ts_source",
+        "payload",
+        "data_checksum_size",
+        "filler",
+        "has_secondary_header",
+    )
+
     SYNC_WORD = 0xEB25  # :(Object Constant) Sync word
 
     CH10_HDR_FORMAT = "<HHIIBBBBIHH"
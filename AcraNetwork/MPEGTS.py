@@ -33,6 +33,8 @@ class MPEGAdaptionExtension(object):
 
     """
 
+    __slots__ = ("ltw_flag", "piecewise_rate_flag", "seamless_splice_flag", "ltw", "piecewise", "seamless_splice")
+
     def __init__(self) -> None:
         self.ltw_flag: bool = False
         self.piecewise_rate_flag: bool = False
@@ -44,7 +46,7 @@ class MPEGAdaptionExtension(object):
     def __eq__(self, __value: object) -> bool:
         if not isinstance(__value, MPEGAdaptionExtension):
             return False
-        for attr in self.__dict__.keys():
+        for attr in self.__slots__:
             if getattr(self, attr) != getattr(__value, attr):
                 return False
         return True
@@ -118,6 +120,23 @@ class MPEGAdaption(object):
 
     """
 
+    __slots__ = (
+        "length",
+        "discontinutiy",
+        "random_access",
+        "es_priority",
+        "pcr_flag",
+        "opcr_flag",
+        "splicing_flag",
+        "transpart_flag",
+        "extension_flag",
+        "pcr",
+        "opcr",
+        "splice_countdown",
+        "private_data",
+        "adaption_extension",
+    )
+
     def __init__(self) -> None:
         self.length: int = 0
         self.discontinutiy: bool = False
@@ -137,7 +156,7 @@ class MPEGAdaption(object):
     def __eq__(self, __value: object) -> bool:
         if not isinstance(__value, MPEGAdaption):
             return False
-        for attr in self.__dict__.keys():
+        for attr in self.__slots__:
             if getattr(self, attr) != getattr(__value, attr):
                 return False
         return True
@@ -253,6 +272,19 @@ class MPEGPacket(object):
     It contains an header, in which there's a sync word, continuity counter, and a _payload
     """
 
+    __slots__ = (
+        "sync",
+        "pid",
+        "tei",
+        "pusi",
+        "transport_priority",
+        "tsc",
+        "adaption_ctrl",
+        "continuitycounter",
+        "payload",
+        "adaption_field",
+    )
+
     def __init__(self):
         self.sync: int = 0x47
         self.pid: int = 0
@@ -24,8 +24,110 @@
 # This is based on https://wiki.python.org/moin/UdpCommunication
 # -------------------------------------------------------------------------------
 
+import sys
+import errno
+import logging
 import socket
 import struct
+import select
+import typing
+import ctypes
+import ctypes.util
+
+logger = logging.getLogger(__name__)
+
+# Linux values, not exported by the socket module
+SO_RCVBUFFORCE = 33
+SO_TIMESTAMPNS = 35
+SO_RXQ_OVFL = 40
+MSG_WAITFORONE = 0x10000
+
+_LINUX = sys.platform.startswith("linux")
+_TIMESPEC = struct.Struct("@ll")
+_DROPS = struct.Struct("@I")
+_CMSG_HEADER = struct.Struct("@Nii")  # cmsg_len, cmsg_level, cmsg_type
+_TIMESTAMP_CMSG = struct.Struct("@Niill")  # A cmsg header followed by a timespec
+_CMSG_ALIGN = ctypes.sizeof(ctypes.c_size_t)
+_TIMESTAMP_CMSG_SPACE = (_TIMESTAMP_CMSG.size + _CMSG_ALIGN - 1) & ~(_CMSG_ALIGN - 1)
+_CONTROL_SIZE = 64  # Ancillary data space for each datagram
+_SOCKADDR_SIZE = 16
+_SOCKADDR_IN = struct.Struct(">2x6s8x")  # The port and address of a sockaddr_in
+_SEND_BATCH = 1024  # The kernel limit on datagrams per sendmmsg (UIO_MAXIOV)
+
+
+class _IOVec(ctypes.Structure):
+    _fields_ = [("iov_base", ctypes.c_void_p), ("iov_len", ctypes.c_size_t)]
+
+
+class _MsgHdr(ctypes.Structure):
+    _fields_ = [
+        ("msg_name", ctypes.c_void_p),
+        ("msg_namelen", ctypes.c_uint32),
+        ("msg_iov", ctypes.POINTER(_IOVec)),
+        ("msg_iovlen", ctypes.c_size_t),
+        ("msg_control", ctypes.c_void_p),
+        ("msg_controllen", ctypes.c_size_t),
+        ("msg_flags", ctypes.c_int),
+    ]
+
+
+class _MMsgHdr(ctypes.Structure):
+    _fields_ = [("msg_hdr", _MsgHdr), ("msg_len", ctypes.c_uint)]
+
+
+# msg_controllen and msg_len of each mmsghdr, as updated by recvmmsg
+_CONTROLLEN_OFFSET = _MsgHdr.msg_controllen.offset
+_RECEIVED = struct.Struct(
+    "@{}xN{}xI{}x".format(
+        _CONTROLLEN_OFFSET,
+        _MMsgHdr.msg_len.offset - _CONTROLLEN_OFFSET - ctypes.sizeof(ctypes.c_size_t),
+        ctypes.sizeof(_MMsgHdr) - _MMsgHdr.msg_len.offset - ctypes.sizeof(ctypes.c_uint),
+    )
+)
+
+
+try:
+    if not _LINUX:
+        raise OSError("recvmmsg and sendmmsg are Linux only")
+    _libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+    _recvmmsg = _libc.recvmmsg
+    _recvmmsg.argtypes = [ctypes.c_int, ctypes.POINTER(_MMsgHdr), ctypes.c_uint, ctypes.c_int, ctypes.c_void_p]
+    _recvmmsg.restype = ctypes.c_int
+    _sendmmsg = _libc.sendmmsg
+    _sendmmsg.argtypes = [ctypes.c_int, ctypes.c_void_p, ctypes.c_uint, ctypes.c_int]
+    _sendmmsg.restype = ctypes.c_int
+except (OSError, AttributeError, TypeError):
+    _mmsg_available = False
+else:
+    _mmsg_available = True
+
+
+def _cmsgs(control: bytes) -> typing.Iterator[typing.Tuple[int, int, bytes]]:
+    """Split the raw ancillary data of a datagram into (level, type, data) like :meth:`socket.socket.recvmsg`"""
+    offset = 0
+    while offset + _CMSG_HEADER.size <= len(control):
+        (length, level, cmsg_type) = _CMSG_HEADER.unpack_from(control, offset)
+        if length < _CMSG_HEADER.size:
+            break
+        yield (level, cmsg_type, control[offset + _CMSG_HEADER.size : offset + length])
+        offset += (length + _CMSG_ALIGN - 1) & ~(_CMSG_ALIGN - 1)
+
+
+def _parse_ancillary(
+    ancdata: typing.Iterable[typing.Tuple[int, int, bytes]]
+) -> typing.Tuple[typing.Optional[int], typing.Optional[int]]:
+    """Return the SO_TIMESTAMPNS receive time in nanoseconds and the SO_RXQ_OVFL drop count, where present"""
+    timestamp = None
+    drops = None
+    for level, cmsg_type, data in ancdata:
+        if level != socket.SOL_SOCKET:
+            continue
+        if cmsg_type == SO_TIMESTAMPNS:
+            (sec, nsec) = _TIMESPEC.unpack_from(data)
+            timestamp = sec * 1_000_000_000 + nsec
+        elif cmsg_type == SO_RXQ_OVFL:
+            (drops,) = _DROPS.unpack_from(data)
+    return (timestamp, drops)
 
 
 class McastSocket(socket.socket):
@@ -38,14 +140,56 @@ class McastSocket(socket.socket):
     >>> recv_socket.sendto(bytes(3), ("235.0.0.2", 8010))
     3
 
+    At high packet rates use :meth:`McastSocket.recv_batch` and :meth:`McastSocket.send_batch`, which move many
+    datagrams per system call with recvmmsg and sendmmsg on Linux. Set rcvbuf so the kernel can hold a burst of
+    datagrams while the receiver is busy. On Linux, create the socket with drop_counting=True and check
+    :attr:`McastSocket.drops` to see if it was big enough, and with timestamps=True for recv_batch to return the kernel
+    receive time of each datagram. Both are off by default, as every datagram received then carries ancillary data.
+
+    :param local_port: The UDP port to bind to
+    :type local_port: int
+    :param reuse: Allow other sockets to bind to the same port
+    :type reuse: bool
+    :param rcvbuf: The socket receive buffer size to request, in bytes. See :meth:`McastSocket.set_receive_buffer`
+    :type rcvbuf: int
+    :param timestamps: Enable SO_TIMESTAMPNS, so recv_batch returns the kernel receive time of each datagram
+    :type timestamps: bool
+    :param drop_counting: Enable SO_RXQ_OVFL, so the datagrams dropped are counted in :attr:`McastSocket.drops`
+    :type drop_counting: bool
     """
 
-    def __init__(self, local_port=0, reuse=False):
+    def __init__(self, local_port=0, reuse=False, rcvbuf=None, timestamps=False, drop_counting=False):
         socket.socket.__init__(self, socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
         if reuse:
             self.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
 
         self.bind(("", local_port))
+        self._pool: typing.Optional[bytearray] = None  # Receive buffers, reused by every recv_batch call
+        self._pool_shape: typing.Tuple[int, int] = (0, 0)
+        self._headers = None
+        self._send_headers = None
+        self._send_address = None
+        self._addresses: typing.Dict[bytes, typing.Tuple[str, int]] = {}  # Decoded source addresses
+        self.timestamps: bool = False  #: The kernel receive timestamps are returned by recv_batch
+        self.drop_counting: bool = False  #: The kernel reports the datagrams dropped on this socket
+        #: Datagrams this socket has dropped because its receive buffer was full, if drop_counting is enabled. The
+        #: kernel reports the count with the next datagram queued after a drop, so it is updated by
+        #: :meth:`McastSocket.recv_batch` on that datagram
+        self.drops: int = 0
+        if _LINUX and timestamps:
+            try:
+                self.setsockopt(socket.SOL_SOCKET, SO_TIMESTAMPNS, 1)
+                self.timestamps = True
+            except OSError:
+                logger.warning("SO_TIMESTAMPNS is not supported. Receive timestamps are not available")
+        if _LINUX and drop_counting:
+            try:
+                self.setsockopt(socket.SOL_SOCKET, SO_RXQ_OVFL, 1)
+                self.drop_counting = True
+            except OSError:
+                logger.warning("SO_RXQ_OVFL is not supported. Dropped datagrams are not counted")
+        if rcvbuf is not None:
+            self.set_receive_buffer(rcvbuf)
 
     def mcast_add(self, addr, iface=socket.INADDR_ANY):
         """
@@ -59,3 +203,246 @@ class McastSocket(socket.socket):
 
         mreq = struct.pack("=4sl", socket.inet_aton(addr), socket.INADDR_ANY)
         self.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, mreq)
+
+    @property
+    def receive_buffer_size(self) -> int:
+        """
+        The usable socket receive buffer size granted by the kernel, in bytes. Linux reports double the size that was
+        set, as it counts its bookkeeping overhead, so the reported size is halved there
+
+        :rtype: int
+        """
+        size = self.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)
+        if _LINUX:
+            size //= 2
+        return size
+
+    def set_receive_buffer(self, size: int) -> int:
+        """
+        Request a socket receive buffer of size bytes, and return the usable size granted, as
+        :attr:`McastSocket.receive_buffer_size`. Linux limits the size to the net.core.rmem_max sysctl unless the
+        process has CAP_NET_ADMIN. A warning is logged if less than size was granted
+
+        >>> s = McastSocket()
+        >>> s.set_receive_buffer(100000) >= 100000
+        True
+
+        :param size: The size requested in bytes
+        :type size: int
+        :rtype: int
+        """
+        forced = False
+        if _LINUX:
+            try:
+                self.setsockopt(socket.SOL_SOCKET, SO_RCVBUFFORCE, size)
+                forced = True
+            except OSError:
+                pass
+        if not forced:
+            self.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, size)
+        granted = self.receive_buffer_size
+        if granted < size:
+            logger.warning(f"Requested a receive buffer of {size} bytes but was granted {granted}")
+        return granted
+
+    def _allocate(self, count: int, bufsize: int) -> None:
+        """Create the buffer pool and the recvmmsg structures pointing into it"""
+        self._pool = bytearray(count * bufsize)
+        self._pool_shape = (count, bufsize)
+        if not _mmsg_available:
+            return
+        pool = (ctypes.c_char * len(self._pool)).from_buffer(self._pool)
+        self._controls = ctypes.create_string_buffer(count * _CONTROL_SIZE)
+        self._names = ctypes.create_string_buffer(count * _SOCKADDR_SIZE)
+        self._iovecs = (_IOVec * count)()
+        self._headers = (_MMsgHdr * count)()
+        for i in range(count):
+            self._iovecs[i].iov_base = ctypes.addressof(pool) + i * bufsize
+            self._iovecs[i].iov_len = bufsize
+            hdr = self._headers[i].msg_hdr
+            hdr.msg_name = ctypes.addressof(self._names) + i * _SOCKADDR_SIZE
+            hdr.msg_namelen = _SOCKADDR_SIZE
+            hdr.msg_iov = ctypes.pointer(self._iovecs[i])
+            hdr.msg_iovlen = 1
+            hdr.msg_control = ctypes.addressof(self._controls) + i * _CONTROL_SIZE
+            hdr.msg_controllen = _CONTROL_SIZE
+        self._pool_buffer = pool  # Keeps the pool exported, so it can not be resized under the kernel
+        # recvmmsg overwrites msg_namelen and msg_controllen, so they are restored from this before each call
+        self._headers_reset = bytes(self._headers)
+
+    def _wait(self) -> None:
+        """Wait for a datagram for up to the socket timeout"""
+        timeout = self.gettimeout()
+        if timeout == 0:
+            raise BlockingIOError(errno.EAGAIN, "No datagram available")
+        (readable, _, _) = select.select([self], [], [], timeout)
+        if not readable:
+            raise socket.timeout("timed out")
+
+    def recv_batch(
+        self, count: int = 64, bufsize: int = 2048
+    ) -> typing.List[typing.Tuple[memoryview, typing.Tuple[str, int], typing.Optional[int]]]:
+        """
+        Receive up to count datagrams in one system call. This waits, for up to the socket timeout, for the first
+        datagram and then returns all those that are queued, up to count.
+
+        The datagrams are received into a pool of buffers allocated once and reused on every call, so the
+        memoryviews returned are only valid until the next call. Copy them with bytes() to keep them.
+
+        The timestamp is the kernel receive time in nanoseconds, so :meth:`AcraNetwork.Pcap.Pcap.write_raw_ns`
+        can be called with divmod(timestamp, 1_000_000_000). It is None unless the socket was created with
+        timestamps=True on a platform that supports SO_TIMESTAMPNS.
+
+        >>> s = McastSocket()
+        >>> s.settimeout(1)
+        >>> s.send_batch([b"a", b"bc"], ("127.0.0.1", s.getsockname()[1]))
+        2
+        >>> [bytes(data) for (data, address, timestamp) in s.recv_batch()]
+        [b'a', b'bc']
+
+        :param count: The maximum number of datagrams to return
+        :type count: int
+        :param bufsize: The size of each buffer. Longer datagrams are truncated
+        :type bufsize: int
+        :rtype: list[(memoryview, (str, int), int)]
+        """
+        if self._pool_shape != (count, bufsize):
+            self._allocate(count, bufsize)
+        if not _mmsg_available:
+            return self._recv_batch_fallback(count, bufsize)
+        while True:
+            ctypes.memmove(self._headers, self._headers_reset, len(self._headers_reset))
+            received = _recvmmsg(self.fileno(), self._headers, count, socket.MSG_DONTWAIT | MSG_WAITFORONE, None)
+            if received >= 0:
+                break
+            error = ctypes.get_errno()
+            if error not in (errno.EAGAIN, errno.EINTR):
+                raise OSError(error, f"recvmmsg failed. {errno.errorcode.get(error, '')}")
+            self._wait()
+
+        view = memoryview(self._pool)
+        names = self._names.raw
+        controls = self._controls
+        addresses = self._addresses
+        datagrams = []
+        offset = 0
+        headers = ctypes.string_at(self._headers, received * ctypes.sizeof(_MMsgHdr))
+        for i, (controllen, length) in enumerate(_RECEIVED.iter_unpack(headers)):
+            (name,) = _SOCKADDR_IN.unpack_from(names, i * _SOCKADDR_SIZE)
+            address = addresses.get(name)
+            if address is None:
+                address = addresses[name] = (socket.inet_ntoa(name[2:]), int.from_bytes(name[:2], "big"))
+            timestamp = None
+            if controllen == _TIMESTAMP_CMSG_SPACE:
+                # The timestamp is the only ancillary data until the socket drops a datagram
+                (_, level, cmsg_type, sec, nsec) = _TIMESTAMP_CMSG.unpack_from(controls, i * _CONTROL_SIZE)
+                if level == socket.SOL_SOCKET and cmsg_type == SO_TIMESTAMPNS:
+                    timestamp = sec * 1_000_000_000 + nsec
+            if controllen and timestamp is None:
+                control = controls[i * _CONTROL_SIZE : i * _CONTROL_SIZE + controllen]
+                (timestamp, drops) = _parse_ancillary(_cmsgs(control))
+                if drops is not None:
+                    self.drops = drops
+            datagrams.append((view[offset : offset + length], address, timestamp))
+            offset += bufsize
+        return datagrams
+
+    def _recv_batch_fallback(self, count: int, bufsize: int):
+        """recv_batch with one system call per datagram, where recvmmsg is not available"""
+        view = memoryview(self._pool)
+        datagrams = []
+        for i in range(count):
+            # Only wait for the first datagram
+            if i > 0 and not select.select([self], [], [], 0)[0]:
+                break
+            buf = view[i * bufsize : (i + 1) * bufsize]
+            timestamp = None
+            if hasattr(self, "recvmsg_into"):
+                (length, ancdata, _, address) = self.recvmsg_into([buf], _CONTROL_SIZE)
+                (timestamp, drops) = _parse_ancillary(ancdata)
+                if drops is not None:
+                    self.drops = drops
+            else:
+                (length, address) = self.recvfrom_into(buf)
+            datagrams.append((buf[:length], address, timestamp))
+        return datagrams
+
+    def send_batch(
+        self, packets: typing.Sequence[bytes], address: typing.Optional[typing.Tuple[str, int]] = None
+    ) -> int:
+        """
+        Send all the packets to address, as many per system call as possible. If the send buffer fills, this waits
+        for up to the socket timeout for space, and raises socket.timeout if there is none. A non-blocking socket
+        does not wait, and the number of packets sent before the buffer filled is returned
+
+        :param packets: The UDP payloads. bytes or writable buffers such as bytearray
+        :type packets: list[bytes]
+        :param address: The destination (ip, port). None if the socket is connected
+        :type address: (str, int)
+        :returns: The number of packets sent
+        :rtype: int
+        """
+        if not _mmsg_available:
+            for packet in packets:
+                if address is None:
+                    self.send(packet)
+                else:
+                    self.sendto(packet, address)
+            return len(packets)
+
+        if self._send_headers is None:
+            self._send_iovecs = (_IOVec * _SEND_BATCH)()
+            self._send_headers = (_MMsgHdr * _SEND_BATCH)()
+            self._send_name = ctypes.create_string_buffer(_SOCKADDR_SIZE)
+            for i in range(_SEND_BATCH):
+                hdr = self._send_headers[i].msg_hdr
+                hdr.msg_name = ctypes.addressof(self._send_name)
+                hdr.msg_iov = ctypes.pointer(self._send_iovecs[i])
+                hdr.msg_iovlen = 1
+        if address != self._send_address:
+            namelen = 0
+            if address is not None:
+                ip = socket.inet_aton(socket.gethostbyname(address[0]))
+                struct.pack_into("=H", self._send_name, 0, socket.AF_INET)
+                struct.pack_into(">H4s", self._send_name, 2, address[1], ip)
+                namelen = _SOCKADDR_SIZE
+            for i in range(_SEND_BATCH):
+                self._send_headers[i].msg_hdr.msg_namelen = namelen
+            self._send_address = address
+
+        total = 0
+        for start in range(0, len(packets), _SEND_BATCH):
+            chunk = packets[start : start + _SEND_BATCH]
+            count = len(chunk)
+            # Gather the packets into one buffer and point an iovec at each of them
+            data = b"".join(chunk)
+            base = ctypes.cast(ctypes.c_char_p(data), ctypes.c_void_p).value
+            iovecs = [0] * (2 * count)
+            iovecs[1::2] = lengths = [len(packet) for packet in chunk]
+            offset = 0
+            for i, length in enumerate(lengths):
+                iovecs[2 * i] = base + offset
+                offset += length
+            struct.pack_into("@{}N".format(2 * count), self._send_iovecs, 0, *iovecs)
+
+            sent = 0
+            while sent < count:
+                headers = ctypes.addressof(self._send_headers) + sent * ctypes.sizeof(_MMsgHdr)
+                result = _sendmmsg(self.fileno(), headers, count - sent, 0)
+                if result < 0:
+                    error = ctypes.get_errno()
+                    if error == errno.EINTR:
+                        continue
+                    if error == errno.EAGAIN:  # The send buffer is full on a socket with a timeout
+                        timeout = self.gettimeout()
+                        if timeout == 0:
+                            return total + sent
+                        # A timeout of None, a blocking socket, waits until the socket is writable
+                        (_, writable, _) = select.select([], [self], [], timeout)
+                        if not writable:
+                            raise socket.timeout("timed out")
+                        continue
+                    raise OSError(error, f"sendmmsg failed. {errno.errorcode.get(error, '')}")
+                sent += result
+            total += sent
+        return total
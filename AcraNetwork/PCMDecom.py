@@ -0,0 +1,243 @@
+"""
+.. module:: PCMDecom
+    :platform: Unix, Windows
+    :synopsis: Decommutate blocks of PCM minor frames into arrays of parameter samples
+
+.. moduleauthor:: Diarmuid Collins <dcollins@curtisswright.com>
+
+"""
+
+__author__ = "Diarmuid Collins"
+__maintainer__ = "Diarmuid Collins"
+__email__ = "dcollins@curtisswright.com"
+__status__ = "Production"
+
+
+import typing
+import logging
+from collections import namedtuple
+
+try:
+    import numpy
+except ImportError:
+    _numpy_available = False
+else:
+    _numpy_available = True
+
+
+logger = logging.getLogger(__name__)
+
+
+class PCMParameter(namedtuple("PCMParameter", "word, bits, lsb, sfid, interval", defaults=(16, 0, None, None))):
+    """
+    The location of a parameter in a PCM minor frame, for :class:`PCMDecom`
+
+    A parameter wider than a word spans the following words, most significant word first. A parameter can be
+    supercommutated, sampled at several words in each minor frame, and subcommutated, only present in the minor frames
+    with particular SFIDs.
+
+    >>> altitude = PCMParameter(4)  # All of word 4 in every minor frame
+    >>> status = PCMParameter(5, bits=4, lsb=8)  # Bits 11 to 8 of word 5
+    >>> counter = PCMParameter(6, bits=32)  # Words 6 and 7
+    >>> vibration = PCMParameter([8, 12, 16, 20])  # Sampled 4 times in each minor frame
+    >>> temperature = PCMParameter(9, sfid=3, interval=16)  # In minor frames 3, 19, 35...
+
+    :param word: The offset in words of the parameter in the minor frame, counting from the sync word. A list of
+        offsets for a supercommutated parameter
+    :type word: int|list[int]
+    :param bits: The width of the parameter in bits
+    :type bits: int
+    :param lsb: The bit position of the least significant bit of the parameter in its last word
+    :type lsb: int
+    :param sfid: The SFID of the minor frames containing a subcommutated parameter. None for all minor frames
+    :type sfid: int
+    :param interval: A subcommutated parameter is in every minor frame whose SFID differs from sfid by a multiple of
+        interval. None if it is only in the minor frames with that SFID
+    :type interval: int
+    """
+
+    __slots__ = ()
+
+
+class PCMDecom(object):
+    """
+    Decommutate many PCM minor frames at once. The frames are stacked into a 2-D numpy array of words and all the
+    samples of every parameter are extracted in one pass, so the cost per frame is much lower than unpacking each
+    parameter from each frame with struct. Requires numpy.
+
+    The minor frames can come from :meth:`AcraNetwork.SamDec008.SamDec008.frames` or from the
+    :class:`AcraNetwork.IRIG106.Chapter11.PCM.PCMMinorFrame` minor_frame_data, which has little endian words. The
+    words have to be byte aligned, 8, 16, 32 or 64 bits.
+
+    >>> import struct
+    >>> frames = [struct.pack(">IHHH", 0xFE6B2840, sfid, 0x1234, sfid * 10) for sfid in range(8)]
+    >>> wordmap = {
+    ...     "word3": PCMParameter(3),
+    ...     "nibble": PCMParameter(3, bits=4, lsb=4),
+    ...     "sub": PCMParameter(4, sfid=1, interval=4),
+    ... }
+    >>> decom = PCMDecom(wordmap, frame_length=10, sfid=PCMParameter(2))
+    >>> samples = decom.decom(frames)
+    >>> print(samples["word3"][:2], samples["nibble"][:2], samples["sub"])
+    [4660 4660] [3 3] [10 50]
+
+    :param wordmap: The parameter name and location of each parameter
+    :type wordmap: dict[str, PCMParameter]
+    :param frame_length: The length of the minor frames in bytes
+    :type frame_length: int
+    :param word_bits: The size of the words in bits
+    :type word_bits: int
+    :param sfid: The location of the SFID in the minor frame. Required for subcommutated parameters
+    :type sfid: PCMParameter
+    :param byteorder: ">" for big endian words, "<" for little endian
+    :type byteorder: str
+    """
+
+    def __init__(
+        self,
+        wordmap: typing.Dict[str, PCMParameter],
+        frame_length: int,
+        word_bits: int = 16,
+        sfid: typing.Optional[PCMParameter] = None,
+        byteorder: str = ">",
+    ):
+        if not _numpy_available:
+            raise RuntimeError("numpy is required for PCMDecom")
+        if word_bits not in (8, 16, 32, 64):
+            raise ValueError("Words of {} bits are not byte aligned".format(word_bits))
+        if frame_length % (word_bits // 8):
+            raise ValueError("The frame length {} is not a whole number of words".format(frame_length))
+        self.wordmap: typing.Dict[str, PCMParameter] = dict(wordmap)  #: The parameters decommutated
+        self.frame_length: int = frame_length  #: The minor frame length in bytes
+        self.word_bits: int = word_bits  #: The word size in bits
+        self.sfid: typing.Optional[PCMParameter] = sfid  #: The location of the SFID
+        self._dtype = numpy.dtype("{}u{}".format(byteorder, word_bits // 8))
+        self._words = frame_length // (word_bits // 8)
+
+        # Every sample of every parameter in a frame is a column. Columns are grouped by the number of words
+        slots = []  # (first word, number of words, lsb, bits) of each column
+        self._outputs = []  # (name, columns, sfid, interval, dtype) of each parameter
+        parameters = list(self.wordmap.items())
+        if sfid is not None:
+            parameters.append((None, sfid))
+        for name, parameter in parameters:
+            words = parameter.word if isinstance(parameter.word, (list, tuple)) else [parameter.word]
+            span = -(-(parameter.bits + parameter.lsb) // word_bits)
+            if parameter.bits < 1 or parameter.lsb < 0 or span * word_bits > 64:
+                raise ValueError(
+                    "Parameter {} of {} bits at bit {} is not supported".format(name, parameter.bits, parameter.lsb)
+                )
+            if parameter.sfid is not None and sfid is None:
+                raise ValueError("Parameter {} is subcommutated but the SFID location is not defined".format(name))
+            columns = []
+            for word in words:
+                if word < 0 or word + span > self._words:
+                    raise ValueError("Parameter {} at word {} is outside the minor frame".format(name, word))
+                columns.append(len(slots))
+                slots.append((word, span, parameter.lsb, parameter.bits))
+            dtype = numpy.min_scalar_type((1 << parameter.bits) - 1)
+            if name is None:
+                self._sfid_column = columns[0]
+            else:
+                self._outputs.append((name, columns, parameter.sfid, parameter.interval, dtype))
+
+        self._slots = len(slots)
+        self._groups = []  # (number of words, columns, first words, shifts, masks) for each number of words
+        for span in sorted({s[1] for s in slots}):
+            columns = [i for i, s in enumerate(slots) if s[1] == span]
+            self._groups.append(
+                (
+                    span,
+                    numpy.array(columns),
+                    numpy.array([slots[i][0] for i in columns]),
+                    numpy.array([slots[i][2] for i in columns], dtype=numpy.uint64),
+                    numpy.array([(1 << slots[i][3]) - 1 for i in columns], dtype=numpy.uint64),
+                )
+            )
+
+    def _stack(self, frames) -> "numpy.ndarray":
+        """The frames as a 2-D array of words"""
+        if isinstance(frames, numpy.ndarray):
+            data = numpy.ascontiguousarray(frames, dtype=numpy.uint8).reshape(-1)
+        elif isinstance(frames, (bytes, bytearray, memoryview)):
+            data = numpy.frombuffer(frames, dtype=numpy.uint8)
+        else:
+            frames = list(frames)
+            data = numpy.frombuffer(b"".join(frames), dtype=numpy.uint8)
+            if len(data) != len(frames) * self.frame_length:
+                raise ValueError("The minor frames are not all {} bytes".format(self.frame_length))
+        if len(data) % self.frame_length:
+            raise ValueError("{} bytes is not a whole number of minor frames".format(len(data)))
+        return data.view(self._dtype).reshape(-1, self._words)
+
+    def decom(self, frames) -> typing.Dict[str, "numpy.ndarray"]:
+        """
+        Decommutate minor frames into an array of samples for each parameter. The samples of a supercommutated
+        parameter are in the order of the frames and then of the words in each frame. A subcommutated parameter only
+        has samples from the frames with a matching SFID.
+
+        :param frames: The minor frames, as a list of frames, a buffer of consecutive frames, or a 2-D uint8 array
+            with one frame per row
+        :type frames: list[bytes]|bytes|numpy.ndarray
+        :rtype: dict[str, numpy.ndarray]
+        """
+        words = self._stack(frames)
+        values = numpy.empty((len(words), self._slots), dtype=numpy.uint64)
+        for span, columns, first, shifts, masks in self._groups:
+            combined = words[:, first].astype(numpy.uint64)
+            for i in range(1, span):
+                combined <<= numpy.uint64(self.word_bits)
+                combined |= words[:, first + i]
+            combined >>= shifts
+            combined &= masks
+            values[:, columns] = combined
+
+        if self.sfid is not None:
+            sfids = values[:, self._sfid_column].astype(numpy.int64)
+        samples = {}
+        for name, columns, sfid, interval, dtype in self._outputs:
+            if sfid is None:
+                selected = values[:, columns]
+            elif interval is None:
+                selected = values[:, columns][sfids == sfid]
+            else:
+                selected = values[:, columns][(sfids - sfid) % interval == 0]
+            samples[name] = selected.reshape(-1).astype(dtype)
+        return samples
+
+    def blocks(
+        self, frames: typing.Iterable[bytes], block_size: int = 4096
+    ) -> typing.Generator[typing.Dict[str, "numpy.ndarray"], None, None]:
+        """
+        Decommutate a stream of minor frames in blocks of block_size frames. Each frame is copied as it arrives, so
+        frames that are only valid until the next is received, such as those from
+        :meth:`AcraNetwork.SamDec008.SamDec008.frames`, can be used. The last block can be shorter.
+
+        >>> import struct
+        >>> frames = (struct.pack(">IHH", 0xFE6B2840, sfid, 7) for sfid in range(10))
+        >>> for samples in PCMDecom({"word3": PCMParameter(3)}, frame_length=8).blocks(frames, block_size=4):
+        ...     print(samples["word3"])
+        [7 7 7 7]
+        [7 7 7 7]
+        [7 7]
+
+        :param frames: The minor frames
+        :type frames: collections.Iterable[bytes|memoryview]
+        :param block_size: The number of minor frames to decommutate at once
+        :type block_size: int
+        :rtype: collections.Iterable[dict[str, numpy.ndarray]]
+        """
+        block = numpy.empty((block_size, self.frame_length), dtype=numpy.uint8)
+        view = memoryview(block.reshape(-1))
+        length = self.frame_length
+        count = 0
+        for frame in frames:
+            if len(frame) != length:
+                raise ValueError("Minor frame of {} bytes. Expected {}".format(len(frame), length))
+            view[count * length : (count + 1) * length] = frame
+            count += 1
+            if count == block_size:
+                yield self.decom(block)
+                count = 0
+        if count:
+            yield self.decom(block[:count])
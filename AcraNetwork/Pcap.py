@@ -16,34 +16,91 @@ __status__ = "Production"
 
 import struct
 import os
+import socket
 import time
 import warnings
+import mmap
+import array
+import logging
+import typing
+import io
+import gzip
+import bz2
+import lzma
+
+
+logger = logging.getLogger(__name__)
+
+try:
+    import numpy
+
+    _numpy_available = True
+except ImportError:
+    _numpy_available = False
+
+try:
+    import zstandard
+
+    _zstandard_available = True
+except ImportError:
+    _zstandard_available = False
+
+
+#: Fields of an iNetX packet in a UDP packet in an Ethernet frame, for :meth:`Pcap.to_arrays`. (offset, dtype)
+INETX_FIELDS = {
+    "control": (0x2A, ">u4"),
+    "streamid": (0x2E, ">u4"),
+    "sequence": (0x32, ">u4"),
+    "packetlen": (0x36, ">u4"),
+    "ptptimeseconds": (0x3A, ">u4"),
+    "ptptimenanoseconds": (0x3E, ">u4"),
+}
 
 
 class PcapRecord(object):
     """
     Class that can be used to store one pcap record. A Pcap file contains one or more PcapRecords
 
+    The timestamp is held to the nanosecond in sec and nsec. usec is derived from nsec so records from nanosecond
+    and microsecond files can be used interchangeably
+
     :type sec: int
+    :type nsec: int
     :type usec: int
     :type incl_len: int
     :type orig_len: int
     :type _packet: str
     """
 
+    __slots__ = ("sec", "nsec", "incl_len", "orig_len", "interface_id", "_payload")
+
     def __init__(self, now=False):
         """
         :param now: if True, record time is set to the current time.
         :type  now: bool
         """
         self.sec: int = 0  #: Second timestamp of the record. Epoch time
-        self.usec: int = 0  #: Microsecond timestamp of the record
+        self.nsec: int = 0  #: Nanosecond timestamp of the record
         self.incl_len: int = 0  #: The number of bytes captured and saved in the file
         self.orig_len: int = 0  #: The number of bytes as appeared on the network when captured
+        self.interface_id: int = 0  #: The capture interface. Only meaningful in pcapng files, see :class:`PcapNg`
         self._payload: bytes = bytes()
         if now:
             self.set_current_time()
 
+    @property
+    def usec(self) -> int:
+        """
+        Microsecond timestamp of the record
+
+        :rtype: int
+        """
+        return self.nsec // 1000
+
+    @usec.setter
+    def usec(self, usec: int) -> None:
+        self.nsec = usec * 1000
+
     # Use a property on packet so that the length is triggered on it changing
     @property
     def packet(self):
@@ -77,25 +134,26 @@ class PcapRecord(object):
 
     def unpack(self, buf: bytes) -> None:
         """
-        Unpack the pcap header. Pass in a buffer containing the header
+        Unpack the pcap header. Pass in a buffer containing the header of a little endian microsecond pcap file
 
         :type buf: bytes
         """
 
         if struct.calcsize(Pcap.RECORD_HEADER_FORMAT) != len(buf):
             raise ValueError("Header buffer is not the correct size to be a Pcap record header")
-        (self.sec, self.usec, self.incl_len, self.orig_len) = struct.unpack(Pcap.RECORD_HEADER_FORMAT, buf)
+        (self.sec, usec, self.incl_len, self.orig_len) = struct.unpack(Pcap.RECORD_HEADER_FORMAT, buf)
+        self.nsec = usec * 1000
 
     def pack(self) -> bytes:
         """
-        Pack a PcapRecord into a buffer
+        Pack a PcapRecord into a buffer in the little endian microsecond pcap format
 
         :rtype: bytes
 
         """
         if (
             self.sec is None
-            or self.usec is None
+            or self.nsec is None
             or self.incl_len is None
             or self.orig_len is None
             or self.packet is None
@@ -113,9 +171,7 @@ class PcapRecord(object):
 
         :rtype: bool
         """
-        currenttime = time.time()
-        self.usec = int((currenttime % 1) * 1e6)
-        self.sec = int(currenttime)
+        (self.sec, self.nsec) = divmod(time.time_ns(), 1000000000)
         return True
 
     def __repr__(self):
@@ -124,6 +180,129 @@ class PcapRecord(object):
     def __len__(self):
         return len(self._payload)
 
+#: Leading bytes of the compressed file formats that Pcap reads directly
+COMPRESSION_MAGIC = {b"\x1f\x8b": "gzip", b"BZh": "bz2", b"\xfd7zXZ\x00": "xz", b"\x28\xb5\x2f\xfd": "zstd"}
+#: Filename extensions that select the compression when writing
+COMPRESSION_EXTENSIONS = {".gz": "gzip", ".bz2": "bz2", ".xz": "xz", ".zst": "zstd"}
+
+
+def _detect_compression(filename: str, mode: str) -> typing.Optional[str]:
+    """
+    Identify the compression of a pcap file from its contents when reading, or its extension when writing
+
+    :rtype: str
+    """
+    if mode == "r":
+        try:
+            with open(filename, "rb") as f:
+                start = f.read(6)
+        except OSError:
+            return None
+        for magic, compression in COMPRESSION_MAGIC.items():
+            if start.startswith(magic):
+                return compression
+        return None
+    return COMPRESSION_EXTENSIONS.get(os.path.splitext(filename)[1].lower())
+
+
+def _open_compressed(
+    filename: str, mode: str, compression: str, buffer_size: int, compresslevel: typing.Optional[int] = None
+) -> typing.BinaryIO:
+    """
+    Open a compressed file for streaming. The (de)compressor is wrapped in a buffer so that the small header and
+    payload reads and writes are served from large blocks
+
+    :rtype: io.BufferedIOBase
+    """
+    kwargs = {} if compresslevel is None else {"compresslevel": compresslevel}
+    if compression == "gzip":
+        stream = gzip.open(filename, f"{mode}b", **kwargs)
+    elif compression == "bz2":
+        stream = bz2.open(filename, f"{mode}b", **kwargs)
+    elif compression == "xz":
+        stream = lzma.open(filename, f"{mode}b", preset=compresslevel)
+    elif compression == "zstd":
+        if not _zstandard_available:
+            raise RuntimeError(f"The zstandard module is required to open {filename}")
+        level = 3 if compresslevel is None else compresslevel
+        stream = zstandard.open(filename, f"{mode}b", cctx=zstandard.ZstdCompressor(level=level))
+    else:
+        raise ValueError(f"Unsupported compression {compression}")
+    if mode == "r":
+        return io.BufferedReader(stream, buffer_size)
+    return io.BufferedWriter(stream, buffer_size)
+
+
+class PayloadFilter(object):
+    """
+    Predicate on the raw bytes of a record payload, for :meth:`Pcap.iter`. Each condition is a byte string that has
+    to be present at a fixed offset in the payload. The conditions are checked before any object is created for the
+    record, so non matching records cost very little.
+
+    >>> f = PayloadFilter.udp(dstport=1023)
+    >>> f.add(0x2E, bytes((0, 0, 0, 0xCA)))  # and the iNetX stream ID is 0xCA
+    >>> with Pcap("test/inetx_test.pcap") as p:
+    ...     print(len(list(p.iter(filter=f))))
+    10
+
+    Any callable that accepts the payload and returns a bool can also be used as the filter.
+
+    :param conditions: (offset, bytes) pairs that all have to match
+    :type conditions: list[(int, bytes)]
+    """
+
+    ETHERNET_IPV4_UDP = ((12, b"\x08\x00"), (14, b"\x45"), (23, b"\x11"))  #: Ethernet, IPv4 with no options, UDP
+
+    def __init__(self, conditions: typing.Iterable[typing.Tuple[int, bytes]] = ()):
+        self.conditions: typing.List[typing.Tuple[int, bytes]] = list(conditions)  #: (offset, bytes) pairs
+
+    def add(self, offset: int, value: bytes) -> None:
+        """
+        Add a condition that the payload contains value at offset
+
+        :type offset: int
+        :type value: bytes
+        """
+        self.conditions.append((offset, bytes(value)))
+
+    @classmethod
+    def udp(
+        cls,
+        dstport: typing.Optional[int] = None,
+        srcport: typing.Optional[int] = None,
+        dstip: typing.Optional[str] = None,
+        srcip: typing.Optional[str] = None,
+    ) -> "PayloadFilter":
+        """
+        Create a filter that matches UDP in IPv4 in Ethernet frames with optional address and port conditions. IPv4
+        headers with options are not matched
+
+        :param dstport: UDP destination port
+        :param srcport: UDP source port
+        :param dstip: IP destination address, eg "235.0.0.1"
+        :param srcip: IP source address
+        :rtype: PayloadFilter
+        """
+        payloadfilter = cls(PayloadFilter.ETHERNET_IPV4_UDP)
+        if srcip is not None:
+            payloadfilter.add(26, socket.inet_aton(srcip))
+        if dstip is not None:
+            payloadfilter.add(30, socket.inet_aton(dstip))
+        if srcport is not None:
+            payloadfilter.add(34, struct.pack(">H", srcport))
+        if dstport is not None:
+            payloadfilter.add(36, struct.pack(">H", dstport))
+        return payloadfilter
+
+    def __call__(self, payload: bytes) -> bool:
+        for offset, value in self.conditions:
+            if payload[offset : offset + len(value)] != value:
+                return False
+        return True
+
+    def __repr__(self):
+        return f"PayloadFilter({self.conditions})"
+
 
 class Pcap(object):
     """
@@ -136,6 +315,11 @@ class Pcap(object):
 
     :Keyword Arguments:
         * *mode* -- r: read w: write a: append
+        * *nanosecond* -- When writing a new file, use nanosecond instead of microsecond timestamps
+        * *byteorder* -- When writing a new file, "little" or "big" endian headers. Defaults to little
+        * *compression* -- "gzip", "bz2", "xz" or "zstd". By default this is identified from the contents of the
+          file when reading and from the extension (.gz, .bz2, .xz, .zst) when writing
+        * *compresslevel* -- The compression level when writing a compressed file
 
 
     Pcap files look like::
@@ -207,19 +391,60 @@ class Pcap(object):
     ...    print(firstbyte)
     0
 
+    Large captures can be memory mapped by passing mmap=True when opening for reading. The records are then
+    returned without copying the payload. The payload of each record is a memoryview into the mapped file, which
+    can be passed directly to the unpack methods of :class:`AcraNetwork.iNetX.iNetX` or
+    :class:`AcraNetwork.IENA.IENA`. The views are only valid while the Pcap object is open, so use bytes() on the
+    payload if it needs to outlive the file.
+
+    >>> with Pcap("_dummy.pcap", mmap=True) as p3:
+    ...     for mypcaprecord in p3:
+    ...         print(type(mypcaprecord.payload).__name__, bytes(mypcaprecord.payload))
+    memoryview b'\\x00'
+
+    Records can also be selected by number, sliced or read in reverse. The first random access builds an index of
+    the record offsets with one pass over the record headers, so later lookups do not rescan the file. Pass
+    index_file=True to save the index beside the capture as filename.idx and reuse it the next time the file is opened.
+    len() also builds or loads the index, so the number of records is known without reading them
+
+    >>> with Pcap("_dummy.pcap", index_file=False) as p4:
+    ...     print(len(p4), bytes(p4[-1].payload))
+    1 b'\\x00'
+
+    Compressed captures are read and written directly, without a decompressed copy on disk. They can only be read
+    sequentially, so mmap, the index and random access are not available. filesize is the compressed size
+
+    >>> with Pcap("_dummy.pcap.gz", mode="w") as p5:
+    ...     p5.write(r)
+    >>> with Pcap("_dummy.pcap.gz") as p6:
+    ...     print(p6.compression, [bytes(rec.payload) for rec in p6])
+    gzip [b'\\x00']
 
 
     """
 
     GLOBAL_HEADER_FORMAT = "<IhhiIII"
     RECORD_HEADER_FORMAT = "<IIII"
+    MAGIC_USEC = 0xA1B2C3D4  #: Magic number of a pcap file with microsecond timestamps
+    MAGIC_NSEC = 0xA1B23C4D  #: Magic number of a pcap file with nanosecond timestamps
     RECORD_HEADER_SIZE = struct.calcsize(RECORD_HEADER_FORMAT)
     GLOBAL_HEADER_SIZE = struct.calcsize(GLOBAL_HEADER_FORMAT)
+    INDEX_MAGIC = b"PIDX"  #: Identifies a record index sidecar file
+    INDEX_HEADER_FORMAT = "<4sQQ"  #: Magic, size of the pcap file indexed and number of records
+    INDEX_HEADER_SIZE = struct.calcsize(INDEX_HEADER_FORMAT)
+    WRITE_BUFFER_SIZE = 1 << 22  #: Size of the buffer that records are packed into by :meth:`Pcap.write_raw`
+    ARRAY_BLOCK_SIZE = 1 << 18  #: Number of records gathered at a time by :meth:`Pcap.to_arrays`
+    COMPRESSED_BUFFER_SIZE = 1 << 20  #: Block size for reading and writing compressed files
 
     def __init__(self, filename: str, **kwargs):
         self.filename: str = filename  #: The filename of the PCAP file
         self.mode: str = kwargs.get("mode", "r")  #: The file reading mode
         self._buffering: int = kwargs.get("buffering", -1)  #: File buffer size. -1=default, 0=unbuffered, >0=buffer size.
+        self._use_mmap: bool = kwargs.get("mmap", False)  #: Memory map the file when reading. Payloads are memoryviews
+        self._index_file: typing.Union[bool, str] = kwargs.get("index_file", False)  #: Sidecar file for the index
+        self.nanosecond: bool = kwargs.get("nanosecond", False)  #: The record timestamps are in nanoseconds
+        self.byteorder: str = kwargs.get("byteorder", "little")  #: The byte order of the headers. little or big
+        self.compression: typing.Optional[str] = kwargs.get("compression")  #: gzip, bz2, xz, zstd or None
         # Global header fields
         self.magic: int = 0xA1B2C3D4  #: The magic_number which defines the file format. Leave as is.
         self.versionmaj: int = 2  #: File format major version. Currently 2
@@ -238,8 +463,27 @@ class Pcap(object):
         self.rec_no = 0
 
         self.fopen = None # make deterministic if the file open fails
+        self._map = None  # The memory mapped file when mmap=True
+        self._view = None  # memoryview over _map from which the record payloads are sliced
+        self._offset = 0  # The offset into _map of the next record
+        self._index: typing.Optional[array.array] = None  # Start offset of every record. Built on first random access
+        self._set_format()
+        self._wbuf: typing.Optional[bytearray] = None  # Records packed by write_raw waiting to be written to the file
+        self._wpos = 0  # Number of bytes used in _wbuf
+        if self.compression is None:
+            self.compression = _detect_compression(filename, self.mode)
+        if self.compression is not None and (self.mode not in ("r", "w") or self._use_mmap):
+            raise ValueError("Compressed pcap files can only be read or written sequentially")
         try:
-            self.fopen = open(filename, f"{self.mode}b", self._buffering)
+            if self.compression is not None:
+                buffer_size = self._buffering if self._buffering > 1 else Pcap.COMPRESSED_BUFFER_SIZE
+                self.fopen = _open_compressed(
+                    filename, self.mode, self.compression, buffer_size, kwargs.get("compresslevel")
+                )
+            else:
+                self.fopen = open(filename, f"{self.mode}b", self._buffering)
+        except (ValueError, RuntimeError):
+            raise
         except Exception as e:
             raise IOError(f"Failed to open {self.filename}. err={e}")
 
@@ -249,6 +493,23 @@ class Pcap(object):
             self._read_global_header()
         elif self.mode == "w":
             self._write_global_header()
+        elif self.mode == "a":
+            # Records have to match the format of the existing file
+            try:
+                with open(filename, "rb") as f:
+                    header = f.read(Pcap.GLOBAL_HEADER_SIZE)
+            except OSError:
+                header = b""
+            if len(header) == Pcap.GLOBAL_HEADER_SIZE:
+                self._unpack_global_header(header)
+
+        if self._use_mmap:
+            if self.mode != "r":
+                self.fopen.close()
+                raise ValueError("mmap is only supported when the pcap file is opened for reading")
+            self._map = mmap.mmap(self.fopen.fileno(), 0, access=mmap.ACCESS_READ)
+            self._view = memoryview(self._map)
+            self._offset = Pcap.GLOBAL_HEADER_SIZE
 
         try:
             self.filesize = os.path.getsize(filename)
@@ -263,17 +524,41 @@ class Pcap(object):
         self.close()
 
     def flush(self):
+        self._flush_records()
         return self.fopen.flush()
 
-    def _read_global_header(self) -> bool:
+    def _set_format(self) -> None:
         """
-        This method will read the pcap global header and unpack it and propogate the relevant attributes
-        This should be the first method to call on reading a pcap] file
-
-        :rtype: bool
+        Set the magic number and the record header struct from the nanosecond and byteorder attributes.
+        The timestamp scaling is done by multiplication so reading a record does not depend on the format
+        """
+        if self.byteorder not in ("little", "big"):
+            raise ValueError(f"byteorder should be little or big, not {self.byteorder}")
+        endian = "<" if self.byteorder == "little" else ">"
+        self.magic = Pcap.MAGIC_NSEC if self.nanosecond else Pcap.MAGIC_USEC
+        self._global_header_format = endian + Pcap.GLOBAL_HEADER_FORMAT[1:]
+        self._record_struct = struct.Struct(endian + Pcap.RECORD_HEADER_FORMAT[1:])
+        # Timestamp fraction in the file to nanoseconds and vice versa. And microseconds to the fraction in the file
+        self._nsec_per_unit = 1 if self.nanosecond else 1000
+        self._usec_to_unit = 1000 if self.nanosecond else 1
+
+    def _unpack_global_header(self, header: bytes) -> None:
         """
+        Unpack the global header. The magic number identifies the timestamp resolution and the byte order
 
-        header = self.fopen.read(Pcap.GLOBAL_HEADER_SIZE)
+        :type header: bytes
+        """
+        if header[:4] == PcapNg.SHB_MAGIC:
+            raise ValueError(f"{self.filename} is a pcapng file. Open it with PcapNg")
+        for byteorder, endian in (("little", "<"), ("big", ">")):
+            (magic,) = struct.unpack_from(endian + "I", header)
+            if magic in (Pcap.MAGIC_USEC, Pcap.MAGIC_NSEC):
+                self.byteorder = byteorder
+                self.nanosecond = magic == Pcap.MAGIC_NSEC
+                break
+        else:
+            raise ValueError(f"{self.filename} is not a pcap file. Magic number={header[:4].hex()}")
+        self._set_format()
         (
             self.magic,
             self.versionmaj,
@@ -282,7 +567,24 @@ class Pcap(object):
             self.sigfigs,
             self.snaplen,
             self.network,
-        ) = struct.unpack(Pcap.GLOBAL_HEADER_FORMAT, header)
+        ) = struct.unpack(self._global_header_format, header)
+
+    def _read_global_header(self) -> bool:
+        """
+        This method will read the pcap global header and unpack it and propogate the relevant attributes
+        This should be the first method to call on reading a pcap] file
+
+        :rtype: bool
+        """
+
+        if self.fopen.tell() != 0:
+            self.fopen.seek(0)
+        header = self.fopen.read(Pcap.GLOBAL_HEADER_SIZE)
+        try:
+            self._unpack_global_header(header)
+        except (ValueError, struct.error, EOFError, OSError):
+            self.fopen.close()
+            raise
 
         return True
 
@@ -293,7 +595,7 @@ class Pcap(object):
         :rtype: None
         """
         header = struct.pack(
-            Pcap.GLOBAL_HEADER_FORMAT,
+            self._global_header_format,
             self.magic,
             self.versionmaj,
             self.versionmin,
@@ -313,43 +615,843 @@ class Pcap(object):
         :param pcaprecord: The Pcap Record to write
         :type pcaprecord: PcapRecord
         """
+        if (
+            pcaprecord.sec is None
+            or pcaprecord.nsec is None
+            or pcaprecord.incl_len is None
+            or pcaprecord.orig_len is None
+            or pcaprecord.packet is None
+        ):
+            raise ValueError("Cannot build record with undefined fields in the payload")
 
-        _pkt = pcaprecord.pack()
+        _pkt = (
+            self._record_struct.pack(
+                pcaprecord.sec,
+                pcaprecord.nsec // self._nsec_per_unit,
+                pcaprecord.incl_len,
+                pcaprecord.orig_len,
+            )
+            + pcaprecord.packet
+        )
+        if self._wpos:
+            self._flush_records()
         self.fopen.write(_pkt)
         self.rec_no += 1
         self.filesize += len(_pkt)
 
+    def write_raw(self, sec: int, usec: int, payload: bytes, orig_len: typing.Optional[int] = None) -> None:
+        """
+        Write a record to the pcap file without building a :class:`PcapRecord`. The record header is packed directly
+        into a write buffer along with the payload and the buffer is written to the file in large chunks. Use this
+        in preference to :meth:`Pcap.write` when generating large files
+
+        :param sec: Second timestamp of the record
+        :type sec: int
+        :param usec: Microsecond timestamp of the record
+        :type usec: int
+        :param payload: The record payload. Typically an Ethernet frame
+        :type payload: bytes
+        :param orig_len: The length of the packet on the network. Defaults to the payload length
+        :type orig_len: int
+        """
+        self._buffer_record(sec, usec * self._usec_to_unit, payload, orig_len)
+
+    def write_raw_ns(self, sec: int, nsec: int, payload: bytes, orig_len: typing.Optional[int] = None) -> None:
+        """
+        Same as :meth:`Pcap.write_raw` but with a nanosecond timestamp
+
+        :param sec: Second timestamp of the record
+        :type sec: int
+        :param nsec: Nanosecond timestamp of the record
+        :type nsec: int
+        :param payload: The record payload. Typically an Ethernet frame
+        :type payload: bytes
+        :param orig_len: The length of the packet on the network. Defaults to the payload length
+        :type orig_len: int
+        """
+        self._buffer_record(sec, nsec // self._nsec_per_unit, payload, orig_len)
+
+    def _buffer_record(self, sec: int, fraction: int, payload: bytes, orig_len: typing.Optional[int]) -> None:
+        """
+        Pack a record into the write buffer. fraction is the sub second timestamp in the units of the file
+        """
+        incl_len = len(payload)
+        size = Pcap.RECORD_HEADER_SIZE + incl_len
+        if self._wbuf is None:
+            self._wbuf = bytearray(Pcap.WRITE_BUFFER_SIZE)
+        pos = self._wpos
+        if pos + size > Pcap.WRITE_BUFFER_SIZE:
+            self._flush_records()
+            pos = 0
+            if size > Pcap.WRITE_BUFFER_SIZE:
+                # Bigger than the buffer so write it straight out
+                self.fopen.write(self._record_struct.pack(sec, fraction, incl_len, orig_len or incl_len))
+                self.fopen.write(payload)
+                self.rec_no += 1
+                self.filesize += size
+                return
+        self._record_struct.pack_into(self._wbuf, pos, sec, fraction, incl_len, orig_len or incl_len)
+        pos += Pcap.RECORD_HEADER_SIZE
+        self._wbuf[pos : pos + incl_len] = payload
+        self._wpos = pos + incl_len
+        self.rec_no += 1
+        self.filesize += size
+
+    def write_many(self, records: typing.Iterable[PcapRecord]) -> None:
+        """
+        Write multiple records to the pcap file. The records are packed as in :meth:`Pcap.write_raw`
+
+        :param records: The records to write
+        :type records: collections.Iterable[PcapRecord]
+        """
+        buffer_record = self._buffer_record
+        nsec_per_unit = self._nsec_per_unit
+        for record in records:
+            buffer_record(record.sec, record.nsec // nsec_per_unit, record.payload, record.orig_len)
+
+    def _flush_records(self) -> None:
+        """
+        Write the records packed by :meth:`Pcap.write_raw` to the file
+        """
+        if self._wpos:
+            self.fopen.write(memoryview(self._wbuf)[: self._wpos])
+            self._wpos = 0
+
     def close(self):
         """
         Close the current pcap file
 
         :rtype: None
         """
+        if self._map is not None:
+            self._view.release()
+            try:
+                self._map.close()
+            except BufferError:
+                # Records still hold views into the mapping. It is unmapped when the last of them is released
+                pass
+        if self._wpos and not self.fopen.closed:
+            self._flush_records()
         self.fopen.close()
 
     def __iter__(self):
         return self
 
     def next(self):
+        if self._map is not None:
+            pcaprecord = self._mmap_record(self._offset)
+            self._offset += Pcap.RECORD_HEADER_SIZE + pcaprecord.incl_len
+        else:
+            pcaprecord = self._read_record()
+        self.rec_no += 1
+        return pcaprecord
+
+    __next__ = next
+
+    def _read_record(self) -> PcapRecord:
+        """
+        Read the record at the current file position
+
+        :rtype: PcapRecord
+        """
         # read the pcap header to a new object
         pcaprecord = PcapRecord()
         try:
-            pcaprecord.unpack(self.fopen.read(Pcap.RECORD_HEADER_SIZE))
+            (pcaprecord.sec, fraction, incl_len, pcaprecord.orig_len) = self._record_struct.unpack(
+                self.fopen.read(Pcap.RECORD_HEADER_SIZE)
+            )
         except:
             raise StopIteration
+        pcaprecord.nsec = fraction * self._nsec_per_unit
 
         try:
-            pcaprecord.packet = self.fopen.read(pcaprecord.incl_len)
+            pcaprecord.packet = self.fopen.read(incl_len)
         except:
             raise StopIteration
+        return pcaprecord
+
+    def _mmap_record(self, offset: int) -> PcapRecord:
+        """
+        Return the record at the offset in the memory mapped file. The payload is a memoryview into the mapping so no
+        copy of the packet is made
+
+        :param offset: The offset of the record header from the start of the file
+        :type offset: int
+        :rtype: PcapRecord
+        """
+        pcaprecord = PcapRecord()
+        try:
+            (pcaprecord.sec, fraction, incl_len, pcaprecord.orig_len) = self._record_struct.unpack_from(
+                self._map, offset
+            )
+        except struct.error:
+            raise StopIteration
+        pcaprecord.nsec = fraction * self._nsec_per_unit
+        offset += Pcap.RECORD_HEADER_SIZE
+        pcaprecord.packet = self._view[offset : offset + incl_len]
+        return pcaprecord
+
+    def _record_at(self, offset: int) -> PcapRecord:
+        """
+        Return the record at the offset without moving the position of the iteration
+
+        :param offset: The offset of the record header from the start of the file
+        :type offset: int
+        :rtype: PcapRecord
+        """
+        if self._map is not None:
+            return self._mmap_record(offset)
+        position = self.fopen.tell()
+        try:
+            self.fopen.seek(offset)
+            return self._read_record()
+        finally:
+            self.fopen.seek(position)
+
+    def _scan_offsets(self) -> array.array:
+        """
+        Walk the record headers and return the offset of each record header. The payloads are skipped
+
+        :rtype: array.array
+        """
+        offsets = array.array("Q")
+        append = offsets.append
+        header_size = Pcap.RECORD_HEADER_SIZE
+        end_of_headers = self.filesize - header_size
+        offset = Pcap.GLOBAL_HEADER_SIZE
+        if self._map is not None:
+            unpack_from = self._record_struct.unpack_from
+            buf = self._map
+            while offset <= end_of_headers:
+                append(offset)
+                offset += header_size + unpack_from(buf, offset)[2]
         else:
-            self.rec_no += 1
-            return pcaprecord
+            unpack = self._record_struct.unpack
+            position = self.fopen.tell()
+            read = self.fopen.read
+            seek = self.fopen.seek
+            try:
+                seek(offset)
+                while offset <= end_of_headers:
+                    append(offset)
+                    incl_len = unpack(read(header_size))[2]
+                    offset += header_size + incl_len
+                    seek(incl_len, os.SEEK_CUR)
+            finally:
+                seek(position)
+        return offsets
+
+    def _index_filename(self) -> str:
+        if self._index_file is True:
+            return self.filename + ".idx"
+        return self._index_file
+
+    def _load_index(self) -> typing.Optional[array.array]:
+        """
+        Load the index from the sidecar file if it exists and was built from this capture
 
-    __next__ = next
+        :rtype: array.array
+        """
+        index_fname = self._index_filename()
+        try:
+            if os.path.getmtime(index_fname) < os.path.getmtime(self.filename):
+                return None
+            with open(index_fname, "rb") as f:
+                (magic, filesize, count) = struct.unpack(Pcap.INDEX_HEADER_FORMAT, f.read(Pcap.INDEX_HEADER_SIZE))
+                if magic != Pcap.INDEX_MAGIC or filesize != self.filesize:
+                    return None
+                offsets = array.array("Q")
+                offsets.fromfile(f, count)
+        except (OSError, EOFError, struct.error):
+            return None
+        return offsets
+
+    def _save_index(self, offsets: array.array) -> None:
+        """
+        Save the index to the sidecar file. Failure to write it is not fatal
+
+        :type offsets: array.array
+        """
+        index_fname = self._index_filename()
+        try:
+            with open(index_fname, "wb") as f:
+                f.write(struct.pack(Pcap.INDEX_HEADER_FORMAT, Pcap.INDEX_MAGIC, self.filesize, len(offsets)))
+                offsets.tofile(f)
+        except OSError as e:
+            logger.warning(f"Failed to write pcap index {index_fname}. err={e}")
+
+    def build_index(self) -> array.array:
+        """
+        Build, or load from the sidecar file, the index of record offsets. This is done automatically on the first
+        random access so it is only required to pay the cost up front.
+
+        :rtype: array.array
+        """
+        if self._index is not None:
+            return self._index
+        if self.mode != "r":
+            raise ValueError("The record index is only available when the pcap file is opened for reading")
+        if self.compression is not None:
+            raise ValueError("The record index is not available for compressed pcap files")
+        offsets = None
+        if self._index_file:
+            offsets = self._load_index()
+        if offsets is None:
+            offsets = self._scan_offsets()
+            if self._index_file:
+                self._save_index(offsets)
+        self._index = offsets
+        return offsets
+
+    def __len__(self):
+        if self.compression is not None:
+            # TypeError, as for any unsized object, so list() does not fail on a compressed file
+            raise TypeError("The number of records in a compressed pcap file is not known")
+        return len(self.build_index())
+
+    def __bool__(self):
+        # Without this, truth testing would fall back to __len__ and scan the whole file
+        return True
 
     def __getitem__(self, item):
-        self.fopen.seek(Pcap.GLOBAL_HEADER_SIZE)
-        for idx, rec in enumerate(self):
-            if idx == item:
-                return rec
+        index = self.build_index()
+        if isinstance(item, slice):
+            return [self._record_at(index[i]) for i in range(*item.indices(len(index)))]
+        return self._record_at(index[item])
+
+    def __reversed__(self):
+        index = self.build_index()
+        for i in range(len(index) - 1, -1, -1):
+            yield self._record_at(index[i])
+
+    def _timestamp_at(self, offset: int) -> int:
+        """
+        Return the timestamp in nanoseconds of the record at the offset
+
+        :rtype: int
+        """
+        if self._map is not None:
+            (sec, fraction, _incl_len, _orig_len) = self._record_struct.unpack_from(self._map, offset)
+        else:
+            position = self.fopen.tell()
+            try:
+                self.fopen.seek(offset)
+                (sec, fraction, _incl_len, _orig_len) = self._record_struct.unpack(
+                    self.fopen.read(Pcap.RECORD_HEADER_SIZE)
+                )
+            finally:
+                self.fopen.seek(position)
+        return sec * 1_000_000_000 + fraction * self._nsec_per_unit
+
+    def _find_time(self, timestamp: int) -> int:
+        """
+        Binary search the index for the first record at or after the timestamp in nanoseconds
+
+        :rtype: int
+        """
+        index = self.build_index()
+        low, high = 0, len(index)
+        while low < high:
+            middle = (low + high) // 2
+            if self._timestamp_at(index[middle]) < timestamp:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def iter(
+        self,
+        start_time: typing.Optional[float] = None,
+        end_time: typing.Optional[float] = None,
+        filter: typing.Optional[typing.Callable[[bytes], bool]] = None,
+    ) -> typing.Generator[PcapRecord, None, None]:
+        """
+        Iterate through the records from start_time up to, but not including, end_time whose payload passes the
+        filter. The capture is assumed to be in time order. The start of the window is found by a binary search of
+        the record index and the iteration stops at the first record after the window, so only the records in the
+        window are read. The filter is called with the raw payload before a :class:`PcapRecord` is created for it,
+        see :class:`PayloadFilter`. When the file is not memory mapped this moves the position of the normal
+        iteration
+
+        >>> with Pcap("test/inetx_test.pcap") as p:
+        ...     print([r.usec for r in p.iter(start_time=1413470993.6, end_time=1413470993.8)])
+        [648516, 773507]
+
+        :param start_time: Start of the window in seconds since the epoch. None for the start of the file
+        :type start_time: float
+        :param end_time: End of the window in seconds since the epoch. None for the end of the file
+        :type end_time: float
+        :param filter: Called with the payload of each record. Records are skipped if it returns False
+        :type filter: callable
+        :rtype: collections.Iterable[PcapRecord]
+        """
+        offset = Pcap.GLOBAL_HEADER_SIZE
+        if start_time is not None:
+            index = self.build_index()
+            first = self._find_time(round(start_time * 1_000_000_000))
+            if first == len(index):
+                return
+            offset = index[first]
+        end_ns = None if end_time is None else round(end_time * 1_000_000_000)
+        header_size = Pcap.RECORD_HEADER_SIZE
+        nsec_per_unit = self._nsec_per_unit
+        if self._map is not None:
+            unpack_from = self._record_struct.unpack_from
+            buf = self._map
+            view = self._view
+            end_of_headers = len(buf) - header_size
+        else:
+            unpack = self._record_struct.unpack
+            read = self.fopen.read
+            self.fopen.seek(offset)
+        while True:
+            if self._map is not None:
+                if offset > end_of_headers:
+                    return
+                (sec, fraction, incl_len, orig_len) = unpack_from(buf, offset)
+            else:
+                header = read(header_size)
+                if len(header) < header_size:
+                    return
+                (sec, fraction, incl_len, orig_len) = unpack(header)
+            nsec = fraction * nsec_per_unit
+            if end_ns is not None and sec * 1_000_000_000 + nsec >= end_ns:
+                return
+            if self._map is not None:
+                payload = view[offset + header_size : offset + header_size + incl_len]
+                offset += header_size + incl_len
+            else:
+                payload = read(incl_len)
+            if filter is not None and not filter(payload):
+                continue
+            pcaprecord = PcapRecord()
+            pcaprecord.sec = sec
+            pcaprecord.nsec = nsec
+            pcaprecord.packet = payload
+            pcaprecord.orig_len = orig_len
+            yield pcaprecord
+
+    def to_arrays(self, fields: typing.Optional[typing.Dict[str, typing.Tuple[int, str]]] = None):
+        """
+        Return the record headers of the whole file as a numpy structured array with one row per record, without
+        creating a :class:`PcapRecord` for each. The columns are offset (of the record header in the file), sec,
+        nsec, incl_len and orig_len. Fixed offset fields of the payloads can be added as extra columns, for example
+        :data:`INETX_FIELDS`. Records too short to hold a field have 0 in that column. The incl_len of a last record
+        that was cut short is the number of bytes left in the file, as for the payload when iterating. Requires numpy.
+
+        >>> with Pcap("test/inetx_test.pcap") as p:
+        ...     a = p.to_arrays(INETX_FIELDS)
+        >>> print(a["sequence"][:3], a["incl_len"][0])
+        [1011 1012 1013] 114
+
+        :param fields: Extra columns. Maps the column name to the offset in the payload and the numpy dtype
+        :type fields: dict[str, (int, str)]
+        :rtype: numpy.ndarray
+        """
+        if not _numpy_available:
+            raise RuntimeError("numpy is required for Pcap.to_arrays")
+        if fields is None:
+            fields = {}
+        offsets = numpy.frombuffer(self.build_index(), dtype=numpy.uint64).astype(numpy.int64)
+        endian = "<" if self.byteorder == "little" else ">"
+        header_dtype = numpy.dtype(
+            [("sec", endian + "u4"), ("fraction", endian + "u4"), ("incl_len", endian + "u4"), ("orig_len", endian + "u4")]
+        )
+        field_dtypes = {name: (offset, numpy.dtype(dtype)) for name, (offset, dtype) in fields.items()}
+        result = numpy.zeros(
+            len(offsets),
+            dtype=[("offset", "u8"), ("sec", "u4"), ("nsec", "u4"), ("incl_len", "u4"), ("orig_len", "u4")]
+            + [(name, dtype.newbyteorder("=")) for name, (_offset, dtype) in field_dtypes.items()],
+        )
+        result["offset"] = offsets
+        if len(offsets) == 0:
+            return result
+
+        if self._map is not None:
+            buf = self._map
+        else:
+            buf = mmap.mmap(self.fopen.fileno(), 0, access=mmap.ACCESS_READ)
+        data = numpy.frombuffer(buf, dtype=numpy.uint8)
+        header_columns = numpy.arange(Pcap.RECORD_HEADER_SIZE)
+        try:
+            # Gather in blocks to bound the size of the index arrays
+            for first in range(0, len(offsets), Pcap.ARRAY_BLOCK_SIZE):
+                block = slice(first, first + Pcap.ARRAY_BLOCK_SIZE)
+                block_offsets = offsets[block]
+                headers = data[block_offsets[:, None] + header_columns].view(header_dtype)[:, 0]
+                payload_offsets = block_offsets + Pcap.RECORD_HEADER_SIZE
+                incl_len = numpy.minimum(headers["incl_len"], len(data) - payload_offsets)
+                result["sec"][block] = headers["sec"]
+                result["nsec"][block] = headers["fraction"] * self._nsec_per_unit
+                result["incl_len"][block] = incl_len
+                result["orig_len"][block] = headers["orig_len"]
+                for name, (offset, dtype) in field_dtypes.items():
+                    valid = incl_len >= offset + dtype.itemsize
+                    positions = numpy.where(valid, payload_offsets + offset, 0)
+                    values = data[positions[:, None] + numpy.arange(dtype.itemsize)].view(dtype)[:, 0]
+                    result[name][block] = numpy.where(valid, values, 0)
+        finally:
+            del data
+            if buf is not self._map:
+                buf.close()
+        return result
+
+    def partition(self, chunks: int) -> typing.List[typing.Tuple[int, int]]:
+        """
+        Split the file into byte ranges that each start on a record header. The ranges have roughly equal numbers
+        of records and can be read independently with :meth:`Pcap.iter_range`, for example in separate processes
+        as :func:`AcraNetwork.PcapParallel.parallel_reduce` does.
+
+        :param chunks: The number of ranges to split the file into. Fewer are returned if there are fewer records
+        :type chunks: int
+        :rtype: list[(int, int)]
+        """
+        index = self.build_index()
+        count = len(index)
+        if count == 0:
+            return []
+        chunks = max(1, min(chunks, count))
+        starts = [index[count * i // chunks] for i in range(chunks)]
+        return list(zip(starts, starts[1:] + [self.filesize]))
+
+    def iter_range(self, start: int, end: int) -> typing.Generator[PcapRecord, None, None]:
+        """
+        Iterate through the records whose headers start in the byte range [start, end). start has to be the offset
+        of a record header, as returned by :meth:`Pcap.partition`. When the file is not memory mapped this moves the
+        position of the normal iteration
+
+        :param start: Offset of the first record header
+        :type start: int
+        :param end: Offset at which to stop
+        :type end: int
+        :rtype: collections.Iterable[PcapRecord]
+        """
+        offset = start
+        if self._map is None:
+            self.fopen.seek(start)
+        while offset < end:
+            try:
+                if self._map is not None:
+                    pcaprecord = self._mmap_record(offset)
+                else:
+                    pcaprecord = self._read_record()
+            except StopIteration:
+                return
+            offset += Pcap.RECORD_HEADER_SIZE + pcaprecord.incl_len
+            yield pcaprecord
+
+
+class PcapNgInterface(object):
+    """
+    A capture interface described by an Interface Description Block in a pcapng file. Each record in the file
+    refers to its interface which defines the link type and the resolution of the timestamp
+
+    :param linktype: Link-layer header type. http://www.tcpdump.org/linktypes.html
+    :type linktype: int
+    :param snaplen: Maximum number of bytes captured from each packet. 0 is unlimited
+    :type snaplen: int
+    :param tsresol: The if_tsresol option. Bit 7 clear is a negative power of 10, set is a negative power of 2
+    :type tsresol: int
+    """
+
+    def __init__(self, linktype: int = 1, snaplen: int = 0, tsresol: int = 6):
+        self.linktype: int = linktype  #: Link-layer header type
+        self.snaplen: int = snaplen  #: Maximum number of bytes captured from each packet
+        self.tsresol: int = tsresol  #: Timestamp resolution as encoded in the if_tsresol option
+        self.units_per_sec: int = 0  #: Number of timestamp units per second
+        self.set_tsresol(tsresol)
+
+    def set_tsresol(self, tsresol: int) -> None:
+        """
+        Set the timestamp resolution from the if_tsresol option
+
+        :type tsresol: int
+        """
+        self.tsresol = tsresol
+        if tsresol & 0x80:
+            self.units_per_sec = 2 ** (tsresol & 0x7F)
+        else:
+            self.units_per_sec = 10**tsresol
+
+    def __repr__(self):
+        return "LINKTYPE:{} SNAPLEN:{} UNITS_PER_SEC:{}".format(self.linktype, self.snaplen, self.units_per_sec)
+
+
+class PcapNg(object):
+    """
+    Read or write a pcapng file. The records are returned and written as :class:`PcapRecord` objects so the
+    iteration API is the same as :class:`Pcap`.
+
+    pcapng files are a sequence of blocks::
+
+        ---------------- ----------------- ----------------- ----------------- -----
+        Section Header  | Interface Descr | Enhanced Packet | Enhanced Packet | .....
+        ---------------- ----------------- ----------------- ----------------- -----
+
+    The Section Header, Interface Description, Enhanced Packet and Simple Packet blocks are decoded. Other blocks
+    are skipped. Each Interface Description defines the timestamp resolution of the records captured on it, which
+    is applied when the records are read. Files in either byte order and with multiple sections can be read.
+
+    When writing, one interface is created with the network and snaplen attributes and microsecond timestamps, or
+    nanosecond timestamps if nanosecond=True is passed. More can be added using :meth:`PcapNg.add_interface` before
+    writing any records.
+
+    >>> with PcapNg("_dummy.pcapng", mode='w') as p:
+    ...     r = PcapRecord()
+    ...     r.sec = 1419678111
+    ...     r.usec = 811463
+    ...     r.payload = bytes(3)
+    ...     p.write(r)
+    >>> with PcapNg("_dummy.pcapng") as p:
+    ...     for r in p:
+    ...         print(r, r.payload)
+    LEN:3 SEC:1419678111 USEC:811463 b'\\x00\\x00\\x00'
+
+    :param filename: The pcapng filename
+    :type filename: str
+
+    :Keyword Arguments:
+        * *mode* -- r: read w: write
+    """
+
+    SHB_MAGIC = b"\x0a\x0d\x0d\x0a"  #: Block type of the Section Header Block. Same in both byte orders
+    BYTE_ORDER_MAGIC = 0x1A2B3C4D
+    BLOCK_TYPE_SHB = 0x0A0D0D0A
+    BLOCK_TYPE_IDB = 0x1
+    BLOCK_TYPE_SPB = 0x3
+    BLOCK_TYPE_EPB = 0x6
+    OPTION_END = 0
+    OPTION_IF_TSRESOL = 9
+
+    BLOCK_HEADER_SIZE = 8  # Block type and block total length
+    EPB_FORMAT = "IIIII"  # Interface ID, timestamp high, timestamp low, captured length, original length
+    EPB_SIZE = struct.calcsize(EPB_FORMAT)
+
+    def __init__(self, filename: str, **kwargs):
+        self.filename: str = filename  #: The filename of the pcapng file
+        self.mode: str = kwargs.get("mode", "r")  #: The file mode. r or w
+        self._buffering: int = kwargs.get("buffering", -1)  #: File buffer size. -1=default, 0=unbuffered, >0=buffer size.
+        self.network: int = 1  #: Link-layer header type of the first interface
+        self.snaplen: int = 0  #: Snapshot length of the first interface. 0 is unlimited
+        self.versionmaj: int = 1  #: Section format major version
+        self.versionmin: int = 0  #: Section format minor version
+        self.interfaces: typing.List[PcapNgInterface] = []  #: The interfaces defined in the current section
+        self.filesize = 0
+        self.rec_no = 0  #: Number of the last record read or written
+
+        self._endian = "<"
+        self._epb_struct = struct.Struct(self._endian + PcapNg.EPB_FORMAT)
+
+        if self.mode not in ("r", "w"):
+            raise ValueError("pcapng files can only be opened for reading or writing")
+        self.fopen = None
+        try:
+            self.fopen = open(filename, f"{self.mode}b", self._buffering)
+        except Exception as e:
+            raise IOError(f"Failed to open {self.filename}. err={e}")
+
+        if self.mode == "r":
+            header = self.fopen.read(PcapNg.BLOCK_HEADER_SIZE)
+            if header[:4] != PcapNg.SHB_MAGIC:
+                self.fopen.close()
+                raise ValueError(f"{self.filename} is not a pcapng file")
+            self._read_section_header(header)
+            # Read ahead to the first packet so the interface attributes are populated
+            self._pending = self._read_next_record()
+        else:
+            self._write_section_header()
+            self.add_interface(self.network, self.snaplen, 9 if kwargs.get("nanosecond", False) else 6)
+
+        try:
+            self.filesize = os.path.getsize(filename)
+        except Exception as e:
+            self.filesize = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def flush(self):
+        return self.fopen.flush()
+
+    def close(self):
+        """
+        Close the current pcapng file
+
+        :rtype: None
+        """
+        self.fopen.close()
+
+    def _read_section_header(self, header: bytes) -> None:
+        """
+        Decode the Section Header Block. The byte order magic sets the endianness of the rest of the section
+
+        :param header: The block type and total length of the block already read
+        :type header: bytes
+        """
+        body = self.fopen.read(4)
+        if len(body) < 4:
+            raise StopIteration
+        if struct.unpack("<I", body)[0] == PcapNg.BYTE_ORDER_MAGIC:
+            self._endian = "<"
+        elif struct.unpack(">I", body)[0] == PcapNg.BYTE_ORDER_MAGIC:
+            self._endian = ">"
+        else:
+            raise ValueError("Invalid byte order magic in the pcapng section header")
+        self._epb_struct = struct.Struct(self._endian + PcapNg.EPB_FORMAT)
+        (total_len,) = struct.unpack_from(self._endian + "I", header, 4)
+        body = self.fopen.read(total_len - PcapNg.BLOCK_HEADER_SIZE - 4)
+        (self.versionmaj, self.versionmin) = struct.unpack_from(self._endian + "HH", body)
+        self.interfaces = []
+
+    def _read_interface(self, body: bytes) -> None:
+        """
+        Decode an Interface Description Block and add it to the interfaces of this section
+
+        :param body: The block after the block header
+        :type body: bytes
+        """
+        (linktype, _reserved, snaplen) = struct.unpack_from(self._endian + "HHI", body)
+        interface = PcapNgInterface(linktype, snaplen)
+        # The options run to the trailing block length
+        offset = 8
+        end = len(body) - 4
+        while offset + 4 <= end:
+            (code, length) = struct.unpack_from(self._endian + "HH", body, offset)
+            if code == PcapNg.OPTION_END:
+                break
+            if code == PcapNg.OPTION_IF_TSRESOL:
+                interface.set_tsresol(body[offset + 4])
+            offset += 4 + length + (-length % 4)
+        if len(self.interfaces) == 0:
+            self.network = linktype
+            self.snaplen = snaplen
+        self.interfaces.append(interface)
+
+    def _read_next_record(self) -> typing.Optional[PcapRecord]:
+        """
+        Read blocks until the next packet block and return it as a record. Returns None at the end of the file
+
+        :rtype: PcapRecord
+        """
+        read = self.fopen.read
+        while True:
+            header = read(PcapNg.BLOCK_HEADER_SIZE)
+            if len(header) < PcapNg.BLOCK_HEADER_SIZE:
+                return None
+            if header[:4] == PcapNg.SHB_MAGIC:
+                self._read_section_header(header)
+                continue
+            (block_type, total_len) = struct.unpack(self._endian + "II", header)
+            if block_type == PcapNg.BLOCK_TYPE_EPB:
+                fields = read(PcapNg.EPB_SIZE)
+                if len(fields) < PcapNg.EPB_SIZE:
+                    return None
+                (interface_id, ts_high, ts_low, cap_len, orig_len) = self._epb_struct.unpack(fields)
+                pcaprecord = PcapRecord()
+                pcaprecord.packet = read(cap_len)
+                pcaprecord.orig_len = orig_len
+                pcaprecord.interface_id = interface_id
+                units_per_sec = self.interfaces[interface_id].units_per_sec
+                (pcaprecord.sec, fraction) = divmod((ts_high << 32) | ts_low, units_per_sec)
+                pcaprecord.nsec = fraction * 1000000000 // units_per_sec
+                # Skip the padding, options and trailing length
+                read(total_len - PcapNg.BLOCK_HEADER_SIZE - PcapNg.EPB_SIZE - cap_len)
+                return pcaprecord
+            body = read(total_len - PcapNg.BLOCK_HEADER_SIZE)
+            if len(body) < total_len - PcapNg.BLOCK_HEADER_SIZE:
+                return None
+            if block_type == PcapNg.BLOCK_TYPE_IDB:
+                self._read_interface(body)
+            elif block_type == PcapNg.BLOCK_TYPE_SPB:
+                (orig_len,) = struct.unpack_from(self._endian + "I", body)
+                cap_len = min(orig_len, len(body) - 8)
+                if self.interfaces and self.interfaces[0].snaplen:
+                    cap_len = min(cap_len, self.interfaces[0].snaplen)
+                pcaprecord = PcapRecord()
+                pcaprecord.packet = body[4 : 4 + cap_len]
+                pcaprecord.orig_len = orig_len
+                return pcaprecord
+
+    def _write_section_header(self) -> None:
+        """
+        Write the Section Header Block to a new pcapng file. The section length is not specified
+        """
+        header = struct.pack("<IIIHHqI", PcapNg.BLOCK_TYPE_SHB, 28, PcapNg.BYTE_ORDER_MAGIC, 1, 0, -1, 28)
+        self.fopen.write(header)
+        self.filesize += len(header)
+
+    def add_interface(self, linktype: int = 1, snaplen: int = 0, tsresol: int = 6) -> int:
+        """
+        Add an interface to the pcapng file being written. Returns the interface ID to set on the records
+
+        :param linktype: Link-layer header type. http://www.tcpdump.org/linktypes.html
+        :type linktype: int
+        :param snaplen: Maximum number of bytes captured from each packet. 0 is unlimited
+        :type snaplen: int
+        :param tsresol: The if_tsresol option. 6 is microseconds, 9 is nanoseconds
+        :type tsresol: int
+        :rtype: int
+        """
+        block = struct.pack(
+            "<IIHHIHHBxxxHHI",
+            PcapNg.BLOCK_TYPE_IDB,
+            32,
+            linktype,
+            0,
+            snaplen,
+            PcapNg.OPTION_IF_TSRESOL,
+            1,
+            tsresol,
+            PcapNg.OPTION_END,
+            0,
+            32,
+        )
+        self.fopen.write(block)
+        self.filesize += len(block)
+        self.interfaces.append(PcapNgInterface(linktype, snaplen, tsresol))
+        return len(self.interfaces) - 1
+
+    def write(self, pcaprecord: PcapRecord) -> None:
+        """
+        Write the supplied pcaprecord to the pcapng file as an Enhanced Packet Block
+
+        :param pcaprecord: The Pcap Record to write
+        :type pcaprecord: PcapRecord
+        """
+        units_per_sec = self.interfaces[pcaprecord.interface_id].units_per_sec
+        timestamp = pcaprecord.sec * units_per_sec + pcaprecord.nsec * units_per_sec // 1000000000
+        payload = pcaprecord.payload
+        cap_len = len(payload)
+        padding = -cap_len % 4
+        total_len = PcapNg.BLOCK_HEADER_SIZE + PcapNg.EPB_SIZE + cap_len + padding + 4
+        header = struct.pack(
+            "<IIIIIII",
+            PcapNg.BLOCK_TYPE_EPB,
+            total_len,
+            pcaprecord.interface_id,
+            timestamp >> 32,
+            timestamp & 0xFFFFFFFF,
+            cap_len,
+            pcaprecord.orig_len,
+        )
+        self.fopen.write(header)
+        self.fopen.write(payload)
+        self.fopen.write(bytes(padding) + struct.pack("<I", total_len))
+        self.rec_no += 1
+        self.filesize += total_len
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        pcaprecord = self._pending
+        if pcaprecord is None:
+            raise StopIteration
+        self._pending = self._read_next_record()
+        self.rec_no += 1
+        return pcaprecord
+
+    __next__ = next
@@ -0,0 +1,177 @@
+"""
+.. module:: PcapParallel
+    :platform: Unix, Windows
+    :synopsis: Analyse pcap files in parallel across multiple processes
+
+.. moduleauthor:: Diarmuid Collins <dcollins@curtisswright.com>
+
+"""
+
+__author__ = "Diarmuid Collins"
+__maintainer__ = "Diarmuid Collins"
+__email__ = "dcollins@curtisswright.com"
+__status__ = "Production"
+
+
+import os
+import glob
+import typing
+import logging
+from concurrent.futures import ProcessPoolExecutor
+import AcraNetwork.Pcap as pcap
+
+
+logger = logging.getLogger(__name__)
+
+
+class PcapReducer(object):
+    """
+    Base class for the analysis run by :func:`parallel_reduce`. A new reducer is created for each chunk of a pcap
+    file and every record in the chunk is passed to :meth:`PcapReducer.update`. The reducers of all the chunks are
+    then combined with :meth:`PcapReducer.merge`, in the order that the chunks appear in the files.
+
+    As the merge is ordered, state that spans a chunk boundary can be resolved there. For example, to track
+    sequence numbers, keep the first and last sequence number seen per stream in each chunk and compare the last of
+    one chunk with the first of the next in merge.
+
+    The reducer is returned from the worker process, so it has to be picklable and defined at module level. The
+    record payloads are bytes, so they can be kept in the reducer::
+
+        class ByteCount(PcapReducer):
+            def __init__(self):
+                self.count = 0
+
+            def update(self, record):
+                self.count += len(record.payload)
+
+            def merge(self, other):
+                self.count += other.count
+
+        total_bytes = parallel_reduce("capture.pcap", ByteCount).count
+    """
+
+    def update(self, record: pcap.PcapRecord) -> None:
+        """
+        Add one record to the analysis
+
+        :type record: PcapRecord
+        """
+        raise NotImplementedError("update is not implemented")
+
+    def merge(self, other: "PcapReducer") -> None:
+        """
+        Combine the analysis of the chunk that follows this one into this reducer
+
+        :type other: PcapReducer
+        """
+        raise NotImplementedError("merge is not implemented")
+
+
+#: The files that are analysed when a folder is passed to :func:`parallel_reduce`
+FILE_PATTERNS = ("*.pcap", "*.pcapng") + tuple("*.pcap" + extension for extension in pcap.COMPRESSION_EXTENSIONS)
+
+
+def _reduce_range(
+    filename: str,
+    start: typing.Optional[int],
+    end: typing.Optional[int],
+    reducer_factory: typing.Callable[[], PcapReducer],
+) -> PcapReducer:
+    """
+    Worker process task. Run a new reducer over one byte range of a pcap file, or over the whole file if start is
+    None. The file is not memory mapped so that the payloads are bytes, which the reducer can pickle
+    """
+    reducer = reducer_factory()
+    update = reducer.update
+    if start is None:
+        with _open(filename) as p:
+            for record in p:
+                update(record)
+    else:
+        with pcap.Pcap(filename) as p:
+            for record in p.iter_range(start, end):
+                update(record)
+    return reducer
+
+
+def _is_pcapng(filename: str) -> bool:
+    with open(filename, "rb") as f:
+        return f.read(4) == pcap.PcapNg.SHB_MAGIC
+
+
+def _open(filename: str) -> typing.Union[pcap.Pcap, pcap.PcapNg]:
+    """
+    Open a pcap or pcapng file for reading
+    """
+    if _is_pcapng(filename):
+        return pcap.PcapNg(filename)
+    return pcap.Pcap(filename)
+
+
+def _find_files(filenames: typing.Union[str, typing.List[str]]) -> typing.List[str]:
+    """
+    Expand a folder into the pcap files it contains
+    """
+    if isinstance(filenames, str):
+        if os.path.isdir(filenames):
+            return sorted(f for pattern in FILE_PATTERNS for f in glob.glob(os.path.join(filenames, pattern)))
+        return [filenames]
+    return list(filenames)
+
+
+def parallel_reduce(
+    filenames: typing.Union[str, typing.List[str]],
+    reducer_factory: typing.Callable[[], PcapReducer],
+    workers: typing.Optional[int] = None,
+    chunks_per_worker: int = 4,
+) -> typing.Optional[PcapReducer]:
+    """
+    Analyse one or more pcap files in parallel. Each file is split into record aligned chunks using the record
+    index, see :meth:`AcraNetwork.Pcap.Pcap.partition`, and each chunk is processed by a new reducer in a pool of
+    worker processes. Compressed pcap files and pcapng files have no record index, so each of them is one chunk. The
+    reducers are merged in file and chunk order and the merged reducer is returned. None is returned if there are no
+    records.
+
+    :param filenames: A pcap filename, a list of filenames or a folder containing pcap, pcapng or compressed pcap
+        files, see :data:`FILE_PATTERNS`
+    :type filenames: str|list[str]
+    :param reducer_factory: Called with no arguments to create a :class:`PcapReducer`. Typically the class itself.
+        Has to be picklable
+    :type reducer_factory: collections.Callable
+    :param workers: The number of worker processes. Defaults to the number of CPUs
+    :type workers: int
+    :param chunks_per_worker: The files are split into roughly this many chunks per worker to balance the load
+    :type chunks_per_worker: int
+    :rtype: PcapReducer
+    """
+    filenames = _find_files(filenames)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    total_chunks = workers * chunks_per_worker
+    total_size = sum(os.path.getsize(f) for f in filenames) or 1
+
+    tasks = []
+    for filename in filenames:
+        # Big files get proportionally more chunks
+        chunks = max(1, total_chunks * os.path.getsize(filename) // total_size)
+        if _is_pcapng(filename):
+            tasks.append((filename, None, None))
+            continue
+        with pcap.Pcap(filename) as p:
+            if p.compression is not None:
+                tasks.append((filename, None, None))
+                continue
+            for start, end in p.partition(chunks):
+                tasks.append((filename, start, end))
+    logger.debug(f"Split {len(filenames)} files into {len(tasks)} chunks")
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_reduce_range, f, start, end, reducer_factory) for (f, start, end) in tasks]
+        result = None
+        for future in futures:
+            reducer = future.result()
+            if result is None:
+                result = reducer
+            else:
+                result.merge(reducer)
+    return result
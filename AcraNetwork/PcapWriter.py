@@ -0,0 +1,224 @@
+"""
+.. module:: PcapWriter
+    :platform: Unix, Windows
+    :synopsis: Write long recordings to a series of pcap files
+
+.. moduleauthor:: Diarmuid Collins <dcollins@curtisswright.com>
+
+"""
+
+__author__ = "Diarmuid Collins"
+__maintainer__ = "Diarmuid Collins"
+__email__ = "dcollins@curtisswright.com"
+__status__ = "Production"
+
+
+import os
+import queue
+import typing
+import logging
+import threading
+from functools import partial
+import AcraNetwork.Pcap as pcap
+
+
+logger = logging.getLogger(__name__)
+
+
+class RotatingPcapWriter(object):
+    """
+    Write records to a series of pcap files, moving on to the next file when the current one reaches max_bytes or
+    spans max_seconds of record time. The files are named by inserting a number before the extension, so
+    rec.pcap is written as rec_00000.pcap, rec_00001.pcap and so on.
+
+    Opening and closing the files is done by a background thread so :meth:`RotatingPcapWriter.write` does not
+    block on a rollover. The next file is opened, with its global header written, while the current one is being
+    filled. If max_files is set, only the newest max_files files are kept, as a ring buffer.
+
+    >>> with RotatingPcapWriter("_rotating.pcap", max_bytes=1000, max_files=2) as w:
+    ...     for i in range(100):
+    ...         w.write_raw(1700000000, i, bytes(50))
+    >>> print(w.filenames)
+    ['_rotating_00006.pcap', '_rotating_00007.pcap']
+    >>> for f in w.filenames:
+    ...     os.remove(f)
+
+    :param filename: The base filename
+    :type filename: str
+    :param max_bytes: Size of a file before moving on to the next one
+    :type max_bytes: int
+    :param max_seconds: Span of the record timestamps in a file before moving on to the next one
+    :type max_seconds: float
+    :param max_files: The number of files to keep. None to keep them all
+    :type max_files: int
+
+    :Keyword Arguments:
+        The other keyword arguments are passed to :class:`AcraNetwork.Pcap.Pcap` for each file, for example
+        nanosecond, byteorder or compression
+    """
+
+    def __init__(
+        self,
+        filename: str,
+        max_bytes: typing.Optional[int] = None,
+        max_seconds: typing.Optional[float] = None,
+        max_files: typing.Optional[int] = None,
+        **kwargs,
+    ):
+        if max_bytes is None and max_seconds is None:
+            raise ValueError("Set max_bytes or max_seconds")
+        if max_files is not None and max_files < 1:
+            raise ValueError("max_files should be at least 1")
+        self.filename: str = filename  #: The base filename
+        self.max_bytes: typing.Optional[int] = max_bytes  #: Size of a file before moving on to the next one
+        self.max_seconds: typing.Optional[float] = max_seconds  #: Span of record time in one file
+        self.max_files: typing.Optional[int] = max_files  #: Number of files kept. None to keep all
+        self.filenames: typing.List[str] = []  #: The files kept, oldest first. The last one is being written
+
+        (root, ext) = os.path.splitext(filename)
+        if ext.lower() in pcap.COMPRESSION_EXTENSIONS:
+            (root, inner_ext) = os.path.splitext(root)
+            ext = inner_ext + ext
+        self._filename_format = root + "_{:05d}" + ext
+        self._pcap_kwargs = dict(kwargs, mode="w")
+        self._next_number = 0
+        self._tasks: queue.Queue = queue.Queue()  # Work for the background thread. None to stop it
+        self._spares: queue.Queue = queue.Queue()  # Files opened by the background thread, ready to be written
+        self._error: typing.Optional[Exception] = None  # The first failure in the background thread
+        self._pcap: typing.Optional[pcap.Pcap] = None
+        self._bytes = 0  # Size of the current file
+        self._first_ns: typing.Optional[int] = None  # Timestamp of the first record in the current file
+
+        self._thread = threading.Thread(target=self._run, name="RotatingPcapWriter", daemon=True)
+        self._thread.start()
+        self._request_file()
+        try:
+            self._next_file()
+        except IOError:
+            self._tasks.put(None)
+            self._thread.join()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _run(self) -> None:
+        while True:
+            task = self._tasks.get()
+            if task is None:
+                return
+            task()
+
+    def _open_file(self, fname: str) -> None:
+        """Run in the background thread. Open the next file and pass it, or the failure, to the writer"""
+        try:
+            self._spares.put(pcap.Pcap(fname, **self._pcap_kwargs))
+        except Exception as e:
+            self._spares.put(e)
+
+    def _retire_file(self, pcapfile: pcap.Pcap, expired: typing.List[str]) -> None:
+        """Run in the background thread. Close a finished file and delete the files that dropped out of the ring"""
+        try:
+            pcapfile.close()
+            for fname in expired:
+                os.remove(fname)
+        except Exception as e:
+            logger.error(f"Failed to close {pcapfile.filename}. err={e}")
+            if self._error is None:
+                self._error = e
+
+    def _request_file(self) -> None:
+        fname = self._filename_format.format(self._next_number)
+        self._next_number += 1
+        self._tasks.put(partial(self._open_file, fname))
+
+    def _next_file(self) -> None:
+        """Switch to the file opened in the background and request the one after it"""
+        spare = self._spares.get()
+        if isinstance(spare, Exception):
+            raise IOError(f"Failed to open the next pcap file. err={spare}")
+        if self._pcap is not None:
+            self._tasks.put(partial(self._retire_file, self._pcap, self._expire()))
+        self._pcap = spare
+        self.filenames.append(spare.filename)
+        self._bytes = pcap.Pcap.GLOBAL_HEADER_SIZE
+        self._first_ns = None
+        self._request_file()
+
+    def _expire(self) -> typing.List[str]:
+        """Drop the oldest files from the list, including the one being retired, to leave room for the next"""
+        if self.max_files is None or len(self.filenames) < self.max_files:
+            return []
+        expired = self.filenames[: len(self.filenames) - self.max_files + 1]
+        del self.filenames[: len(expired)]
+        return expired
+
+    def _rollover(self, timestamp_ns: int, size: int) -> None:
+        """Move on to the next file if the record would take the current one over its limits"""
+        if self._error is not None:
+            raise IOError(f"Failed to close a pcap file. err={self._error}")
+        if self._first_ns is None:
+            self._first_ns = timestamp_ns
+        elif (self.max_bytes is not None and self._bytes + size > self.max_bytes) or (
+            self.max_seconds is not None and timestamp_ns - self._first_ns >= self.max_seconds * 1e9
+        ):
+            self._next_file()
+            self._first_ns = timestamp_ns
+        self._bytes += size
+
+    def write(self, pcaprecord: pcap.PcapRecord) -> None:
+        """
+        Write a record to the current file
+
+        :type pcaprecord: PcapRecord
+        """
+        self._rollover(
+            pcaprecord.sec * 1_000_000_000 + pcaprecord.nsec, pcap.Pcap.RECORD_HEADER_SIZE + pcaprecord.incl_len
+        )
+        self._pcap.write(pcaprecord)
+
+    def write_raw(self, sec: int, usec: int, payload: bytes, orig_len: typing.Optional[int] = None) -> None:
+        """
+        Write a record to the current file without creating a :class:`AcraNetwork.Pcap.PcapRecord`. See
+        :meth:`AcraNetwork.Pcap.Pcap.write_raw`
+
+        :type sec: int
+        :type usec: int
+        :type payload: bytes
+        :type orig_len: int
+        """
+        self._rollover(sec * 1_000_000_000 + usec * 1000, pcap.Pcap.RECORD_HEADER_SIZE + len(payload))
+        self._pcap.write_raw(sec, usec, payload, orig_len)
+
+    def write_raw_ns(self, sec: int, nsec: int, payload: bytes, orig_len: typing.Optional[int] = None) -> None:
+        """
+        As :meth:`RotatingPcapWriter.write_raw` with a nanosecond timestamp
+
+        :type sec: int
+        :type nsec: int
+        :type payload: bytes
+        :type orig_len: int
+        """
+        self._rollover(sec * 1_000_000_000 + nsec, pcap.Pcap.RECORD_HEADER_SIZE + len(payload))
+        self._pcap.write_raw_ns(sec, nsec, payload, orig_len)
+
+    def close(self) -> None:
+        """
+        Close the current file and wait for the background thread to finish. The file opened in advance for the
+        next rollover is removed
+        """
+        if self._pcap is None:
+            return
+        self._tasks.put(partial(self._retire_file, self._pcap, []))
+        self._pcap = None
+        self._tasks.put(None)
+        self._thread.join()
+        spare = self._spares.get()
+        if not isinstance(spare, Exception):
+            spare.close()
+            os.remove(spare.filename)
+        if self._error is not None:
+            raise IOError(f"Failed to close a pcap file. err={self._error}")
@@ -7,6 +7,7 @@ import struct
 
 
 PCM_HDR_LEN = 10
+_INETX_STREAM = struct.Struct(">4xII")  # The stream ID and sequence number of an iNetX header
 logger = logging.getLogger(__name__)
 
 
@@ -48,6 +49,196 @@ def string_matching_boyer_moore_horspool(text: str = "", pattern: str = "") -> t
     return offsets
 
 
+class FrameAligner(object):
+    """
+    Align a stream of PCM data to frame boundaries. Each complete frame is yielded as a memoryview, either into the
+    data passed to :meth:`FrameAligner.feed` or, for frames split across calls, into a fixed size ring buffer that
+    the data is copied to. Nothing is allocated per frame, and when the data is aligned to frames nothing is copied.
+    The frames are only valid until the next call to :meth:`FrameAligner.feed`, so copy them with bytes() to keep
+    them.
+
+    The aligner is in one of three states:
+
+    * SEARCH: Looking for the sync word. If the frame length is not known it is measured as the distance to the
+      next sync word
+    * CHECK: A sync word was found. The frames are yielded and once check consecutive frames start with the sync
+      word the aligner is locked. A frame without the sync word returns it to SEARCH
+    * LOCK: Locked to the frames. Up to flywheel consecutive frames with a corrupt sync word are yielded, assuming
+      that the alignment is still correct, before returning to SEARCH
+
+    >>> aligner = FrameAligner(b"\\xFE\\x6B", frame_length=6)
+    >>> for frame in aligner.feed(b"\\x00\\xFE\\x6B\\x00\\x01\\x02\\x03\\xFE\\x6B\\x00"):
+    ...     print(frame.hex(), aligner.state)
+    fe6b00010203 1
+    >>> for frame in aligner.feed(b"\\x01\\x02\\x03\\xFE\\x6B\\x00\\x01\\x02\\x03"):
+    ...     print(frame.hex(), aligner.state)
+    fe6b00010203 2
+    fe6b00010203 2
+
+    :param sync_word: The frame sync word at the start of each frame
+    :type sync_word: bytes
+    :param frame_length: The length of the frames in bytes. None to measure it from the sync words
+    :type frame_length: int
+    :param buffer_size: The size of the ring buffer in bytes
+    :type buffer_size: int
+    :param check: Number of frames with the sync word to go from CHECK to LOCK
+    :type check: int
+    :param flywheel: Number of consecutive frames without the sync word yielded in LOCK
+    :type flywheel: int
+    """
+
+    SEARCH = 0  #: (Object Constant) Searching for the sync word
+    CHECK = 1  #: (Object Constant) Checking that the frames following the sync word are aligned
+    LOCK = 2  #: (Object Constant) Locked to the frames
+
+    def __init__(
+        self,
+        sync_word: bytes,
+        frame_length: typing.Optional[int] = None,
+        buffer_size: int = 1 << 20,
+        check: int = 2,
+        flywheel: int = 1,
+    ):
+        if not sync_word:
+            raise ValueError("The sync word can not be empty")
+        if frame_length is not None and frame_length < len(sync_word):
+            raise ValueError("The frame length {} is shorter than the sync word".format(frame_length))
+        self.sync_word: bytes = bytes(sync_word)  #: The frame sync word
+        self.frame_length: typing.Optional[int] = frame_length  #: The frame length. Measured if not supplied
+        self.check: int = check  #: Number of frames with the sync word to lock
+        self.flywheel: int = flywheel  #: Number of frames without the sync word yielded before losing lock
+        self.state: int = FrameAligner.SEARCH  #: The state of the aligner
+        self.frames: int = 0  #: Number of frames yielded
+        self.flywheel_frames: int = 0  #: Number of frames yielded without a sync word
+        self.sync_losses: int = 0  #: Number of times that alignment was lost
+        self.discarded: int = 0  #: Number of bytes discarded while searching for the sync word or on overflow
+        self._buffer = bytearray(buffer_size)
+        self._view = memoryview(self._buffer)
+        self._start = 0  # The first byte not yet returned
+        self._end = 0  # The end of the data in the buffer
+        self._count = 0  # Frames with the sync word in CHECK, or consecutive frames without in LOCK
+
+    def __len__(self) -> int:
+        return self._end - self._start
+
+    def reset(self) -> None:
+        """
+        Discard the buffered data and search for the sync word again. Call it when data is lost, for example on a
+        gap in the packet sequence numbers
+        """
+        self.discarded += self._end - self._start
+        self._start = self._end = 0
+        self.state = FrameAligner.SEARCH
+
+    def _write(self, data: bytes) -> None:
+        """Append data to the buffer, moving the unread data to the start of the buffer when it reaches the end"""
+        size = len(data)
+        if self._end + size > len(self._buffer):
+            if size > len(self._buffer):
+                raise ValueError("{} bytes is larger than the buffer of {} bytes".format(size, len(self._buffer)))
+            overflow = self._end - self._start + size - len(self._buffer)
+            if overflow > 0:
+                logger.warning("Frame aligner buffer overflow. Discarding {} bytes".format(overflow))
+                self.discarded += overflow
+                self._start += overflow
+                self.state = FrameAligner.SEARCH
+            unread = self._end - self._start
+            self._view[:unread] = self._view[self._start : self._end]
+            self._start = 0
+            self._end = unread
+        self._view[self._end : self._end + size] = data
+        self._end += size
+
+    def _search(self) -> bool:
+        """Find the next sync word, and the frame length if it is not known. Returns False if more data is needed"""
+        buf = self._buffer
+        position = buf.find(self.sync_word, self._start, self._end)
+        if position < 0:
+            # Keep the end in case it is the start of a sync word
+            keep = max(self._start, self._end - len(self.sync_word) + 1)
+            self.discarded += keep - self._start
+            self._start = keep
+            return False
+        self.discarded += position - self._start
+        self._start = position
+        if self.frame_length is None:
+            following = buf.find(self.sync_word, position + 1, self._end)
+            if following < 0:
+                return False
+            self.frame_length = following - position
+            logger.debug("Measured frame length of {} bytes".format(self.frame_length))
+        self.state = FrameAligner.CHECK
+        self._count = 0
+        return True
+
+    def _aligned(self, synced: bool) -> bool:
+        """Update the state with the next frame. Returns False if the alignment is lost"""
+        if synced:
+            if self.state == FrameAligner.LOCK:
+                self._count = 0
+            else:
+                self._count += 1
+                if self._count >= self.check:
+                    self.state = FrameAligner.LOCK
+                    self._count = 0
+            self.frames += 1
+            return True
+        if self.state == FrameAligner.LOCK and self._count < self.flywheel:
+            self._count += 1
+            self.flywheel_frames += 1
+            self.frames += 1
+            return True
+        logger.warning("Fell out of alignment after frame {}".format(self.frames))
+        self.sync_losses += 1
+        self.state = FrameAligner.SEARCH
+        self.discarded += 1  # The byte at the start of the frame. The search starts from the next
+        return False
+
+    def feed(self, data: bytes) -> typing.Generator[memoryview, None, None]:
+        """
+        Add data to the stream and yield the frames completed
+
+        :param data: The next segment of the PCM stream
+        :type data: bytes|memoryview
+        :rtype: collections.Iterable[memoryview]
+        """
+        sync_word = self.sync_word
+        if self._start == self._end and self.state != FrameAligner.SEARCH:
+            # Nothing is buffered, so return the complete frames from data without copying them
+            view = memoryview(data)
+            length = self.frame_length
+            sync_end = len(sync_word)
+            position = 0
+            while position + length <= len(view):
+                synced = view[position : position + sync_end] == sync_word
+                if synced and self.state == FrameAligner.LOCK:
+                    # The usual case, handled here rather than in _aligned
+                    self._count = 0
+                    self.frames += 1
+                elif not self._aligned(synced):
+                    position += 1
+                    break
+                yield view[position : position + length]
+                position += length
+            if position == len(view):
+                return
+            data = view[position:]
+        self._write(data)
+        buf = self._buffer
+        while True:
+            if self.state == FrameAligner.SEARCH and not self._search():
+                return
+            start = self._start
+            end = start + self.frame_length
+            if end > self._end:
+                return
+            if not self._aligned(buf.startswith(sync_word, start)):
+                self._start = start + 1
+                continue
+            self._start = end
+            yield self._view[start:end]
+
+
 class SamDec008(object):
     """
     The SAM/DEC/008 is a USB power PCM decommutator (https://www.curtisswrightds.com/products/flight-test/ground-stations/samdec008)
@@ -55,7 +246,8 @@ class SamDec008(object):
     Once configured it will convert PCM frames into iNetX packets over UDP
 
     This class will capture UDP packets from the network, extract the iNetX payload and align the data to PCM frame
-    boundaries. It will return PCM frames as bytes
+    boundaries with a :class:`FrameAligner`. It will return PCM frames as memoryviews that are valid until the next
+    frame is requested
 
     Supply the UDP port and the IP Address of the correct network interface card on your PC
     You can use ''  to let you OS decide
@@ -79,14 +271,14 @@ class SamDec008(object):
         self.recv_sockets = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         self.recv_sockets.settimeout(timeout)
         self.recv_sockets.bind((localaddress, udp_port))
+        self._recv_buffer = bytearray(10000)
 
-        self._current_aligned = True
-        self._payload_offset = 0
         self._sequence = None
 
         self.streamid = 0x153  #: StreamID on which to capture the SAM/DEC data. Default of 0x153 should be ok
         self.frame_length = None  #: This will be populated when seraching for frame sync words
         self.sync_word = 0xFE6B2840  #: The Frame sync word.
+        self.aligner: typing.Optional[FrameAligner] = None  #: The :class:`FrameAligner` created by frames()
 
     def close(self):
         self.recv_sockets.close()
@@ -97,62 +289,42 @@ class SamDec008(object):
 
         :rtype: collections.Iterable[str]
         """
+        view = memoryview(self._recv_buffer)
         while True:
             try:
-                data, addr = self.recv_sockets.recvfrom(10000)
+                size = self.recv_sockets.recv_into(self._recv_buffer)
             except Exception as e:
                 yield None
             else:
-                yield data
+                yield view[:size]
 
     def frames(self) -> typing.Generator[bytes, None, None]:
         """Get the data from the underlying source, combine the IP fragments and then pull out the payload from the
         inetx packets and align them
 
+        Frames can span packets. A gap in the iNetX sequence numbers discards the partial frame and the alignment
+        is searched for again
+
         Yields:
-            bytes: the payload captured
+            memoryview: the PCM frame, valid until the next frame is requested
         """
-        sync_packed = struct.pack(">I", self.sync_word)
+        self.aligner = FrameAligner(struct.pack(">I", self.sync_word), self.frame_length)
+        pcm_offset = inetx.iNetX.INETX_HEADER_LENGTH + PCM_HDR_LEN  # The SAM DEC inserts some header
         for udp_payload in self._get_data():
             if udp_payload is None:
                 return
-            inetx_pkt = inetx.iNetX()
-            try:
-                inetx_pkt.unpack(udp_payload)
-            except Exception as e:
+            if len(udp_payload) < pcm_offset:
                 continue
-            else:
-                self._payload_offset = PCM_HDR_LEN  # The SAM DEC inserts some header
-                if inetx_pkt.streamid == self.streamid:
-                    if self._sequence is not None:
-                        if self._sequence + 1 % pow(2, 64) == inetx_pkt.sequence:
-                            logger.warning(
-                                "Missing Sequence number at {}. Is SAM/DEC dropping?".format(inetx_pkt.sequence)
-                            )
-                    # Start with the previous segment and the current payload
-                    payload = inetx_pkt.payload
-
-                    if self.frame_length is None:
-                        offset = string_matching_boyer_moore_horspool(payload, sync_packed)
-                        if len(offset) == 0:
-                            raise Exception("No Frame sync found")
-                        elif len(offset) == 1:
-                            self.frame_length = len(payload) - PCM_HDR_LEN
-                        else:
-                            self.frame_length = offset[1] - offset[0]
-
-                    # If we get to within the last 4 bytes then hold it until the next segment
-                    while (self._payload_offset + self.frame_length) <= len(payload):
-                        # We have enough for a full frame
-                        frame_buffer = payload[self._payload_offset : self._payload_offset + self.frame_length]
-                        self._payload_offset += self.frame_length
-                        # Verify that we are still in sync
-                        if frame_buffer[:4] != sync_packed:
-                            # Not in sync.
-                            print("ERROR:Fell out of alignment at offset {}".format(self._payload_offset))
-                            self.frame_length = None
-                        else:
-                            yield frame_buffer
+            (streamid, sequence) = _INETX_STREAM.unpack_from(udp_payload)
+            if streamid != self.streamid:
+                continue
+            if self._sequence is not None and sequence != (self._sequence + 1) % (1 << 32):
+                logger.warning("Missing Sequence number at {}. Is SAM/DEC dropping?".format(sequence))
+                self.aligner.reset()
+            self._sequence = sequence
+            for frame in self.aligner.feed(memoryview(udp_payload)[pcm_offset:]):
+                self.frame_length = self.aligner.frame_length
+                yield frame
 
 
 class SamDecPcap(SamDec008):
@@ -162,7 +334,7 @@ class SamDecPcap(SamDec008):
     Once configured it will convert PCM frames into iNetX packets over UDP
 
     This class will take iNetx packet fromn a pcap file, extract the iNetX payload and align the data to PCM frame
-    boundaries. It will return PCM frames as bytes
+    boundaries. It will return PCM frames as memoryviews that are valid until the next frame is requested
 
     :param pcap_fname: The PCAP filename
     :type pcap_fname: str
@@ -183,13 +355,12 @@ class SamDecPcap(SamDec008):
 
         self._pcap = pcap.Pcap(pcap_fname, mode="r")
 
-        self._current_aligned = True
-        self._payload_offset = 0
         self._sequence = None
 
         self.streamid = 0x153  #: StreamID on which to capture the SAM/DEC data. Default of 0x153 should be ok
         self.frame_length = None  #: This will be populated when seraching for frame sync words
         self.sync_word = 0xFE6B2840  #: The Frame sync word.
+        self.aligner: typing.Optional[FrameAligner] = None  #: The :class:`FrameAligner` created by frames()
 
     def close(self):
         self._pcap.close()
@@ -22,10 +22,18 @@ from zlib import crc32
 import logging
 import typing
 import enum
+import time
 
 
 logger = logging.getLogger(__name__)
 
+try:
+    import numpy
+
+    _numpy_available = True
+except ImportError:
+    _numpy_available = False
+
 
 def unpack48(x: bytes) -> int:
     """
@@ -62,6 +70,33 @@ def mactoreadable(macaddress: int) -> str:
     return "{:02X}:{:02X}:{:02X}:{:02X}:{:02X}:{:02X}".format(b[5], b[4], b[3], b[2], b[1], b[0])
 
 
+def ones_complement_sum(*buffers: bytes) -> int:
+    """
+    The 16 bit ones complement sum of the big endian words in the buffers, as used by the IP, UDP and ICMP
+    checksums. A buffer with an odd length is padded with a zero byte, so only the last buffer should have an odd
+    length.
+
+    As 2**16 is 1 modulo 0xFFFF, the sum with end around carry is the whole buffer taken as one integer modulo
+    0xFFFF, with 0xFFFF instead of 0 for a non zero buffer. So the words are summed in C by int.from_bytes instead of
+    unpacking them one by one.
+
+    :param buffers: bytes, bytearray or memoryview
+    :rtype: int
+    """
+    total = 0
+    nonzero = False
+    for buf in buffers:
+        value = int.from_bytes(buf, "big")
+        if len(buf) % 2:
+            value <<= 8
+        total += value % 0xFFFF
+        nonzero = nonzero or value != 0
+    total %= 0xFFFF
+    if total == 0 and nonzero:
+        return 0xFFFF
+    return total
+
+
 def ip_calc_checksum(pkt: bytes) -> int:
     """
     Calculate the checksum of a packet
@@ -70,14 +105,61 @@ def ip_calc_checksum(pkt: bytes) -> int:
     :type pkt: str|bytes
     :return:
     """
+    return ~ones_complement_sum(pkt) & 0xFFFF
+
+
+def _pseudo_header(
+    srcip: typing.Union[str, bytes], dstip: typing.Union[str, bytes], length: int, protocol: int
+) -> bytes:
+    """The IPv4 or IPv6 pseudo header that is included in the UDP and TCP checksums"""
+    if isinstance(srcip, str):
+        family = socket.AF_INET6 if ":" in srcip else socket.AF_INET
+        srcip = socket.inet_pton(family, srcip)
+        dstip = socket.inet_pton(family, dstip)
+    if len(srcip) == 16:
+        return srcip + dstip + struct.pack(">I3xB", length, protocol)
+    return srcip + dstip + struct.pack(">xBH", protocol, length)
+
+
+def udp_calc_checksum(srcip: typing.Union[str, bytes], dstip: typing.Union[str, bytes], segment: bytes) -> int:
+    """
+    Calculate the UDP checksum, including the IPv4 or IPv6 pseudo header
+
+    >>> u = UDP()
+    >>> u.srcport, u.dstport, u.payload = 4400, 5500, bytes(10)
+    >>> hex(udp_calc_checksum("192.168.1.1", "235.0.0.1", u.pack()))
+    '0x2c73'
+
+    :param srcip: The source address. A string, or the 4 or 16 byte packed address
+    :type srcip: str|bytes
+    :param dstip: The destination address
+    :type dstip: str|bytes
+    :param segment: The UDP header and payload with the checksum field set to 0
+    :type segment: bytes
+    :rtype: int
+    """
+    checksum = ~ones_complement_sum(_pseudo_header(srcip, dstip, len(segment), IP.PROTOCOL_UDP), segment) & 0xFFFF
+    # 0 means no checksum, so a computed 0 is transmitted as all ones
+    return checksum or 0xFFFF
 
-    if len(pkt) % 2 == 1:
-        pkt += b"\0"
-    s = sum(struct.unpack(">{}H".format(len(pkt) // 2), pkt))
-    s = (s >> 16) + (s & 0xFFFF)
-    s += s >> 16
-    s = ~s
-    return s & 0xFFFF
+
+def udp_verify_checksum(srcip: typing.Union[str, bytes], dstip: typing.Union[str, bytes], segment: bytes) -> bool:
+    """
+    Verify the UDP checksum of a segment. A checksum of 0 over IPv4 means that the sender did not compute one, so
+    the segment is accepted
+
+    :param srcip: The source address. A string, or the 4 or 16 byte packed address
+    :type srcip: str|bytes
+    :param dstip: The destination address
+    :type dstip: str|bytes
+    :param segment: The UDP header and payload
+    :type segment: bytes
+    :rtype: bool
+    """
+    pseudo_header = _pseudo_header(srcip, dstip, len(segment), IP.PROTOCOL_UDP)
+    if len(pseudo_header) == 12 and segment[6] == 0 and segment[7] == 0:
+        return True
+    return ones_complement_sum(pseudo_header, segment) == 0xFFFF
 
 
 class EthType(enum.IntEnum):
@@ -105,6 +187,8 @@ class Ethernet(object):
 
     """
 
+    __slots__ = ("type", "srcmac", "dstmac", "payload", "vlan", "vlantag")
+
     HEADERLEN = 14
     HEADERLEN_VLAN = 18
     TYPE_IP = EthType.TYPE_IPv4
@@ -243,6 +327,21 @@ class IP(object):
 
     """
 
+    __slots__ = (
+        "srcip",
+        "dstip",
+        "len",
+        "flags",
+        "fragment_offset",
+        "protocol",
+        "payload",
+        "version",
+        "ihl",
+        "dscp",
+        "id",
+        "ttl",
+    )
+
     PROTOCOL_ICMP = 0x01  # :(Object Constant) ICMP Protocol Constant
     PROTOCOL_IGMP = 0x02  # :(Object Constant) IGMP Protocol Constant
     PROTOCOL_TCP = 0x6  # :(Object Constant) TCP Protocol Constant
@@ -372,12 +471,52 @@ class IP(object):
 
 
 class IPv4(IP):
+    __slots__ = ()
+
     pass
 
 
+def _ipv6_walk(buf: bytes, next_header: int, offset: int, end: int) -> tuple:
+    """
+    Walk the IPv6 extension headers that start at offset, after the fixed header, with next_header from the fixed
+    header. Returns the upper layer protocol, the offset of the upper layer payload, the (type, start, end) of
+    each extension header and the (fragment offset, more fragments, identification) of a fragment header or None
+    """
+    extension_headers = []
+    fragment = None
+    while next_header in IPv6.EXTENSION_HEADERS:
+        if offset + 8 > end:
+            raise ValueError("Buffer too short for the IPv6 extension headers")
+        if next_header == IPv6.NEXT_HEADER_FRAGMENT:
+            header_len = 8
+            (offset_flags, identification) = struct.unpack_from(">HI", buf, offset + 2)
+            fragment = ((offset_flags >> 3) * 8, offset_flags & 0x1, identification)
+        else:
+            header_len = (buf[offset + 1] + 1) * 8
+        if offset + header_len > end:
+            raise ValueError("Buffer too short for the IPv6 extension headers")
+        extension_headers.append((next_header, offset, offset + header_len))
+        next_header = buf[offset]
+        offset += header_len
+    return next_header, offset, extension_headers, fragment
+
+
 class IPv6(object):
     """
-    Create an IPv6 packet https://en.wikipedia.org/wiki/IPv6_packet
+    Create or unpack an IPv6 packet https://en.wikipedia.org/wiki/IPv6_packet
+
+    When unpacking, the hop-by-hop options, routing, fragment and destination options extension headers are walked
+    to find the upper layer protocol and payload. The payload is a slice of the buffer, so unpacking a memoryview
+    does not copy it. Fragments can be reassembled with :class:`IPReassembler`
+
+    >>> i = IPv6()
+    >>> i.srcip = 0xFE800000000000000000000000000001
+    >>> i.dstip = 0xFF020000000000000000000000010002
+    >>> i.extension_headers = [(IPv6.NEXT_HEADER_HOP_BY_HOP, struct.pack(">BB6x", IP.PROTOCOL_UDP, 0))]
+    >>> i.payload = bytes(8)
+    >>> i2 = IPv6(i.pack())
+    >>> print(i2.protocol, i2.len, i2.srcip_readable)
+    17 16 fe80::1
 
     :type version
     :type traffic_class
@@ -390,9 +529,38 @@ class IPv6(object):
 
     """
 
+    __slots__ = (
+        "version",
+        "traffic_class",
+        "flow_label",
+        "len",
+        "next_header",
+        "hop_limit",
+        "srcip",
+        "dstip",
+        "extension_headers",
+        "protocol",
+        "fragment_offset",
+        "flags",
+        "id",
+        "payload",
+    )
+
     FLAG_DONT_FRAGMENT = 0x2
     FLAG_MORE_FRAGMENTS = 0x1
 
+    NEXT_HEADER_HOP_BY_HOP = 0  #: Hop-by-hop options extension header
+    NEXT_HEADER_ROUTING = 43  #: Routing extension header
+    NEXT_HEADER_FRAGMENT = 44  #: Fragment extension header
+    NEXT_HEADER_DESTINATION_OPTIONS = 60  #: Destination options extension header
+    NEXT_HEADER_NONE = 0x3B  #: No next header
+    EXTENSION_HEADERS = (
+        NEXT_HEADER_HOP_BY_HOP,
+        NEXT_HEADER_ROUTING,
+        NEXT_HEADER_FRAGMENT,
+        NEXT_HEADER_DESTINATION_OPTIONS,
+    )  #: The extension headers that are walked to find the payload
+
     IP_HEADER_FORMAT = ">IHBBIIIIIIII"
     IP_HEADER_SIZE = struct.calcsize(IP_HEADER_FORMAT)
 
@@ -406,19 +574,35 @@ class IPv6(object):
         self.version: int = 0x6  #: IP version field
         self.traffic_class: int = 0x00
         self.flow_label: int = 0x00000
-        self.len: int = 0  #: Total Length. This is calculated when packing the packet
-        self.next_header: int = 0x3B  # 0x3B = No next header
+        self.len: int = 0  #: Payload Length, including the extension headers. This is calculated when packing
+        self.next_header: int = IPv6.NEXT_HEADER_NONE  #: The type of the first extension header or the payload
         self.hop_limit: int = 0x01
         self.srcip: int = 0  #: Source IP Address
         self.dstip: int = 0  #: Destination IP Address
+        self.extension_headers: typing.List[typing.Tuple[int, bytes]] = []  #: (type, raw bytes) in packet order
+        self.protocol: int = IPv6.NEXT_HEADER_NONE  #: The type of the payload after the extension headers
+        self.fragment_offset: int = 0  #: Fragment offset, from the fragment header
+        self.flags: int = 0  #: FLAG_MORE_FRAGMENTS from the fragment header
+        self.id: int = 0  #: Identification from the fragment header
         self.payload: bytes = bytes()
 
         if buf is not None:
             self.unpack(buf)
 
+    @property
+    def srcip_readable(self) -> str:
+        """The source address in the standard text format"""
+        return socket.inet_ntop(socket.AF_INET6, self.srcip.to_bytes(16, "big"))
+
+    @property
+    def dstip_readable(self) -> str:
+        """The destination address in the standard text format"""
+        return socket.inet_ntop(socket.AF_INET6, self.dstip.to_bytes(16, "big"))
+
     def pack(self) -> bytes:
         """
-        Pack the IP object into a buffer
+        Pack the IP object into a buffer. The extension headers are packed as they are, so the next header field of
+        each has to be correct. next_header is set to the type of the first extension header if there are any
 
         :rtype: bytes
         """
@@ -427,10 +611,13 @@ class IPv6(object):
             if word is None:
                 raise ValueError("All required IP payloads not defined")
 
-        self.len = len(self.payload)
+        extension_headers = b"".join(raw for (_type, raw) in self.extension_headers)
+        if self.extension_headers:
+            self.next_header = self.extension_headers[0][0]
+        self.len = len(extension_headers) + len(self.payload)
         header = struct.pack(
             IPv6.IP_HEADER_FORMAT,
-            ((self.version << 28) + (self.traffic_class << 24) + self.flow_label),
+            ((self.version << 28) + (self.traffic_class << 20) + self.flow_label),
             self.len,
             self.next_header,
             self.hop_limit,
@@ -444,10 +631,37 @@ class IPv6(object):
             self.dstip & 0xFFFFFFFF,
         )
 
-        return header + self.payload
+        return header + extension_headers + self.payload
 
-    def unpack(self, buffer):
-        raise Exception("Not implemented")
+    def unpack(self, buffer: bytes) -> bool:
+        """
+        Unpack a raw byte stream to an IPv6 object
+
+        :param buffer: The buffer to unpack
+        :type buffer: bytes
+        :rtype: bool
+        """
+        if len(buffer) < IPv6.IP_HEADER_SIZE:
+            raise ValueError("Buffer too short to be an IPv6 packet")
+        (word, self.len, self.next_header, self.hop_limit) = struct.unpack_from(">IHBB", buffer)
+        self.version = word >> 28
+        self.traffic_class = (word >> 20) & 0xFF
+        self.flow_label = word & 0xFFFFF
+        self.srcip = int.from_bytes(buffer[8:24], "big")
+        self.dstip = int.from_bytes(buffer[24:40], "big")
+        # Leave any trailer, such as Ethernet padding, behind
+        end = min(len(buffer), IPv6.IP_HEADER_SIZE + self.len)
+        (self.protocol, offset, extension_headers, fragment) = _ipv6_walk(
+            buffer, self.next_header, IPv6.IP_HEADER_SIZE, end
+        )
+        self.extension_headers = [(_type, bytes(buffer[start:stop])) for (_type, start, stop) in extension_headers]
+        if fragment is None:
+            (self.fragment_offset, self.flags, self.id) = (0, 0, 0)
+        else:
+            (self.fragment_offset, more_fragments, self.id) = fragment
+            self.flags = IPv6.FLAG_MORE_FRAGMENTS if more_fragments else 0
+        self.payload = buffer[offset:end]
+        return True
 
     def __repr__(self):
         return "SRCIP={} DSTIP={} LEN={}".format(self.srcip, self.dstip, self.len)
@@ -476,6 +690,8 @@ class UDP(object):
 
     """
 
+    __slots__ = ("srcport", "dstport", "len", "checksum", "payload")
+
     UDP_HEADER_FORMAT = ">HHHH"
     UDP_HEADER_SIZE = struct.calcsize(UDP_HEADER_FORMAT)
 
@@ -483,6 +699,7 @@ class UDP(object):
         self.srcport: int = 0  #: The UDP source port number
         self.dstport: int = 0  #: The UDP desitnation port number
         self.len: int = 0  #: The length of the UDP header and payload in bytes
+        self.checksum: int = 0  #: The checksum. 0 if it was not computed
         self.payload: bytes = bytes()  #: The UDP payload
 
         if buf is not None:
@@ -499,15 +716,24 @@ class UDP(object):
 
         if len(buf) < UDP.UDP_HEADER_SIZE:
             raise ValueError("Buffer too short to be a UDP packet")
-        (self.srcport, self.dstport, self.len, checksum) = struct.unpack_from(UDP.UDP_HEADER_FORMAT, buf)
+        (self.srcport, self.dstport, self.len, self.checksum) = struct.unpack_from(UDP.UDP_HEADER_FORMAT, buf)
         self.payload = buf[UDP.UDP_HEADER_SIZE :]
 
         return True
 
-    def pack(self) -> bytes:
+    def pack(
+        self,
+        srcip: typing.Optional[typing.Union[str, bytes]] = None,
+        dstip: typing.Optional[typing.Union[str, bytes]] = None,
+    ) -> bytes:
         """
-        Pack the UDP object into a buffer
+        Pack the UDP object into a buffer. The checksum is only computed if the IP addresses are passed in, as it
+        covers them
 
+        :param srcip: The source IP address of the packet that will contain this one
+        :type srcip: str
+        :param dstip: The destination IP address
+        :type dstip: str
         :rtype: bytes
         """
 
@@ -517,7 +743,12 @@ class UDP(object):
         self.len = len(self.payload) + UDP.UDP_HEADER_SIZE
         if self.len >= 65536:
             logger.warning("UDP Payload longer than 65536. Truncating the length field")
-        return struct.pack(UDP.UDP_HEADER_FORMAT, self.srcport, self.dstport, self.len % 65536, 0) + self.payload
+        segment = struct.pack(UDP.UDP_HEADER_FORMAT, self.srcport, self.dstport, self.len % 65536, 0) + self.payload
+        if srcip is None or dstip is None:
+            self.checksum = 0
+            return segment
+        self.checksum = udp_calc_checksum(srcip, dstip, segment)
+        return segment[:6] + struct.pack(">H", self.checksum) + segment[8:]
 
     def __repr__(self):
         return "SRCPORT={} DSTPORT={}".format(self.srcport, self.dstport)
@@ -784,9 +1015,158 @@ class ARP(object):
         return True
 
 
+class _Datagram(object):
+    """The fragments of one IP datagram received so far"""
+
+    __slots__ = ("first_seen", "header", "buf", "ranges", "received", "total")
+
+    def __init__(self, first_seen: float):
+        self.first_seen: float = first_seen
+        self.header: typing.Optional[IP] = None  # The first fragment, which provides the header fields
+        self.buf = bytearray()  # The payload, written in place as the fragments arrive
+        self.ranges: typing.List[typing.Tuple[int, int]] = []  # (start, end) of the payload received
+        self.received = 0  # Bytes of payload received
+        self.total: typing.Optional[int] = None  # Payload length, known once the last fragment arrives
+
+
+class IPReassembler(object):
+    """
+    Reassemble fragmented IP packets as they arrive. Pass every :class:`IP` or :class:`IPv6` packet to
+    :meth:`IPReassembler.add`,
+    which returns the packet unchanged if it is not a fragment, the reassembled packet when the last missing fragment
+    arrives and None otherwise. Fragments are keyed by source, destination, protocol and identification, and are
+    written straight into a buffer per datagram.
+
+    A datagram with overlapping fragments is dropped. Incomplete datagrams are dropped when they are older than
+    timeout or, oldest first, when the buffered fragments exceed max_bytes.
+
+    >>> reassembler = IPReassembler()
+    >>> fragments = []
+    >>> for offset, flags in ((0, IP.FLAG_MORE_FRAGMENTS), (16, 0)):
+    ...     fragment = IP()
+    ...     fragment.srcip, fragment.dstip, fragment.id = "192.168.1.1", "235.0.0.1", 7
+    ...     fragment.flags, fragment.fragment_offset, fragment.payload = flags, offset, bytes(16)
+    ...     fragments.append(fragment)
+    >>> print(reassembler.add(fragments[1]), reassembler.add(fragments[0]))
+    None SRCIP=192.168.1.1 DSTIP=235.0.0.1 PROTOCOL=UDP LEN=52
+
+    :param timeout: Seconds to wait for the rest of a datagram after its first fragment
+    :type timeout: float
+    :param max_bytes: Limit on the payload buffered for incomplete datagrams
+    :type max_bytes: int
+    """
+
+    def __init__(self, timeout: float = 30.0, max_bytes: int = 64 * 1024 * 1024):
+        self.timeout: float = timeout  #: Seconds to wait for the rest of a datagram
+        self.max_bytes: int = max_bytes  #: Limit on the payload buffered for incomplete datagrams
+        self.dropped: int = 0  #: The number of incomplete or overlapping datagrams dropped
+        self._datagrams: typing.Dict[tuple, _Datagram] = {}  # In order of the first fragment
+        self._buffered = 0  # Bytes allocated for incomplete datagrams
+
+    def __len__(self):
+        return len(self._datagrams)
+
+    def add(self, packet: typing.Union[IP, IPv6], timestamp: typing.Optional[float] = None) -> typing.Optional[IP]:
+        """
+        Add a packet. The timestamp is used to expire incomplete datagrams, so use the capture time when reading
+        from a file. It defaults to the current time
+
+        :param packet: The IP packet
+        :type packet: IP|IPv6
+        :param timestamp: The time the packet was received in seconds
+        :type timestamp: float
+        :rtype: IP
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        self.expire(timestamp)
+        if packet.fragment_offset == 0 and not packet.flags & IP.FLAG_MORE_FRAGMENTS:
+            return packet
+
+        key = (packet.srcip, packet.dstip, packet.protocol, packet.id)
+        datagram = self._datagrams.get(key)
+        if datagram is None:
+            datagram = self._datagrams[key] = _Datagram(timestamp)
+        start = packet.fragment_offset
+        end = start + len(packet.payload)
+        for received_start, received_end in datagram.ranges:
+            if start < received_end and received_start < end:
+                if (start, end) == (received_start, received_end):
+                    return None  # Retransmitted fragment
+                logger.warning(f"Overlapping IP fragments in datagram {key}. Dropping it")
+                self._drop(key)
+                return None
+        if not packet.flags & IP.FLAG_MORE_FRAGMENTS:
+            if datagram.total is not None or end < len(datagram.buf):
+                logger.warning(f"Inconsistent last IP fragment in datagram {key}. Dropping it")
+                self._drop(key)
+                return None
+            datagram.total = end
+        elif datagram.total is not None and end > datagram.total:
+            logger.warning(f"IP fragment beyond the end of datagram {key}. Dropping it")
+            self._drop(key)
+            return None
+
+        if end > len(datagram.buf):
+            self._buffered += end - len(datagram.buf)
+            datagram.buf.extend(bytes(end - len(datagram.buf)))
+        datagram.buf[start:end] = packet.payload
+        datagram.ranges.append((start, end))
+        datagram.received += end - start
+        if start == 0:
+            datagram.header = packet
+
+        if datagram.total is not None and datagram.received == datagram.total:
+            del self._datagrams[key]
+            self._buffered -= len(datagram.buf)
+            return self._combine(datagram)
+        while self._buffered > self.max_bytes and self._datagrams:
+            logger.warning("IP reassembly memory limit reached. Dropping the oldest datagram")
+            self._drop(next(iter(self._datagrams)))
+        return None
+
+    def expire(self, timestamp: float) -> None:
+        """
+        Drop the incomplete datagrams whose first fragment arrived more than timeout seconds before timestamp
+
+        :type timestamp: float
+        """
+        for key, datagram in list(self._datagrams.items()):
+            if timestamp - datagram.first_seen <= self.timeout:
+                break
+            logger.debug(f"IP datagram {key} timed out")
+            self._drop(key)
+
+    def _drop(self, key: tuple) -> None:
+        datagram = self._datagrams.pop(key)
+        self._buffered -= len(datagram.buf)
+        self.dropped += 1
+
+    @staticmethod
+    def _combine(datagram: _Datagram) -> typing.Union[IP, IPv6]:
+        if isinstance(datagram.header, IPv6):
+            # The extension headers are not carried over, so the payload follows the fixed header
+            combined_ip = IPv6()
+            for attr in ["srcip", "dstip", "protocol", "traffic_class", "flow_label", "hop_limit", "id"]:
+                setattr(combined_ip, attr, getattr(datagram.header, attr))
+            combined_ip.next_header = combined_ip.protocol
+            combined_ip.payload = bytes(datagram.buf)
+            combined_ip.len = len(combined_ip.payload)
+            return combined_ip
+        combined_ip = IP()
+        for attr in ["srcip", "dstip", "protocol", "version", "ihl", "dscp", "id", "ttl"]:
+            setattr(combined_ip, attr, getattr(datagram.header, attr))
+        combined_ip.flags = 0x0
+        combined_ip.fragment_offset = 0x0
+        combined_ip.payload = bytes(datagram.buf)
+        combined_ip.len = IP.IP_HEADER_SIZE + len(combined_ip.payload)
+        return combined_ip
+
+
 def combine_ip_fragments(packets: typing.List[IP]) -> IP:
     """
-    Combine the lists of fragmented IP packets into one IP packet
+    Combine the lists of fragmented IP packets into one IP packet. Raises a ValueError if the fragments do not make
+    up a complete datagram. Use :class:`IPReassembler` to reassemble fragments as they arrive
 
     """
     ident = None
@@ -799,19 +1179,696 @@ def combine_ip_fragments(packets: typing.List[IP]) -> IP:
                 raise Exception("All packets should have the same ID field")
         ident = packet.id
 
-    # Create the IP packet we will return
-    combined_ip = IP()
-    combined_ip.flags = 0x0
-    combined_ip.fragment_offset = 0x0
-    combined_ip.payload = bytes()
-    # Create the header from the first fragment. Order the packets via the fragment offsets
-    # I don't verify the offsets but blindly combine them. TODO: Improve
-    for idx, packet in enumerate(sorted(packets, key=lambda x: x.fragment_offset)):
-        if idx == 0:
-            for attr in ["srcip", "dstip", "protocol", "version", "ihl", "dscp", "id", "ttl"]:
-                setattr(combined_ip, attr, getattr(packet, attr))
-        # Add the payload
-        combined_ip.payload += packet.payload
-
-    # Return the IP packet
-    return combined_ip
+    reassembler = IPReassembler(timeout=float("inf"), max_bytes=1 << 32)
+    for packet in packets:
+        combined_ip = reassembler.add(packet, 0)
+        if combined_ip is not None:
+            return combined_ip
+    raise ValueError("The IP fragments do not make up a complete packet")
+
+
+_UINT16 = struct.Struct(">H")
+_UINT32 = struct.Struct(">I")
+_ETHERNET_ADDRESSES = struct.Struct(">HIHI")
+_IP_HEADER = struct.Struct(IP.IP_HEADER_FORMAT)
+
+
+class EthernetView(object):
+    """
+    Read only view of an Ethernet frame that decodes each field from its fixed offset when it is accessed. Nothing
+    is copied or converted until it is asked for, and payloads are memoryviews into the original buffer. Create it
+    with :func:`dissect`. The layers are views too, so the buffer has to outlive them and should not be modified.
+
+    :param buf: The Ethernet frame
+    :type buf: bytes|memoryview
+    """
+
+    __slots__ = ("buf",)
+
+    def __init__(self, buf: bytes):
+        if len(buf) < Ethernet.HEADERLEN:
+            raise ValueError("Buffer too short to be an Ethernet packet")
+        self.buf = buf  #: The frame
+
+    @property
+    def dstmac(self) -> int:
+        (high, low) = _ETHERNET_ADDRESSES.unpack_from(self.buf)[:2]
+        return (high << 32) | low
+
+    @property
+    def srcmac(self) -> int:
+        (high, low) = _ETHERNET_ADDRESSES.unpack_from(self.buf)[2:]
+        return (high << 32) | low
+
+    @property
+    def vlan(self) -> bool:
+        return _UINT16.unpack_from(self.buf, 12)[0] == Ethernet.TYPE_VLAN
+
+    @property
+    def vlantag(self) -> int:
+        return _UINT16.unpack_from(self.buf, 14)[0] if self.vlan else 0xFFFF
+
+    @property
+    def type(self) -> int:
+        return _UINT16.unpack_from(self.buf, self.header_len - 2)[0]
+
+    @property
+    def header_len(self) -> int:
+        return Ethernet.HEADERLEN_VLAN if self.vlan else Ethernet.HEADERLEN
+
+    @property
+    def payload(self) -> memoryview:
+        return memoryview(self.buf)[self.header_len :]
+
+    def _ip_offset(self, ethertype: int = Ethernet.TYPE_IPv4) -> typing.Optional[int]:
+        """The offset of the IP header, or None if the frame does not contain that ethertype"""
+        (_type,) = _UINT16.unpack_from(self.buf, 12)
+        if _type == ethertype:
+            return Ethernet.HEADERLEN
+        if _type == Ethernet.TYPE_VLAN and _UINT16.unpack_from(self.buf, 16)[0] == ethertype:
+            return Ethernet.HEADERLEN_VLAN
+        return None
+
+    @property
+    def ip(self) -> typing.Optional[IPView]:
+        """The IPv4 layer, or None if the frame does not contain IPv4"""
+        offset = self._ip_offset()
+        if offset is None:
+            return None
+        return IPView(self.buf, offset)
+
+    @property
+    def ipv6(self) -> typing.Optional[IPv6View]:
+        """The IPv6 layer, or None if the frame does not contain IPv6"""
+        offset = self._ip_offset(Ethernet.TYPE_IPv6)
+        if offset is None:
+            return None
+        return IPv6View(self.buf, offset)
+
+    @property
+    def udp(self) -> typing.Optional[UDPView]:
+        """The UDP layer, or None if the frame does not contain UDP in IPv4 or IPv6"""
+        offset = self._ip_offset()
+        if offset is not None:
+            return IPView(self.buf, offset).udp
+        offset = self._ip_offset(Ethernet.TYPE_IPv6)
+        if offset is not None:
+            return IPv6View(self.buf, offset).udp
+        return None
+
+    def __repr__(self):
+        return "SRCMAC={} DSTMAC={} TYPE={:#0X}".format(
+            mactoreadable(self.srcmac), mactoreadable(self.dstmac), self.type
+        )
+
+
+class IPView(object):
+    """
+    Read only view of an IPv4 packet at an offset in a buffer. See :class:`EthernetView`
+
+    :param buf: The buffer containing the packet
+    :type buf: bytes|memoryview
+    :param offset: The offset of the IP header in the buffer
+    :type offset: int
+    """
+
+    __slots__ = ("buf", "offset")
+
+    def __init__(self, buf: bytes, offset: int = 0):
+        if len(buf) < offset + IP.IP_HEADER_SIZE:
+            raise ValueError("Buffer too short for to be an IP packet")
+        self.buf = buf  #: The buffer containing the packet
+        self.offset = offset  #: The offset of the IP header
+
+    @property
+    def version(self) -> int:
+        return self.buf[self.offset] >> 4
+
+    @property
+    def ihl(self) -> int:
+        return self.buf[self.offset] & 0xF
+
+    @property
+    def dscp(self) -> int:
+        return self.buf[self.offset + 1]
+
+    @property
+    def len(self) -> int:
+        return _UINT16.unpack_from(self.buf, self.offset + 2)[0]
+
+    @property
+    def id(self) -> int:
+        return _UINT16.unpack_from(self.buf, self.offset + 4)[0]
+
+    @property
+    def flags(self) -> int:
+        return self.buf[self.offset + 6] >> 5
+
+    @property
+    def fragment_offset(self) -> int:
+        return (_UINT16.unpack_from(self.buf, self.offset + 6)[0] & 0x1FFF) * 8
+
+    @property
+    def ttl(self) -> int:
+        return self.buf[self.offset + 8]
+
+    @property
+    def protocol(self) -> int:
+        return self.buf[self.offset + 9]
+
+    @property
+    def checksum(self) -> int:
+        return _UINT16.unpack_from(self.buf, self.offset + 10)[0]
+
+    @property
+    def srcip(self) -> str:
+        return socket.inet_ntoa(self.buf[self.offset + 12 : self.offset + 16])
+
+    @property
+    def dstip(self) -> str:
+        return socket.inet_ntoa(self.buf[self.offset + 16 : self.offset + 20])
+
+    @property
+    def srcip_int(self) -> int:
+        """The source address as an integer, which is cheaper to compare than srcip"""
+        return _UINT32.unpack_from(self.buf, self.offset + 12)[0]
+
+    @property
+    def dstip_int(self) -> int:
+        """The destination address as an integer, which is cheaper to compare than dstip"""
+        return _UINT32.unpack_from(self.buf, self.offset + 16)[0]
+
+    @property
+    def header_len(self) -> int:
+        return (self.buf[self.offset] & 0xF) * 4
+
+    @property
+    def checksum_ok(self) -> bool:
+        """True if the header checksum is correct"""
+        return ones_complement_sum(memoryview(self.buf)[self.offset : self.offset + self.header_len]) == 0xFFFF
+
+    @property
+    def payload(self) -> memoryview:
+        """The payload up to the total length in the header, leaving any Ethernet padding behind"""
+        return memoryview(self.buf)[self.offset + self.header_len : self.offset + self.len]
+
+    @property
+    def udp(self) -> typing.Optional[UDPView]:
+        """The UDP layer, or None if the protocol is not UDP or this is not the first fragment"""
+        buf = self.buf
+        offset = self.offset
+        if buf[offset + 9] != IP.PROTOCOL_UDP or _UINT16.unpack_from(buf, offset + 6)[0] & 0x1FFF:
+            return None
+        return UDPView(buf, offset + (buf[offset] & 0xF) * 4, offset + _UINT16.unpack_from(buf, offset + 2)[0])
+
+    def __repr__(self):
+        return "SRCIP={} DSTIP={} PROTOCOL={} LEN={}".format(self.srcip, self.dstip, self.protocol, self.len)
+
+
+class IPv6View(object):
+    """
+    Read only view of an IPv6 packet at an offset in a buffer. See :class:`EthernetView`. The extension headers are
+    walked when a field after them is first accessed
+
+    :param buf: The buffer containing the packet
+    :type buf: bytes|memoryview
+    :param offset: The offset of the IPv6 header in the buffer
+    :type offset: int
+    """
+
+    __slots__ = ("buf", "offset", "_walk")
+
+    def __init__(self, buf: bytes, offset: int = 0):
+        if len(buf) < offset + IPv6.IP_HEADER_SIZE:
+            raise ValueError("Buffer too short to be an IPv6 packet")
+        self.buf = buf  #: The buffer containing the packet
+        self.offset = offset  #: The offset of the IPv6 header
+        self._walk = None
+
+    @property
+    def version(self) -> int:
+        return self.buf[self.offset] >> 4
+
+    @property
+    def traffic_class(self) -> int:
+        return (_UINT16.unpack_from(self.buf, self.offset)[0] >> 4) & 0xFF
+
+    @property
+    def flow_label(self) -> int:
+        return _UINT32.unpack_from(self.buf, self.offset)[0] & 0xFFFFF
+
+    @property
+    def len(self) -> int:
+        return _UINT16.unpack_from(self.buf, self.offset + 4)[0]
+
+    @property
+    def next_header(self) -> int:
+        return self.buf[self.offset + 6]
+
+    @property
+    def hop_limit(self) -> int:
+        return self.buf[self.offset + 7]
+
+    @property
+    def srcip(self) -> str:
+        return socket.inet_ntop(socket.AF_INET6, self.buf[self.offset + 8 : self.offset + 24])
+
+    @property
+    def dstip(self) -> str:
+        return socket.inet_ntop(socket.AF_INET6, self.buf[self.offset + 24 : self.offset + 40])
+
+    @property
+    def end(self) -> int:
+        """The offset of the end of the packet in the buffer"""
+        return min(len(self.buf), self.offset + IPv6.IP_HEADER_SIZE + self.len)
+
+    def _walked(self) -> tuple:
+        if self._walk is None:
+            self._walk = _ipv6_walk(self.buf, self.next_header, self.offset + IPv6.IP_HEADER_SIZE, self.end)
+        return self._walk
+
+    @property
+    def protocol(self) -> int:
+        """The type of the payload after the extension headers"""
+        return self._walked()[0]
+
+    @property
+    def extension_headers(self) -> typing.List[typing.Tuple[int, memoryview]]:
+        """The type and a view of each extension header"""
+        view = memoryview(self.buf)
+        return [(_type, view[start:stop]) for (_type, start, stop) in self._walked()[2]]
+
+    @property
+    def fragment_offset(self) -> int:
+        fragment = self._walked()[3]
+        return 0 if fragment is None else fragment[0]
+
+    @property
+    def flags(self) -> int:
+        fragment = self._walked()[3]
+        return IPv6.FLAG_MORE_FRAGMENTS if fragment is not None and fragment[1] else 0
+
+    @property
+    def id(self) -> int:
+        fragment = self._walked()[3]
+        return 0 if fragment is None else fragment[2]
+
+    @property
+    def payload(self) -> memoryview:
+        """The payload after the extension headers"""
+        return memoryview(self.buf)[self._walked()[1] : self.end]
+
+    @property
+    def udp(self) -> typing.Optional[UDPView]:
+        """The UDP layer, or None if the protocol is not UDP or this is not the first fragment"""
+        (protocol, offset, _extension_headers, fragment) = self._walked()
+        if protocol != IP.PROTOCOL_UDP or (fragment is not None and fragment[0] != 0):
+            return None
+        return UDPView(self.buf, offset, self.end)
+
+    def __repr__(self):
+        return "SRCIP={} DSTIP={} PROTOCOL={} LEN={}".format(self.srcip, self.dstip, self.protocol, self.len)
+
+
+class UDPView(object):
+    """
+    Read only view of a UDP packet at an offset in a buffer. See :class:`EthernetView`
+
+    :param buf: The buffer containing the packet
+    :type buf: bytes|memoryview
+    :param offset: The offset of the UDP header in the buffer
+    :type offset: int
+    :param end: The offset of the end of the packet. Defaults to the end of the buffer
+    :type end: int
+    """
+
+    __slots__ = ("buf", "offset", "end")
+
+    def __init__(self, buf: bytes, offset: int = 0, end: typing.Optional[int] = None):
+        if len(buf) < offset + UDP.UDP_HEADER_SIZE:
+            raise ValueError("Buffer too short to be a UDP packet")
+        self.buf = buf  #: The buffer containing the packet
+        self.offset = offset  #: The offset of the UDP header
+        self.end = len(buf) if end is None else end  #: The offset of the end of the packet
+
+    @property
+    def srcport(self) -> int:
+        return _UINT16.unpack_from(self.buf, self.offset)[0]
+
+    @property
+    def dstport(self) -> int:
+        return _UINT16.unpack_from(self.buf, self.offset + 2)[0]
+
+    @property
+    def len(self) -> int:
+        return _UINT16.unpack_from(self.buf, self.offset + 4)[0]
+
+    @property
+    def checksum(self) -> int:
+        return _UINT16.unpack_from(self.buf, self.offset + 6)[0]
+
+    @property
+    def payload(self) -> memoryview:
+        return memoryview(self.buf)[self.offset + UDP.UDP_HEADER_SIZE : self.end]
+
+    def __repr__(self):
+        return "SRCPORT={} DSTPORT={}".format(self.srcport, self.dstport)
+
+
+def dissect(buf: bytes) -> EthernetView:
+    """
+    Return a lazy view of an Ethernet frame. The headers are only decoded as far as the fields that are accessed,
+    so picking one field out of a packet is much cheaper than unpacking :class:`Ethernet`, :class:`IP` and
+    :class:`UDP` objects
+
+    >>> from base64 import b64decode
+    >>> raw_packet = b64decode('AQBeAAABAAxNAApsCABFAAA61p1AAP8R3VrAqBwQ6wAAAQP/H0oAJgAAAB8ADwAPA1ffwH8A1pwAAQvUQGAAAP3NEAEoHP//')
+    >>> packet = dissect(raw_packet)
+    >>> packet.udp.dstport
+    8010
+    >>> print(packet.ip.dstip, len(packet.udp.payload))
+    235.0.0.1 30
+
+    :param buf: The Ethernet frame. A memoryview, such as the payload of a memory mapped pcap record, is not copied
+    :type buf: bytes|memoryview
+    :rtype: EthernetView
+    """
+    return EthernetView(buf)
+
+
+#: The columns returned by :func:`batch_unpack`. Fields of layers that a frame does not contain are 0. Only IPv4 is
+#: decoded, so IPv6 frames have only the Ethernet columns and need :func:`dissect` and :func:`udp_verify_checksum`
+BATCH_FIELDS = (
+    ("length", "u4"),
+    ("dstmac", "u8"),
+    ("srcmac", "u8"),
+    ("vlan", "?"),
+    ("vlantag", "u2"),
+    ("type", "u2"),
+    ("ipv4", "?"),
+    ("srcip", "u4"),
+    ("dstip", "u4"),
+    ("protocol", "u1"),
+    ("id", "u2"),
+    ("flags", "u1"),
+    ("fragment_offset", "u2"),
+    ("ttl", "u1"),
+    ("iplen", "u2"),
+    ("ipchecksum_ok", "?"),
+    ("udp", "?"),
+    ("srcport", "u2"),
+    ("dstport", "u2"),
+    ("udplen", "u2"),
+    ("udpchecksum_ok", "?"),
+)
+# Enough of each frame to reach the end of a UDP header after a VLAN tag and an IP header with options
+_BATCH_HEADER_BYTES = Ethernet.HEADERLEN_VLAN + 60 + UDP.UDP_HEADER_SIZE
+_BATCH_BLOCK_SIZE = 1 << 16  # Frames gathered at a time by batch_unpack_from
+_BATCH_CHECKSUM_BYTES = 1 << 22  # UDP segment bytes gathered at a time for the checksums
+
+
+def _big_endian(columns):
+    """Combine the n x k uint8 columns, most significant first, into one unsigned integer per row"""
+    value = numpy.zeros(columns.shape[0], dtype=numpy.uint64)
+    for i in range(columns.shape[1]):
+        value = (value << numpy.uint64(8)) | columns[:, i]
+    return value
+
+
+def _batch_udp_checksum(data, starts, lengths, srcip, dstip, udplen):
+    """
+    Verify the UDP checksums, with the IPv4 pseudo header, of the segments of udplen bytes at starts in the flat
+    uint8 data. The words are summed modulo 0xFFFF as in :func:`ones_complement_sum`, so a segment is valid when the
+    sum is 0 modulo 0xFFFF. A segment longer than the rest of its frame is invalid
+    """
+    ok = numpy.zeros(len(starts), dtype=bool)
+    valid = (udplen >= UDP.UDP_HEADER_SIZE) & (udplen <= lengths)
+    rows = numpy.flatnonzero(valid)
+    rows = rows[numpy.argsort(starts[rows], kind="stable")]
+    seg_start = starts[rows]
+    seg_end = seg_start + udplen[rows]
+    # Sum the segments from prefix sums of the words of spans of the data, in groups so that the prefix sums stay
+    # small
+    groups = (seg_start - (seg_start[0] if len(rows) else 0)) // _BATCH_CHECKSUM_BYTES
+    bounds = numpy.flatnonzero(numpy.diff(groups)) + 1
+    for first, last in zip(numpy.r_[0, bounds], numpy.r_[bounds, len(rows)]):
+        if first == last:
+            continue
+        group_rows = rows[first:last]
+        low = seg_start[first]
+        span = data[low : seg_end[first:last].max()]
+        words = numpy.zeros(len(span) // 2 + 1, dtype=numpy.uint64)
+        numpy.cumsum(span[: len(span) // 2 * 2].view(">u2"), out=words[1:])
+
+        def prefix(position):
+            """The sum of the words of the span before position, with an odd last byte as a high byte"""
+            last_byte = span[numpy.maximum(position - 1, 0)].astype(numpy.uint64) << numpy.uint64(8)
+            return words[position // 2] + numpy.where(position % 2 == 1, last_byte, 0)
+
+        begin = seg_start[first:last] - low
+        total = prefix(seg_end[first:last] - low) - prefix(begin)
+        # Summing the words of a segment at an odd offset swaps the bytes, which is multiplying by 256 modulo 0xFFFF
+        total = numpy.where(begin % 2 == 1, total * numpy.uint64(256), total)
+        for address in (srcip[group_rows], dstip[group_rows]):
+            total += (address >> numpy.uint64(16)) + (address & numpy.uint64(0xFFFF))
+        total += numpy.uint64(IP.PROTOCOL_UDP) + udplen[group_rows].astype(numpy.uint64)
+        ok[group_rows] = total % numpy.uint64(0xFFFF) == 0
+    # A checksum of 0 means that the sender did not compute one
+    checksum_field = data[numpy.minimum(starts + 6, len(data) - 2)[:, None] + numpy.arange(2)]
+    return ok | (valid & (checksum_field == 0).all(axis=1))
+
+
+def _batch_decode(headers, lengths, data=None, starts=None):
+    """
+    Decode the n x _BATCH_HEADER_BYTES array of the start of each frame, zero padded, into the BATCH_FIELDS. The UDP
+    checksums are verified if the frames are in the flat uint8 data at starts
+    """
+    count = headers.shape[0]
+    rows = numpy.arange(count)[:, None]
+    result = numpy.zeros(count, dtype=list(BATCH_FIELDS))
+    result["length"] = lengths
+    result["dstmac"] = _big_endian(headers[:, 0:6])
+    result["srcmac"] = _big_endian(headers[:, 6:12])
+    vlan = _big_endian(headers[:, 12:14]) == Ethernet.TYPE_VLAN
+    result["vlan"] = vlan
+    result["vlantag"] = numpy.where(vlan, _big_endian(headers[:, 14:16]), 0xFFFF)
+    ethertype = numpy.where(vlan, _big_endian(headers[:, 16:18]), _big_endian(headers[:, 12:14]))
+    result["type"] = ethertype
+
+    l3_offset = numpy.where(vlan, Ethernet.HEADERLEN_VLAN, Ethernet.HEADERLEN)
+    ip = headers[rows, l3_offset[:, None] + numpy.arange(IP.IP_HEADER_SIZE)]
+    ihl = ip[:, 0] & 0xF
+    ipv4 = (ethertype == Ethernet.TYPE_IPv4) & (ip[:, 0] >> 4 == 4) & (ihl >= 5)
+    ipv4 &= lengths >= l3_offset + IP.IP_HEADER_SIZE
+    result["ipv4"] = ipv4
+    flags_fragment = _big_endian(ip[:, 6:8])
+    for name, value in (
+        ("srcip", _big_endian(ip[:, 12:16])),
+        ("dstip", _big_endian(ip[:, 16:20])),
+        ("protocol", ip[:, 9]),
+        ("id", _big_endian(ip[:, 4:6])),
+        ("flags", flags_fragment >> numpy.uint64(13)),
+        ("fragment_offset", (flags_fragment & numpy.uint64(0x1FFF)) * numpy.uint64(8)),
+        ("ttl", ip[:, 8]),
+        ("iplen", _big_endian(ip[:, 2:4])),
+    ):
+        result[name] = numpy.where(ipv4, value, 0)
+    # Ones complement sum of the header words, including any options
+    ip_columns = numpy.arange(60)
+    ip_header = headers[rows, numpy.minimum(l3_offset[:, None] + ip_columns, headers.shape[1] - 1)]
+    ip_header = numpy.where(ip_columns < ihl[:, None].astype(numpy.int64) * 4, ip_header, 0).astype(numpy.uint32)
+    checksum = ((ip_header[:, 0::2] << 8) | ip_header[:, 1::2]).sum(axis=1)
+    checksum = (checksum >> 16) + (checksum & 0xFFFF)
+    checksum = (checksum >> 16) + (checksum & 0xFFFF)
+    result["ipchecksum_ok"] = ipv4 & (checksum == 0xFFFF)
+
+    l4_offset = l3_offset + ihl.astype(numpy.int64) * 4
+    udp = ipv4 & (result["protocol"] == IP.PROTOCOL_UDP) & (result["fragment_offset"] == 0)
+    udp &= lengths >= l4_offset + UDP.UDP_HEADER_SIZE
+    result["udp"] = udp
+    udp_header = headers[rows, numpy.where(udp, l4_offset, 0)[:, None] + numpy.arange(UDP.UDP_HEADER_SIZE)]
+    result["srcport"] = numpy.where(udp, _big_endian(udp_header[:, 0:2]), 0)
+    result["dstport"] = numpy.where(udp, _big_endian(udp_header[:, 2:4]), 0)
+    result["udplen"] = numpy.where(udp, _big_endian(udp_header[:, 4:6]), 0)
+    if data is not None:
+        rows = numpy.flatnonzero(udp)
+        result["udpchecksum_ok"][rows] = _batch_udp_checksum(
+            data,
+            starts[rows] + l4_offset[rows],
+            lengths[rows] - l4_offset[rows],
+            result["srcip"][rows].astype(numpy.uint64),
+            result["dstip"][rows].astype(numpy.uint64),
+            result["udplen"][rows].astype(numpy.int64),
+        )
+    return result
+
+
+def batch_unpack(frames: typing.Sequence[bytes]):
+    """
+    Decode the Ethernet, IPv4 and UDP headers of many frames at once into a numpy structured array, one row per
+    frame, with the columns in :data:`BATCH_FIELDS`. The headers are decoded with array operations over all the
+    frames instead of unpacking objects per frame, so the result can be filtered and grouped in bulk. The IPv4 header
+    and UDP checksums are verified in bulk too. IPv6 frames are not decoded. Requires numpy
+
+    >>> from base64 import b64decode
+    >>> raw_packet = b64decode('AQBeAAABAAxNAApsCABFAAA61p1AAP8R3VrAqBwQ6wAAAQP/H0oAJgAAAB8ADwAPA1ffwH8A1pwAAQvUQGAAAP3NEAEoHP//')
+    >>> headers = batch_unpack([raw_packet, raw_packet[:20]])
+    >>> print(headers["dstport"], headers["udp"], hex(headers["dstip"][0]))
+    [8010    0] [ True False] 0xeb000001
+    >>> print(headers["ipchecksum_ok"], headers["udpchecksum_ok"])
+    [ True False] [ True False]
+
+    :param frames: The Ethernet frames
+    :type frames: list[bytes]
+    :rtype: numpy.ndarray
+    """
+    if not _numpy_available:
+        raise RuntimeError("numpy is required for batch_unpack")
+    lengths = numpy.fromiter((len(frame) for frame in frames), dtype=numpy.int64, count=len(frames))
+    offsets = numpy.cumsum(lengths) - lengths
+    return batch_unpack_from(b"".join(frames), offsets, lengths)
+
+
+def batch_unpack_from(buffer: bytes, offsets, lengths):
+    """
+    As :func:`batch_unpack` for frames at offsets in one buffer, without slicing them out first. For example, the
+    frames of a memory mapped pcap file are at the record offsets plus the record header size, with the incl_len
+    column of :meth:`AcraNetwork.Pcap.Pcap.to_arrays` as the lengths
+
+    :param buffer: The buffer containing the frames
+    :type buffer: bytes|mmap.mmap
+    :param offsets: The offset of the start of each frame in the buffer
+    :type offsets: numpy.ndarray
+    :param lengths: The length of each frame
+    :type lengths: numpy.ndarray
+    :rtype: numpy.ndarray
+    """
+    if not _numpy_available:
+        raise RuntimeError("numpy is required for batch_unpack_from")
+    data = numpy.frombuffer(buffer, dtype=numpy.uint8)
+    offsets = numpy.asarray(offsets, dtype=numpy.int64)
+    lengths = numpy.asarray(lengths, dtype=numpy.int64)
+    columns = numpy.arange(_BATCH_HEADER_BYTES)
+    blocks = []
+    # Gather in blocks to bound the size of the index arrays
+    for first in range(0, len(offsets), _BATCH_BLOCK_SIZE):
+        block_offsets = offsets[first : first + _BATCH_BLOCK_SIZE]
+        block_lengths = lengths[first : first + _BATCH_BLOCK_SIZE]
+        positions = numpy.minimum(block_offsets[:, None] + columns, len(data) - 1)
+        # Bytes past the end of a frame are zero, as if each frame had been padded
+        headers = numpy.where(columns < block_lengths[:, None], data[positions], 0).astype(numpy.uint8)
+        blocks.append(_batch_decode(headers, block_lengths, data, block_offsets))
+    del data
+    if not blocks:
+        return numpy.zeros(0, dtype=list(BATCH_FIELDS))
+    return numpy.concatenate(blocks)
+
+
+class PacketTemplate(object):
+    """
+    A UDP in IPv4 in Ethernet frame built once into a bytearray, for sending or writing many packets that differ
+    only in a few fields, such as a sequence number or timestamp. :meth:`PacketTemplate.patch` packs the new values
+    in place and updates the checksums incrementally (RFC 1624), so no headers are rebuilt per packet. The
+    payload offsets in patch are relative to the start of the UDP payload.
+
+    >>> e = Ethernet()
+    >>> e.srcmac, e.dstmac = 0x001122334455, 0x01005E000001
+    >>> i = IP()
+    >>> i.srcip, i.dstip = "192.168.1.1", "235.0.0.1"
+    >>> u = UDP()
+    >>> u.srcport, u.dstport = 5000, 8010
+    >>> template = PacketTemplate(e, i, u, bytes(32), udp_checksum=True)
+    >>> for sequence in range(3):
+    ...     template.patch(8, ">I", sequence)  # iNetX sequence number
+    >>> print(dissect(template.buffer).udp.payload[8:12].hex(), len(template.buffer))
+    00000002 74
+
+    :param ethernet: Provides the MAC addresses and VLAN tag
+    :type ethernet: Ethernet
+    :param ip: Provides the IP header fields
+    :type ip: IP
+    :param udp: Provides the ports
+    :type udp: UDP
+    :param payload: The initial UDP payload
+    :type payload: bytes
+    :param udp_checksum: Compute the UDP checksum, otherwise it is 0
+    :type udp_checksum: bool
+    """
+
+    def __init__(self, ethernet: Ethernet, ip: IP, udp: UDP, payload: bytes = b"", udp_checksum: bool = False):
+        self.udp_checksum: bool = udp_checksum  #: The UDP checksum is maintained
+        self._ethernet = ethernet
+        self._ip = ip
+        self._udp = udp
+        self.buffer: bytearray = bytearray()  #: The frame. Send it or write it as it is, without copying
+        self.ip_offset: int = Ethernet.HEADERLEN_VLAN if ethernet.vlan else Ethernet.HEADERLEN  #: IP header offset
+        self.udp_offset: int = self.ip_offset + IP.IP_HEADER_SIZE  #: UDP header offset
+        self.payload_offset: int = self.udp_offset + UDP.UDP_HEADER_SIZE  #: UDP payload offset
+        self.set_payload(payload)
+
+    def set_payload(self, payload: bytes) -> None:
+        """
+        Replace the UDP payload. The lengths and checksums are recomputed, so this is slower than
+        :meth:`PacketTemplate.patch`
+
+        :type payload: bytes
+        """
+        ip = self._ip
+        udp = self._udp
+        udp.payload = payload
+        if self.udp_checksum:
+            ip.payload = udp.pack(ip.srcip, ip.dstip)
+        else:
+            ip.payload = udp.pack()
+        self._ethernet.payload = ip.pack()
+        self.buffer = bytearray(self._ethernet.pack())
+
+    @property
+    def payload(self) -> memoryview:
+        """The UDP payload, for sending on a UDP socket"""
+        return memoryview(self.buffer)[self.payload_offset :]
+
+    def _update_checksum(self, checksum_offset: int, old: bytes, new: bytes) -> None:
+        """
+        Incrementally update the checksum at checksum_offset after whole 16 bit words of the data it covers changed
+        from old to new. RFC 1624 eqn 3: HC' = ~(~HC + ~m + m')
+        """
+        (checksum,) = _UINT16.unpack_from(self.buffer, checksum_offset)
+        total = (~checksum & 0xFFFF) + (0xFFFF - ones_complement_sum(old)) + ones_complement_sum(new)
+        total = (total >> 16) + (total & 0xFFFF)
+        total = (total >> 16) + (total & 0xFFFF)
+        checksum = ~total & 0xFFFF
+        _UINT16.pack_into(self.buffer, checksum_offset, checksum or 0xFFFF)
+
+    def _patch(self, position: int, fmt: str, values: tuple, checksums: typing.Tuple[int, ...]):
+        """Pack values at position in the buffer and update the checksums at the checksums offsets"""
+        size = struct.calcsize(fmt)
+        # Widen to whole 16 bit words of the checksummed data
+        start = position - ((position - self.udp_offset) & 1)
+        end = min(len(self.buffer), position + size + ((position + size - self.udp_offset) & 1))
+        old = bytes(self.buffer[start:end])
+        struct.pack_into(fmt, self.buffer, position, *values)
+        new = bytes(self.buffer[start:end])
+        for checksum_offset in checksums:
+            self._update_checksum(checksum_offset, old, new)
+
+    def patch(self, offset: int, fmt: str, *values) -> None:
+        """
+        Pack values into the UDP payload at offset with :func:`struct.pack_into`, updating the UDP checksum if it
+        is maintained
+
+        :param offset: Offset into the UDP payload
+        :type offset: int
+        :param fmt: The struct format, eg ">I"
+        :type fmt: str
+        """
+        checksums = (self.udp_offset + 6,) if self.udp_checksum else ()
+        self._patch(self.payload_offset + offset, fmt, values, checksums)
+
+    def set_ip_id(self, ident: int) -> None:
+        """
+        Set the IP identification field, updating the IP header checksum
+
+        :type ident: int
+        """
+        self._patch(self.ip_offset + 4, ">H", (ident,), (self.ip_offset + 10,))
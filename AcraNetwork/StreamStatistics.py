@@ -0,0 +1,594 @@
+"""
+.. module:: StreamStatistics
+    :platform: Unix, Windows
+    :synopsis: Per stream packet, loss, latency and jitter statistics of iNetX streams
+
+.. moduleauthor:: Diarmuid Collins <dcollins@curtisswright.com>
+
+"""
+
+__author__ = "Diarmuid Collins"
+__maintainer__ = "Diarmuid Collins"
+__email__ = "dcollins@curtisswright.com"
+__status__ = "Production"
+
+
+import time
+import array
+import struct
+import typing
+import logging
+from collections import namedtuple
+import AcraNetwork.Pcap as pcap
+import AcraNetwork.iNetX as inetx
+import AcraNetwork.SimpleEthernet as SimpleEthernet
+from AcraNetwork.PcapParallel import PcapReducer
+
+try:
+    import numpy
+except ImportError:
+    _numpy_available = False
+else:
+    _numpy_available = True
+
+
+logger = logging.getLogger(__name__)
+
+_INETX_HEADER = struct.Struct(">IIIIII")  # control, streamid, sequence, packetlen, ptptimeseconds, ptptimenanoseconds
+_IPV4_UDP_HEADER = struct.Struct(">12xHB5xHxB")  # ethertype, version and ihl, fragment offset, protocol
+# The offset of the iNetX header in an Ethernet frame without a VLAN tag or IP options
+_INETX_OFFSET = (
+    SimpleEthernet.Ethernet.HEADERLEN + SimpleEthernet.IP.IP_HEADER_SIZE + SimpleEthernet.UDP.UDP_HEADER_SIZE
+)
+_ROLLOVER = 1 << 32
+_NO_LATENCY = -(1 << 63)
+
+# The per stream counters. One array of each, indexed by the row of the stream
+_INT_COUNTERS = (
+    "packets",
+    "bytes",
+    "lost",
+    "reorders",
+    "duplicates",
+    "restarts",
+    "first_sequence",
+    "last_sequence",
+    "span",  # How far the highest sequence number is past the first packet of the stream or the last restart
+    "first_arrival",
+    "last_arrival",
+    "latency_count",
+    "latency_min",
+    "latency_max",
+    "first_latency",
+    "last_latency",
+)
+# Sums that could overflow an int64
+_FLOAT_COUNTERS = ("latency_sum", "jitter")
+# The counters that depend on the packets before, which merge corrects
+_SEQUENCE_COUNTERS = ("lost", "reorders", "duplicates", "restarts")
+
+
+def _unpack_bitmap(bitmap: int, window: int) -> "numpy.ndarray":
+    """The bits 0 to window of a received bitmap as a bool array"""
+    nbits = window + 1
+    raw = (bitmap & ((1 << nbits) - 1)).to_bytes((nbits + 7) // 8, "little")
+    return numpy.unpackbits(numpy.frombuffer(raw, dtype=numpy.uint8), bitorder="little")[:nbits].astype(bool)
+
+
+def _pack_bitmap(bits: "numpy.ndarray") -> int:
+    """A bool array as a received bitmap"""
+    return int.from_bytes(numpy.packbits(bits, bitorder="little").tobytes(), "little")
+
+
+class StreamSummary(
+    namedtuple(
+        "StreamSummary",
+        "streamid, packets, bytes, lost, reorders, duplicates, restarts, first_arrival, last_arrival, "
+        "latency_min, latency_mean, latency_max, jitter",
+    )
+):
+    """
+    The statistics of one stream, returned by :meth:`StreamStatistics.summary`. The bytes are the sizes of the iNetX
+    packets, the UDP payloads. The arrival times are in ns since the epoch. The latencies and jitter are in ns and are
+    None if no packet had a PTP timestamp.
+    """
+
+    __slots__ = ()
+
+    @property
+    def duration(self) -> float:
+        """Seconds from the first to the last packet"""
+        return (self.last_arrival - self.first_arrival) / 1e9
+
+    @property
+    def pps(self) -> float:
+        """Packets per second"""
+        return self.packets / self.duration if self.duration > 0 else 0.0
+
+    @property
+    def bitrate(self) -> float:
+        """Bits per second"""
+        return self.bytes * 8 / self.duration if self.duration > 0 else 0.0
+
+
+class StreamStatistics(PcapReducer):
+    """
+    Count the packets, bytes, lost packets, reorders, duplicates and restarts of each iNetX stream, and the latency
+    of each packet from its PTP timestamp to its arrival time with the RFC 3550 jitter of that latency.
+
+    Each stream is a row in arrays of counters, so the cost of each packet does not grow with the number of streams
+    or packets. Packets can be added one at a time from a pcap file with :meth:`StreamStatistics.update` or from a
+    socket with :meth:`StreamStatistics.add_inetx`. Many packets can be added at once from numpy arrays, such as the
+    output of :meth:`AcraNetwork.Pcap.Pcap.to_arrays`, with :meth:`StreamStatistics.add_arrays`.
+
+    The sequence number of a packet is compared to the highest sequence number seen on its stream. If it is ahead,
+    the packets skipped are counted as lost. If it is equal, it is a duplicate. If it is behind by up to
+    reorder_window, it is a reorder that fills one of the lost packets, unless that sequence number was already
+    received, when it is a duplicate. A bitmap of the sequence numbers received in the window is kept for each stream
+    to tell them apart. A reorder from before the first packet of the stream, or of the last restart, was never
+    counted as lost, so it does not fill one. If it is further behind, the source has restarted.
+
+    It is a :class:`AcraNetwork.PcapParallel.PcapReducer`, so a large capture can be analysed with
+    ``parallel_reduce(filename, StreamStatistics)``.
+
+    >>> stats = StreamStatistics()
+    >>> with pcap.Pcap("test/inetx_test.pcap") as p:
+    ...     for r in p:
+    ...         stats.update(r)
+    >>> s = stats.summary(0xCA)
+    >>> print(s.packets, s.bytes, s.lost, round(s.pps, 1))
+    10 720 0 8.9
+
+    :param control: Only count iNetX packets with this control word. None to count all
+    :type control: int
+    :param reorder_window: How far behind the highest sequence number a packet can be to count as reordered
+    :type reorder_window: int
+    """
+
+    def __init__(self, control: typing.Optional[int] = inetx.iNetX.DEF_CONTROL_WORD, reorder_window: int = 1024):
+        self.control: typing.Optional[int] = control  #: The control word of the packets counted
+        self.reorder_window: int = reorder_window  #: The furthest back a reordered packet can be
+        self.ignored: int = 0  #: Packets that were not iNetX or had a different control word
+        self._rows: typing.Dict[int, int] = {}  # Stream ID to the row in the counter arrays
+        self._counters: typing.Dict[str, array.array] = {name: array.array("q") for name in _INT_COUNTERS}
+        self._counters.update((name, array.array("d")) for name in _FLOAT_COUNTERS)
+        # For each stream, bit n is set if the sequence number n behind the highest was received
+        self._received: typing.List[int] = []
+        # For each stream, the sequence numbers of the first packets, until the highest is two reorder windows past the
+        # start, when the counters no longer depend on the packets before them. merge replays them after the packets
+        # of the previous chunk
+        self._heads: typing.List[array.array] = []
+        self._head_open: typing.List[bool] = []  # The head is still being recorded
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, streamid: int) -> bool:
+        return streamid in self._rows
+
+    @property
+    def streamids(self) -> typing.List[int]:
+        """The stream IDs seen, sorted"""
+        return sorted(self._rows)
+
+    def _row(self, streamid: int, sequence: int, arrival: int) -> typing.Tuple[int, bool]:
+        """The row of the stream and if it was created for this packet"""
+        row = self._rows.get(streamid)
+        if row is not None:
+            return (row, False)
+        row = self._rows[streamid] = len(self._rows)
+        for counter in self._counters.values():
+            counter.append(0)
+        self._received.append(1)
+        self._heads.append(array.array("q", [sequence]))
+        self._head_open.append(True)
+        c = self._counters
+        c["first_sequence"][row] = c["last_sequence"][row] = sequence
+        c["first_arrival"][row] = c["last_arrival"][row] = arrival
+        c["latency_min"][row] = (1 << 63) - 1
+        c["latency_max"][row] = _NO_LATENCY
+        c["first_latency"][row] = c["last_latency"][row] = _NO_LATENCY
+        return (row, True)
+
+    def add(
+        self, streamid: int, sequence: int, size: int, arrival: int, ptptime: typing.Optional[int] = None
+    ) -> None:
+        """
+        Add one packet
+
+        :param streamid: The iNetX stream ID
+        :type streamid: int
+        :param sequence: The iNetX sequence number
+        :type sequence: int
+        :param size: The size of the iNetX packet, the UDP payload, in bytes
+        :type size: int
+        :param arrival: The time the packet was received, in ns since the epoch
+        :type arrival: int
+        :param ptptime: The PTP timestamp in the packet, in ns since the epoch. None to not measure latency
+        :type ptptime: int
+        """
+        (row, new) = self._row(streamid, sequence, arrival)
+        c = self._counters
+        c["packets"][row] += 1
+        c["bytes"][row] += size
+        if arrival > c["last_arrival"][row]:
+            c["last_arrival"][row] = arrival
+        elif arrival < c["first_arrival"][row]:
+            c["first_arrival"][row] = arrival
+
+        if not new:
+            last = c["last_sequence"][row]
+            delta = (sequence - last + (1 << 31)) % _ROLLOVER - (1 << 31)
+            if delta > 0:
+                c["lost"][row] += delta - 1
+                c["last_sequence"][row] = sequence
+                c["span"][row] += delta
+                if delta <= self.reorder_window:
+                    self._received[row] = ((self._received[row] << delta) | 1) & ((2 << self.reorder_window) - 1)
+                else:
+                    self._received[row] = 1
+            elif delta == 0:
+                c["duplicates"][row] += 1
+            elif delta >= -self.reorder_window:
+                if self._received[row] >> -delta & 1:
+                    c["duplicates"][row] += 1
+                else:
+                    self._received[row] |= 1 << -delta
+                    c["reorders"][row] += 1
+                    if -delta <= c["span"][row]:
+                        c["lost"][row] -= 1
+            else:
+                c["restarts"][row] += 1
+                c["last_sequence"][row] = sequence
+                c["span"][row] = 0
+                self._received[row] = 1
+            if self._head_open[row]:
+                self._heads[row].append(sequence)
+                self._head_open[row] = c["span"][row] <= 2 * self.reorder_window
+
+        if ptptime is not None:
+            latency = arrival - ptptime
+            c["latency_count"][row] += 1
+            c["latency_sum"][row] += latency
+            if latency < c["latency_min"][row]:
+                c["latency_min"][row] = latency
+            if latency > c["latency_max"][row]:
+                c["latency_max"][row] = latency
+            previous = c["last_latency"][row]
+            if previous != _NO_LATENCY:
+                c["jitter"][row] += (abs(latency - previous) - c["jitter"][row]) / 16
+            else:
+                c["first_latency"][row] = latency
+            c["last_latency"][row] = latency
+
+    def add_inetx(self, payload: bytes, arrival: typing.Optional[int] = None) -> bool:
+        """
+        Add an iNetX packet received on a socket, for example with
+        :meth:`AcraNetwork.McastSocket.McastSocket.recv_batch`
+
+        :param payload: The UDP payload
+        :type payload: bytes|memoryview
+        :param arrival: The receive time in ns since the epoch. None for now
+        :type arrival: int
+        :returns: False if the payload was not counted as it is not an iNetX packet with the control word
+        :rtype: bool
+        """
+        if arrival is None:
+            arrival = time.time_ns()
+        return self._add_inetx(payload, 0, arrival)
+
+    def _add_inetx(self, buf: bytes, offset: int, arrival: int) -> bool:
+        """Add the iNetX packet from offset to the end of buf"""
+        if len(buf) < offset + inetx.iNetX.INETX_HEADER_LENGTH:
+            self.ignored += 1
+            return False
+        (control, streamid, sequence, _len, ptpsec, ptpnsec) = _INETX_HEADER.unpack_from(buf, offset)
+        if self.control is not None and control != self.control:
+            self.ignored += 1
+            return False
+        self.add(streamid, sequence, len(buf) - offset, arrival, ptpsec * 1_000_000_000 + ptpnsec if ptpsec else None)
+        return True
+
+    def update(self, record: pcap.PcapRecord) -> None:
+        """
+        Add the iNetX packet in a pcap record. Records that are not UDP in IPv4 in Ethernet are ignored
+
+        :type record: PcapRecord
+        """
+        payload = record.payload
+        arrival = record.sec * 1_000_000_000 + record.nsec
+        if len(payload) >= _INETX_OFFSET:
+            (ethertype, version_ihl, fragment, protocol) = _IPV4_UDP_HEADER.unpack_from(payload)
+            if (
+                ethertype == SimpleEthernet.Ethernet.TYPE_IP
+                and version_ihl == 0x45
+                and protocol == SimpleEthernet.IP.PROTOCOL_UDP
+                and not fragment & 0x1FFF
+            ):
+                self._add_inetx(payload, _INETX_OFFSET, arrival)
+                return
+        # A VLAN tag, IP options or IPv6
+        try:
+            udp = SimpleEthernet.dissect(payload).udp
+        except ValueError:
+            udp = None
+        if udp is None:
+            self.ignored += 1
+            return
+        self._add_inetx(payload, udp.offset + SimpleEthernet.UDP.UDP_HEADER_SIZE, arrival)
+
+    def add_arrays(self, arrays) -> None:
+        """
+        Add the packets in the output of :meth:`AcraNetwork.Pcap.Pcap.to_arrays` with the
+        :data:`AcraNetwork.Pcap.INETX_FIELDS` columns, in one go. Requires numpy.
+
+        >>> stats = StreamStatistics()
+        >>> with pcap.Pcap("test/inetx_test.pcap") as p:
+        ...     stats.add_arrays(p.to_arrays(pcap.INETX_FIELDS))
+        >>> print(stats.summary(0xCA).packets)
+        10
+
+        :param arrays: numpy structured array with columns sec, nsec, incl_len, control, streamid, sequence,
+            ptptimeseconds and ptptimenanoseconds
+        :type arrays: numpy.ndarray
+        """
+        if not _numpy_available:
+            raise RuntimeError("numpy is required for StreamStatistics.add_arrays")
+        wanted = numpy.ones(len(arrays), dtype=bool)
+        if self.control is not None:
+            wanted = arrays["control"] == self.control
+        # Records too short to hold an iNetX header have a zero control word
+        wanted &= arrays["incl_len"] >= _INETX_OFFSET + inetx.iNetX.INETX_HEADER_LENGTH
+        self.ignored += int(len(arrays) - numpy.count_nonzero(wanted))
+        arrays = arrays[wanted]
+        ptptime = arrays["ptptimeseconds"].astype(numpy.int64) * 1_000_000_000 + arrays["ptptimenanoseconds"]
+        self.add_batch(
+            arrays["streamid"],
+            arrays["sequence"],
+            arrays["incl_len"].astype(numpy.int64) - _INETX_OFFSET,
+            arrays["sec"].astype(numpy.int64) * 1_000_000_000 + arrays["nsec"],
+            numpy.where(arrays["ptptimeseconds"] != 0, ptptime, _NO_LATENCY),
+        )
+
+    def add_batch(self, streamids, sequences, sizes, arrivals, ptptimes=None) -> None:
+        """
+        Add many packets from numpy arrays, in arrival order. The result is the same as calling
+        :meth:`StreamStatistics.add` for each. Requires numpy.
+
+        :param streamids: The stream IDs
+        :type streamids: numpy.ndarray
+        :param sequences: The sequence numbers
+        :type sequences: numpy.ndarray
+        :param sizes: The packet sizes in bytes
+        :type sizes: numpy.ndarray
+        :param arrivals: The arrival times in ns since the epoch
+        :type arrivals: numpy.ndarray
+        :param ptptimes: The PTP timestamps in ns since the epoch, with -2**63 for none. None to not measure latency
+        :type ptptimes: numpy.ndarray
+        """
+        if not _numpy_available:
+            raise RuntimeError("numpy is required for StreamStatistics.add_batch")
+        streamids = numpy.asarray(streamids)
+        if len(streamids) == 0:
+            return
+        order = numpy.argsort(streamids, kind="stable")
+        streamids = streamids[order]
+        sequences = numpy.asarray(sequences, dtype=numpy.int64)[order]
+        sizes = numpy.asarray(sizes, dtype=numpy.int64)[order]
+        arrivals = numpy.asarray(arrivals, dtype=numpy.int64)[order]
+        if ptptimes is not None:
+            ptptimes = numpy.asarray(ptptimes, dtype=numpy.int64)[order]
+        starts = numpy.flatnonzero(numpy.r_[True, streamids[1:] != streamids[:-1]])
+        ends = numpy.r_[starts[1:], len(streamids)]
+        for start, end in zip(starts.tolist(), ends.tolist()):
+            group = slice(start, end)
+            self._add_stream(
+                int(streamids[start]),
+                sequences[group],
+                sizes[group],
+                arrivals[group],
+                None if ptptimes is None else ptptimes[group],
+            )
+
+    def _add_stream(self, streamid, sequences, sizes, arrivals, ptptimes) -> None:
+        """Add the packets of one stream, applying the same rules as add, with numpy"""
+        (row, new) = self._row(streamid, int(sequences[0]), int(arrivals[0]))
+        c = self._counters
+        c["packets"][row] += len(sequences)
+        c["bytes"][row] += int(sizes.sum())
+        c["first_arrival"][row] = min(c["first_arrival"][row], int(arrivals.min()))
+        c["last_arrival"][row] = max(c["last_arrival"][row], int(arrivals.max()))
+
+        window = self.reorder_window
+        position = 1 if new else 0
+        while position < len(sequences):
+            # Unwrap the sequence numbers relative to the highest seen, then compare each to the running maximum
+            last = c["last_sequence"][row]
+            steps = numpy.diff(sequences[position:], prepend=last)
+            steps = (steps + (1 << 31)) % _ROLLOVER - (1 << 31)
+            unwrapped = numpy.cumsum(steps)
+            highest = numpy.maximum.accumulate(numpy.r_[0, unwrapped])[:-1]
+            delta = unwrapped - highest
+            restarts = numpy.flatnonzero(delta < -window)
+            if len(restarts):
+                delta = delta[: restarts[0]]
+                unwrapped = unwrapped[: restarts[0]]
+            # A packet behind the highest is a duplicate if its sequence number was received earlier in this batch or
+            # is set in the bitmap from before it
+            before = _unpack_bitmap(self._received[row], window)
+            seen = numpy.ones(len(unwrapped), dtype=bool)
+            seen[numpy.unique(unwrapped, return_index=True)[1]] = False
+            seen |= (unwrapped <= 0) & before[numpy.clip(-unwrapped, 0, window)]
+            behind = delta < 0
+            reorders = behind & ~seen
+            span = c["span"][row]
+            ahead = delta[delta > 0]
+            top = int(ahead.sum())  # The new highest sequence number, relative to last
+            # Only the reorders from after the start of the stream fill a lost packet
+            c["lost"][row] += top - len(ahead) - int(numpy.count_nonzero(reorders & (unwrapped >= -span)))
+            c["reorders"][row] += int(numpy.count_nonzero(reorders))
+            c["duplicates"][row] += int(numpy.count_nonzero(delta == 0)) + int(numpy.count_nonzero(behind & seen))
+            after = numpy.zeros(window + 1, dtype=bool)
+            if top <= window:
+                after[top:] = before[: window + 1 - top]
+            distances = top - unwrapped
+            after[distances[distances <= window]] = True
+            self._received[row] = _pack_bitmap(after)
+            if len(ahead):
+                c["last_sequence"][row] = (last + top) % _ROLLOVER
+            if self._head_open[row]:
+                head = sequences[position : position + len(unwrapped)]
+                spans = span + numpy.maximum.accumulate(numpy.r_[0, unwrapped])[1:]
+                closed = numpy.flatnonzero(spans > 2 * window)
+                if len(closed):
+                    head = head[: closed[0] + 1]
+                    self._head_open[row] = False
+                self._heads[row].extend(head.tolist())
+            c["span"][row] = span + top
+            if not len(restarts):
+                break
+            position += int(restarts[0])
+            c["restarts"][row] += 1
+            c["last_sequence"][row] = int(sequences[position])
+            c["span"][row] = 0
+            self._received[row] = 1
+            if self._head_open[row]:
+                self._heads[row].append(int(sequences[position]))
+            position += 1
+
+        if ptptimes is None:
+            return
+        valid = ptptimes != _NO_LATENCY
+        if not valid.any():
+            return
+        latency = arrivals[valid] - ptptimes[valid]
+        c["latency_count"][row] += len(latency)
+        c["latency_sum"][row] += float(latency.sum(dtype=float))
+        c["latency_min"][row] = min(c["latency_min"][row], int(latency.min()))
+        c["latency_max"][row] = max(c["latency_max"][row], int(latency.max()))
+        # The jitter recurrence J += (|D| - J) / 16 unrolled
+        if c["last_latency"][row] != _NO_LATENCY:
+            differences = numpy.abs(numpy.diff(latency, prepend=c["last_latency"][row]))
+            jitter = c["jitter"][row]
+        else:
+            differences = numpy.abs(numpy.diff(latency))
+            jitter = 0.0
+            c["first_latency"][row] = int(latency[0])
+        if len(differences):
+            weights = (15 / 16) ** numpy.arange(len(differences) - 1, -1, -1, dtype=float)
+            jitter = jitter * (15 / 16) ** len(differences) + float(numpy.dot(weights, differences)) / 16
+        c["jitter"][row] = jitter
+        c["last_latency"][row] = int(latency[-1])
+
+    def summary(self, streamid: int) -> StreamSummary:
+        """
+        The statistics of one stream
+
+        :type streamid: int
+        :rtype: StreamSummary
+        """
+        row = self._rows[streamid]
+        c = {name: counter[row] for name, counter in self._counters.items()}
+        if c["latency_count"]:
+            latency = (c["latency_min"], c["latency_sum"] / c["latency_count"], c["latency_max"], c["jitter"])
+        else:
+            latency = (None, None, None, None)
+        return StreamSummary(
+            streamid,
+            c["packets"],
+            c["bytes"],
+            c["lost"],
+            c["reorders"],
+            c["duplicates"],
+            c["restarts"],
+            c["first_arrival"],
+            c["last_arrival"],
+            *latency,
+        )
+
+    def summaries(self) -> typing.List[StreamSummary]:
+        """
+        The statistics of all the streams, sorted by stream ID
+
+        :rtype: list[StreamSummary]
+        """
+        return [self.summary(streamid) for streamid in self.streamids]
+
+    def _replay(
+        self, sequences: typing.Iterable[int], state: typing.Optional[typing.Tuple[int, int, int]] = None
+    ) -> typing.Tuple[typing.Dict[str, int], typing.Tuple[int, int, int]]:
+        """
+        Add the sequence numbers of one stream to a new StreamStatistics, starting from the state (last_sequence,
+        received bitmap, span) or as a new stream. Returns the sequence counters and the state after them
+        """
+        stats = StreamStatistics(None, self.reorder_window)
+        if state is not None:
+            stats._row(0, state[0], 0)
+            (stats._received[0], stats._counters["span"][0]) = state[1:]
+        for sequence in sequences:
+            stats.add(0, sequence, 0, 0)
+        c = stats._counters
+        counts = {name: c[name][0] for name in _SEQUENCE_COUNTERS}
+        return (counts, (c["last_sequence"][0], stats._received[0], c["span"][0]))
+
+    def merge(self, other: "StreamStatistics") -> None:
+        """
+        Combine the statistics of the packets that followed those in this object. The first packets of each stream in
+        other, up to where its counters no longer depend on the packets before them, are replayed after the highest
+        sequence number and the received bitmap here. The lost, reorder, duplicate and restart counts of other are
+        corrected by the difference, so losses, reorders and duplicates across the boundary are counted as if the
+        packets had been added to one object
+
+        :type other: StreamStatistics
+        """
+        self.ignored += other.ignored
+        oc = other._counters
+        for streamid, other_row in other._rows.items():
+            values = {name: counter[other_row] for name, counter in oc.items()}
+            (row, new) = self._row(streamid, values["first_sequence"], values["first_arrival"])
+            c = self._counters
+            if new:
+                for name, value in values.items():
+                    c[name][row] = value
+                self._received[row] = other._received[other_row]
+                self._heads[row] = array.array("q", other._heads[other_row])
+                self._head_open[row] = other._head_open[other_row]
+                continue
+            for name in ("packets", "bytes", "latency_count"):
+                c[name][row] += values[name]
+            c["latency_sum"][row] += values["latency_sum"]
+            c["latency_min"][row] = min(c["latency_min"][row], values["latency_min"])
+            c["latency_max"][row] = max(c["latency_max"][row], values["latency_max"])
+            c["first_arrival"][row] = min(c["first_arrival"][row], values["first_arrival"])
+            c["last_arrival"][row] = max(c["last_arrival"][row], values["last_arrival"])
+
+            # Other counted the head of the stream as if it were the start of the stream
+            head = other._heads[other_row]
+            (serial, state) = self._replay(head, (c["last_sequence"][row], self._received[row], c["span"][row]))
+            (alone, _state) = self._replay(head)
+            for name in _SEQUENCE_COUNTERS:
+                c[name][row] += values[name] + serial[name] - alone[name]
+            c["lost"][row] = max(c["lost"][row], 0)
+            if not other._head_open[other_row]:
+                # After the head, the state is the same as if other had followed the packets here
+                state = (values["last_sequence"], other._received[other_row], values["span"])
+            (c["last_sequence"][row], self._received[row], c["span"][row]) = state
+            if self._head_open[row]:
+                stats = StreamStatistics(None, self.reorder_window)
+                for sequence in self._heads[row] + head:
+                    stats.add(0, sequence, 0, 0)
+                self._heads[row] = stats._heads[0]
+                self._head_open[row] = stats._head_open[0] and other._head_open[other_row]
+
+            if values["last_latency"] == _NO_LATENCY:
+                continue
+            if c["last_latency"][row] == _NO_LATENCY:
+                c["jitter"][row] = values["jitter"]
+                c["first_latency"][row] = values["first_latency"]
+            else:
+                # The jitter in other started from 0 at its first packet, so add the decayed jitter up to the
+                # boundary
+                boundary = abs(values["first_latency"] - c["last_latency"][row])
+                decay = (15 / 16) ** (values["latency_count"] - 1)
+                c["jitter"][row] = decay * (c["jitter"][row] * 15 / 16 + boundary / 16) + values["jitter"]
+            c["last_latency"][row] = values["last_latency"]
@@ -15,6 +15,20 @@ __status__ = "Production"
 
 import struct
 import typing
+from collections import namedtuple
+
+
+class iNETHeader(
+    namedtuple(
+        "iNETHeader",
+        "version, option_word_count, type, flags, definition_ID, sequence, length, ptptimeseconds, ptptimenanoseconds",
+    )
+):
+    """
+    The header fields of an iNET packet, returned by :meth:`iNET.peek_header`
+    """
+
+    __slots__ = ()
 
 
 class iNETPackage(object):
@@ -110,6 +124,7 @@ class iNET(object):
 
     INET_HEADER_FORMAT = ">BBHIIIII"
     INET_HEADER_LENGTH = struct.calcsize(INET_HEADER_FORMAT)
+    _packetStrut = struct.Struct(INET_HEADER_FORMAT)  # Shared by all instances
     REQ_ATTR = (
         "flags",
         "type",
@@ -197,7 +212,7 @@ class iNET(object):
             self._length,
             self.ptptimeseconds,
             self.ptptimenanoseconds,
-        ) = struct.unpack_from(iNET.INET_HEADER_FORMAT, buf)
+        ) = self._packetStrut.unpack_from(buf)
         self.type = _type & 0xF
         self._option_wc = _wc_ver & 0xF
         self.version = (_wc_ver >> 4) & 0xF
@@ -215,6 +230,33 @@ class iNET(object):
 
         return True
 
+    @staticmethod
+    def peek_header(buf: bytes, offset: int = 0) -> iNETHeader:
+        """
+        Decode only the header of an iNET packet, without creating an :class:`iNET` object or unpacking the
+        packages. This is much faster than :meth:`iNET.unpack` when only the definition ID and sequence number are
+        needed, for example to route packets or check for losses
+
+        >>> from base64 import b64decode
+        >>> hdr = iNET.peek_header(b64decode('EAAAAAAAAAYAAAAAAAAAGAAAAAAAAAAA'))
+        >>> print(hdr.definition_ID, hdr.length)
+        6 24
+
+        :param buf: The buffer containing the packet
+        :type buf: bytes|memoryview
+        :param offset: The offset of the iNET header in buf
+        :type offset: int
+        :rtype: iNETHeader
+        """
+        if len(buf) < offset + iNET.INET_HEADER_LENGTH:
+            raise ValueError("Buffer is too short to be an iNET packet")
+        (wc_ver, _type, flags, definition_id, sequence, length, ptpsec, ptpnsec) = iNET._packetStrut.unpack_from(
+            buf, offset
+        )
+        return iNETHeader(
+            (wc_ver >> 4) & 0xF, wc_ver & 0xF, _type & 0xF, flags, definition_id, sequence, length, ptpsec, ptpnsec
+        )
+
     def __repr__(self):
         return (
             "MessageDefinitionID={:#0X} Sequence={} Type={} TimeStamp(s)={} TimeStamp(ns)={} OptionWordCount={}".format(
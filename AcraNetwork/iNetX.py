@@ -16,6 +16,17 @@ __status__ = "Production"
 
 import struct
 import typing
+from collections import namedtuple
+
+
+class iNetXHeader(
+    namedtuple("iNetXHeader", "inetxcontrol, streamid, sequence, packetlen, ptptimeseconds, ptptimenanoseconds, pif")
+):
+    """
+    The header fields of an iNetX packet, returned by :meth:`iNetX.peek_header`
+    """
+
+    __slots__ = ()
 
 
 class iNetX(object):
@@ -49,9 +60,14 @@ class iNetX(object):
 
     """
 
+    __slots__ = (
+        "inetxcontrol", "streamid", "sequence", "packetlen", "ptptimeseconds", "ptptimenanoseconds", "pif", "payload"
+    )
+
     DEF_CONTROL_WORD = 0x11000000  #: (Object Constant) The default iNetX control word.
     INETX_HEADER_FORMAT = ">LLLLLLL"
     INETX_HEADER_LENGTH = struct.calcsize(INETX_HEADER_FORMAT)
+    _packetStrut = struct.Struct(INETX_HEADER_FORMAT)  # Shared by all instances
     REQ_ATTR = ("inetxcontrol", "streamid", "sequence", "ptptimeseconds", "ptptimenanoseconds", "pif", "payload")
 
     def __init__(self, buf: typing.Optional[bytes] = None):
@@ -69,7 +85,6 @@ class iNetX(object):
         self.pif: int = 0  #: Payload Information Field
         self.payload: bytes = bytes()  #: Payload
 
-        self._packetStrut = struct.Struct(iNetX.INETX_HEADER_FORMAT)
         if buf is not None:
             self.unpack(buf)
 
@@ -100,10 +115,11 @@ class iNetX(object):
     def unpack(self, buf: bytes) -> bool:
         """
         Unpack a raw byte stream to an iNetX object
-        Accepts a buffer to unpack as the required argument
+        Accepts a buffer to unpack as the required argument. A memoryview, such as the payload of a record from a
+        memory mapped :class:`AcraNetwork.Pcap.Pcap`, is not copied and the payload will be a view into it
 
         :param buf: The string buffer to unpack
-        :type buf: bytes
+        :type buf: bytes|memoryview
         :rtype: bool
         """
 
@@ -129,6 +145,28 @@ class iNetX(object):
 
         return True
 
+    @staticmethod
+    def peek_header(buf: bytes, offset: int = 0) -> iNetXHeader:
+        """
+        Decode only the header of an iNetX packet, without creating an :class:`iNetX` object or copying the payload.
+        Use it in place of :meth:`iNetX.unpack` when only the stream ID and sequence number are needed, for example to
+        route packets or check for losses. The length field is not checked
+
+        >>> from base64 import b64decode
+        >>> hdr = iNetX.peek_header(b64decode('EQAAAAAAANwAAAABAAAAHgAAAAEAAAABAAAAAAUA'))
+        >>> print(f"{hdr.streamid:#0X} {hdr.sequence}")
+        0XDC 1
+
+        :param buf: The buffer containing the packet
+        :type buf: bytes|memoryview
+        :param offset: The offset of the iNetX header in buf, eg 42 for an Ethernet frame
+        :type offset: int
+        :rtype: iNetXHeader
+        """
+        if len(buf) < offset + iNetX.INETX_HEADER_LENGTH:
+            raise ValueError("Buffer is too short to be an iNetX packet")
+        return iNetXHeader._make(iNetX._packetStrut.unpack_from(buf, offset))
+
     def setPacketTime(self, utctimestamp, nanoseconds=0):
         """
         Set the packet timestamp
@@ -0,0 +1,128 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+=====
+Benchmark Decoded Packet Memory
+=====
+
+Decode many packets into lists of objects and report the memory used per packet and the cost of reading their
+attributes
+"""
+__author__ = "Diarmuid Collins"
+__copyright__ = "Copyright 2024"
+__version__ = "0.0.1"
+__maintainer__ = "Diarmuid Collins"
+__email__ = "dcollins@curtisswright.com"
+__status__ = "Production"
+
+
+import sys
+
+sys.path.append("..")
+
+import gc
+import time
+import timeit
+import struct
+import argparse
+import tracemalloc
+import AcraNetwork.Pcap as pcap
+import AcraNetwork.SimpleEthernet as SimpleEthernet
+import AcraNetwork.iNetX as inetx
+import AcraNetwork.MPEGTS as mpegts
+import AcraNetwork.IRIG106.Chapter11.MILSTD1553 as milstd1553
+from AcraNetwork.IRIG106.Chapter11 import TS_IEEE1558
+
+
+parser = argparse.ArgumentParser(description="Measure the memory and attribute access cost of decoded packets")
+parser.add_argument("--count", type=int, default=100000, help="Number of packets of each type to decode")
+parser.add_argument("--pcap", type=str, default="../test/inetx_test.pcap", help="Pcap file of iNetX packets")
+parser.add_argument("--ts", type=str, default="../test/stanag_sample.ts", help="MPEG transport stream file")
+args = parser.parse_args()
+
+
+def decode_inetx(payloads):
+    packets = []
+    for payload in payloads:
+        r = pcap.PcapRecord()
+        r.payload = payload
+        e = SimpleEthernet.Ethernet(r.payload)
+        i = SimpleEthernet.IP(e.payload)
+        u = SimpleEthernet.UDP(i.payload)
+        packets.append((r, e, i, u, inetx.iNetX(u.payload)))
+    return packets
+
+
+def decode_mpegts(payloads):
+    packets = []
+    for payload in payloads:
+        p = mpegts.MPEGPacket()
+        p.unpack(payload)
+        packets.append(p)
+    return packets
+
+
+def decode_milstd1553(payloads):
+    messages = []
+    for payload in payloads:
+        m = milstd1553.MILSTD1553Message(TS_IEEE1558)
+        m.unpack(payload)
+        messages.append(m)
+    return messages
+
+
+def attribute_time(obj, attrs):
+    """The average time to read one of the attributes in ns"""
+    number = 100000
+    unroll = 20  # Reads per statement, to make the cost of the timeit loop negligible
+    total = 0
+    for attr in attrs:
+        stmt = "; ".join(["obj." + attr] * unroll)
+        total += min(timeit.repeat(stmt, globals={"obj": obj}, number=number, repeat=5))
+    return total * 1e9 / (number * unroll * len(attrs))
+
+
+def measure(name, decoder, source, count, attrs):
+    payloads = [source[i % len(source)] for i in range(count)]
+    gc.collect()
+    start = time.perf_counter()
+    packets = decoder(payloads)
+    elapsed = time.perf_counter() - start
+    del packets
+    # Measured separately as tracing slows the decoding
+    gc.collect()
+    tracemalloc.start()
+    packets = decoder(payloads)
+    (used, _) = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    packet = packets[-1]
+    if isinstance(packet, tuple):
+        access = sum(attribute_time(layer, attrs[i]) for i, layer in enumerate(packet)) / len(packet)
+    else:
+        access = attribute_time(packet, attrs)
+    print(
+        "{:<28} {:>8.0f} bytes/packet {:>10.0f} packets/s {:>8.1f} ns/attribute".format(
+            name, used / count, count / elapsed, access
+        )
+    )
+    del packets
+
+
+with pcap.Pcap(args.pcap) as p:
+    inetx_payloads = [bytes(r.payload) for r in p]
+with open(args.ts, "rb") as f:
+    ts = f.read()
+ts_payloads = [ts[i : i + 188] for i in range(0, len(ts) - 187, 188)]
+milstd1553_payloads = [struct.pack("<QHHH", i, 0, 0, 32) + bytes(32) for i in range(100)]
+
+print("INFO: Decoding {} packets of each type".format(args.count))
+inetx_attrs = (
+    ("sec", "incl_len"),
+    ("type", "dstmac"),
+    ("dstip", "len"),
+    ("dstport", "payload"),
+    ("streamid", "sequence", "ptptimeseconds", "payload"),
+)
+measure("Pcap/Ethernet/IP/UDP/iNetX", decode_inetx, inetx_payloads, args.count, inetx_attrs)
+measure("MPEGPacket", decode_mpegts, ts_payloads, args.count, ("pid", "continuitycounter", "pusi", "payload"))
+measure("MILSTD1553Message", decode_milstd1553, milstd1553_payloads, args.count, ("blockstatus", "length", "message"))
@@ -33,6 +33,16 @@ parser.add_argument(
     "--type", required=True, type=str, choices=["udp", "iena", "inetx"], help="The type of _payload, udp iena or inetx"
 )
 parser.add_argument("--ignoretime", required=False, action="store_true", default=False)
+parser.add_argument(
+    "--bulk", required=False, action="store_true", default=False, help="Write the records using Pcap.write_raw"
+)
+parser.add_argument(
+    "--template",
+    required=False,
+    action="store_true",
+    default=False,
+    help="Build the packet once with SimpleEthernet.PacketTemplate and patch the sequence and time",
+)
 args = parser.parse_args()
 
 # constants
@@ -77,7 +87,28 @@ else:
 
 packets_written = 0
 
+if args.template:
+    # Offsets of the sequence number in the payload
+    SEQUENCE_FORMAT = {"udp": None, "inetx": (8, ">I", 0x100000000), "iena": (12, ">H", 65536)}
+    udp_packet.srcport = {"udp": 4999, "iena": 5000, "inetx": 5001}[args.type]
+    template = SimpleEthernet.PacketTemplate(
+        ethernet_packet, ip_packet, udp_packet, payload if args.type == "udp" else avionics_packet.pack()
+    )
+
 start_time = time.time()
+while args.template and packets_written < PACKETS_TO_WRITE:
+    if SEQUENCE_FORMAT[args.type] is not None:
+        (offset, fmt, rollover) = SEQUENCE_FORMAT[args.type]
+        template.patch(offset, fmt, (packets_written + 1) % rollover)
+    if args.type == "inetx" and not args.ignoretime:
+        template.patch(16, ">I", int(time.time()))
+    if args.ignoretime:
+        mypcap.write_raw(0, 0, template.buffer)
+    else:
+        currenttime = time.time()
+        mypcap.write_raw(int(currenttime), int((currenttime % 1) * 1e6), template.buffer)
+    packets_written += 1
+
 while packets_written < PACKETS_TO_WRITE:
     if args.type == "udp":
         udp_packet.srcport = 4999
@@ -99,14 +130,21 @@ while packets_written < PACKETS_TO_WRITE:
 
     ip_packet.payload = udp_packet.pack()
     ethernet_packet.payload = ip_packet.pack()
-    record = pcap.PcapRecord()
-    if args.ignoretime:
-        record.usec = 0
-        record.sec = 0
+    if args.bulk:
+        if args.ignoretime:
+            mypcap.write_raw(0, 0, ethernet_packet.pack())
+        else:
+            currenttime = time.time()
+            mypcap.write_raw(int(currenttime), int((currenttime % 1) * 1e6), ethernet_packet.pack())
     else:
-        record.setCurrentTime()
-    record.packet = ethernet_packet.pack()
-    mypcap.write(record)
+        record = pcap.PcapRecord()
+        if args.ignoretime:
+            record.usec = 0
+            record.sec = 0
+        else:
+            record.setCurrentTime()
+        record.packet = ethernet_packet.pack()
+        mypcap.write(record)
 
     packets_written += 1
 
@@ -21,7 +21,6 @@ from os import mkdir, remove
 import datetime
 from dataclasses import dataclass, field
 import typing
-import zstandard as zstd
 import sys
 
 VERSION = "0.5.0"
@@ -133,11 +132,6 @@ def uri_validator(x):
         return False
 
 
-def is_compressed(x: str) -> bool:
-    (_root, _ext) = os.path.splitext(x)
-    return _ext == ".zst"
-
-
 def main(args):
     roll_over = pow(2, 32)
     fnames = {}
@@ -194,27 +188,11 @@ def main(args):
                 dlspeed = data_len * 8 / (time.time() - sd) / 1e6
                 logging.info("Downloaded {} at {:.1f}Mbps and wrote to {}".format(pfile, dlspeed, outf))
             p = pcap.Pcap(outf)
-        elif is_compressed(pfile):
-
-            if not os.path.exists(tmp_folder):
-                mkdir(tmp_folder, 0o755)
-            fname_pcap, _ext = os.path.splitext(os.path.basename(pfile))
-            decompressed_f = os.path.join(tmp_folder, fname_pcap)
-            with open(pfile, "rb") as compressed:
-                with open(decompressed_f, "wb") as decompressed:
-                    dctx = zstd.ZstdDecompressor()
-                    dctx.copy_stream(compressed, decompressed)
-
-            # Get sizes
-            compressed_size = os.path.getsize(pfile)
-            decompressed_size = os.path.getsize(decompressed_f)
-
-            # Compute compression ratio
-            compression_ratio = decompressed_size / compressed_size
-            logging.info(f"Compression ratio: {compression_ratio:.2f}x")
-            p = pcap.Pcap(decompressed_f)
         else:
+            # Compressed captures are decompressed as they are read
             p = pcap.Pcap(pfile)
+            if p.compression is not None:
+                logging.info(f"Reading {p.compression} compressed {pfile}")
         prev_rec_ts = None
         for i, r in enumerate(p):
 
@@ -341,8 +319,6 @@ def main(args):
             remove(outf)
         elif is_url and not args.verbose:
             remove(outf)
-        if is_compressed(pfile):
-            remove(decompressed_f)
 
     print("\n")
     if len(streams) > 0:
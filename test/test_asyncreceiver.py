@@ -0,0 +1,91 @@
+__author__ = "diarmuid"
+import sys
+
+sys.path.append("..")
+import asyncio
+import unittest
+import AcraNetwork.iNetX as inetx
+import AcraNetwork.McastSocket as mcast
+import AcraNetwork.AsyncReceiver as asyncreceiver
+import AcraNetwork.IRIG106.Chapter24 as ch24
+
+
+class AsyncReceiverTest(unittest.TestCase):
+    def inetx_packet(self, sequence):
+        p = inetx.iNetX()
+        p.streamid = 0xDC
+        p.sequence = sequence
+        p.payload = bytes(100)
+        return p.pack()
+
+    def test_backpressure(self):
+        async def main():
+            receiver = await asyncreceiver.open_receiver(inetx.iNetX, 0, maxsize=4)
+            sender = mcast.McastSocket()
+            for sequence in range(50):
+                sender.sendto(self.inetx_packet(sequence), ("127.0.0.1", receiver.sockname[1]))
+            sender.sendto(b"not inetx", ("127.0.0.1", receiver.sockname[1]))
+            await asyncio.sleep(0.05)
+            # The rest are waiting in the socket
+            self.assertEqual(len(receiver), 4)
+            sequences = []
+            async for packet in receiver:
+                sequences.append(packet.sequence)
+                if not len(receiver):
+                    await asyncio.sleep(0.05)
+                    if not len(receiver):
+                        receiver.close()
+            sender.close()
+            return receiver, sequences
+
+        (receiver, sequences) = asyncio.run(main())
+        if receiver.pauses:
+            # The rest were waiting in the socket
+            self.assertEqual(sequences, list(range(50)))
+            self.assertEqual((receiver.received, receiver.decode_errors, receiver.dropped), (51, 1, 0))
+        else:
+            # Before Python 3.11 the transport can not be paused, so the rest were dropped
+            self.assertEqual(sequences, list(range(4)))
+            self.assertEqual((receiver.received, receiver.decode_errors, receiver.dropped), (51, 0, 47))
+
+    def test_transport_without_pause(self):
+        # A datagram transport before Python 3.11 raises NotImplementedError from pause_reading
+        receiver = asyncreceiver.PacketReceiver(inetx.iNetX, maxsize=2)
+        receiver.connection_made(asyncio.ReadTransport())
+        for sequence in range(5):
+            receiver.datagram_received(self.inetx_packet(sequence), ("127.0.0.1", 0))
+        self.assertEqual((len(receiver), receiver.received, receiver.dropped, receiver.pauses), (2, 5, 3, 0))
+
+    def test_many_streams(self):
+        async def consume(receiver, results):
+            async for packet in receiver:
+                results.append((packet.definitionid, packet.sequence))
+
+        async def main():
+            receivers = [await asyncreceiver.open_receiver(ch24.TmNSMessage, 0) for i in range(20)]
+            sender = mcast.McastSocket()
+            for sequence in range(5):
+                for definitionid, receiver in enumerate(receivers):
+                    msg = ch24.TmNSMessage()
+                    msg.definitionid = definitionid
+                    msg.sequence = sequence
+                    msg.payload = bytes(8)
+                    sender.sendto(msg.pack(), ("127.0.0.1", receiver.sockname[1]))
+            results = []
+            tasks = [asyncio.create_task(consume(r, results)) for r in receivers]
+            await asyncio.sleep(0.1)
+            for receiver in receivers:
+                receiver.close()
+            await asyncio.gather(*tasks)
+            sender.close()
+            return results
+
+        results = asyncio.run(main())
+        self.assertEqual(sorted(results), [(i, s) for i in range(20) for s in range(5)])
+
+    def test_bad_arguments(self):
+        self.assertRaises(ValueError, asyncreceiver.PacketReceiver, inetx.iNetX, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
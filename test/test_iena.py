@@ -21,6 +21,7 @@ import AcraNetwork.Pcap as pcap
 import struct
 import os
 from copy import copy
+import pickle
 from base64 import b64encode
 
 THIS_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -142,6 +143,13 @@ class IENATest(unittest.TestCase):
         i2 = copy(i)
         self.assertTrue(i2 == i)
 
+    def test_peek_header(self):
+        hdr = iena.IENA.peek_header(self.upd.payload)
+        self.assertEqual(tuple(hdr), (0x1A, 24, 0x1D102F800, 1, 1, 195))
+        self.assertEqual(hdr.key, 0x1A)
+        self.assertEqual(iena.IENA.peek_header(b"\x00" * 4 + self.upd.payload, 4), hdr)
+        self.assertRaises(ValueError, iena.IENA.peek_header, self.upd.payload[:13])
+
     def test_unpack_IENAM(self):
         """Read all the IENA packets in a pcap file and check each field"""
         # Now I have a _payload that will be an iena packet
@@ -350,6 +358,82 @@ class IENATest(unittest.TestCase):
         b = iena.IENAQ()
         self.assertRaises(Exception, lambda: b.unpack(bytes(buf)))
 
+    def test_ienam_lazy_parameters(self):
+        i = iena.IENAM()
+        i.key = 0xDC
+        for idx in range(200):
+            i.parameters.append(iena.MParameter(paramid=idx + 1000, delay=idx, dataset=os.urandom(idx % 7)))
+        i.parameters.append(iena.MParameter(paramid=1000, delay=0, dataset=b"dup"))
+        expected = list(i.parameters)
+        buf = i.pack()
+
+        b = iena.IENAM()
+        b.unpack(buf)
+        self.assertEqual(len(b), 201)
+        self.assertEqual(b[150], expected[150])
+        self.assertIsInstance(b[150].dataset, memoryview)
+        self.assertEqual(b[-1], expected[-1])
+        self.assertEqual(b[10:13], expected[10:13])
+        self.assertRaises(IndexError, lambda: b[201])
+        # The first parameter with the ID is returned
+        self.assertEqual(b.by_paramid(1000), expected[0])
+        self.assertEqual(b.by_paramid(1199), expected[199])
+        self.assertRaises(KeyError, b.by_paramid, 999)
+        self.assertEqual(list(b.iter_parameters()), expected)
+        self.assertEqual(b.pack(), buf)
+
+        # The list of parameters is built when used and can then be modified
+        self.assertEqual(b.parameters, expected)
+        self.assertIsInstance(b.parameters[0].dataset, bytes)
+        del b.parameters[0]
+        self.assertEqual(b.by_paramid(1000), expected[-1])
+        self.assertEqual(b[0], expected[1])
+        c = iena.IENAM()
+        c.unpack(b.pack())
+        self.assertEqual(list(c), expected[1:])
+
+        # Unpacking again replaces the parameters
+        c.unpack(buf)
+        self.assertEqual(len(c), 201)
+        c2 = pickle.loads(pickle.dumps(c))
+        self.assertEqual(c2.by_paramid(1005), expected[5])
+
+    def test_ienaq_lazy_parameters(self):
+        i = iena.IENAQ()
+        i.key = 0xDC
+        for idx in range(50):
+            i.parameters.append(iena.QParameter(paramid=idx, dataset=os.urandom(idx)))
+        expected = list(i.parameters)
+        b = iena.IENAQ()
+        b.unpack(memoryview(i.pack()))
+        self.assertEqual([b[idx] for idx in (0, 25, 49)], [expected[idx] for idx in (0, 25, 49)])
+        self.assertEqual(b.by_paramid(33), expected[33])
+        self.assertEqual(list(b), expected)
+
+        # The old iterator protocol on the packet itself still works
+        iter(b)
+        with self.assertWarns(DeprecationWarning):
+            self.assertEqual([b.next(), next(b)], expected[:2])
+
+        # Replacing the payload keeps the parameters that were unpacked
+        b.unpack(i.pack())
+        b.payload = b""
+        self.assertEqual(len(b), 50)
+        self.assertEqual(list(b), expected)
+        self.assertEqual(b.pack(), i.pack())
+
+    def test_ienad_ienan_lazy_parameters(self):
+        udp_pkt = get_udp_packet("ienad.pcap")
+        i = iena.IENAD()
+        i.unpack(udp_pkt.payload)
+        self.assertEqual(i[-1], i.parameters[-1])
+        self.assertEqual(i.by_paramid(0xFFFF).dwords, [0xFED1, 0x7CFE])
+        n = iena.IENAN()
+        n.unpack(self.upd.payload)
+        self.assertEqual(list(n.iter_parameters()), n.parameters)
+        self.assertEqual(n.by_paramid(0xDC), n[0])
+        self.assertRaises(KeyError, n.by_paramid, 0x1234)
+
 
 if __name__ == "__main__":
     unittest.main()
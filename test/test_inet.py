@@ -106,6 +106,14 @@ class testINET(unittest.TestCase):
 
         self.assertEqual(self.i, i2)
 
+    def test_peek_header(self):
+        hdr = iNET.iNET.peek_header(self.i.pack())
+        self.assertEqual((hdr.version, hdr.option_word_count, hdr.type), (1, 2, 1))
+        self.assertEqual((hdr.definition_ID, hdr.sequence, hdr.length), (0xDC, 3, 96))
+        self.assertEqual((hdr.ptptimeseconds, hdr.ptptimenanoseconds), (100, 1000))
+        self.assertEqual(iNET.iNET.peek_header(getEthernetPacket(self.i.pack()), 42), hdr)
+        self.assertRaises(ValueError, iNET.iNET.peek_header, bytes(23))
+
     def test_minimalinet(self):
         i = iNET.iNET()
         i.definition_ID = 6
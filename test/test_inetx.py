@@ -96,6 +96,15 @@ class iNetXTest(unittest.TestCase):
             sequencenum += 1
         mypcap.close()
 
+    def test_peek_header(self):
+        with pcap.Pcap(os.path.join(THIS_DIR, "inetx_test.pcap")) as mypcap:
+            for record in mypcap:
+                hdr = inetx.iNetX.peek_header(record.payload, 42)
+                packet = inetx.iNetX(record.payload[42:])
+                self.assertEqual(hdr, tuple(getattr(packet, f) for f in inetx.iNetXHeader._fields))
+                self.assertEqual(hdr, inetx.iNetX.peek_header(bytes(record.payload[42:])))
+        self.assertRaises(ValueError, inetx.iNetX.peek_header, bytes(69), 42)
+
 
 if __name__ == "__main__":
     unittest.main()
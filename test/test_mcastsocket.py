@@ -0,0 +1,149 @@
+__author__ = "diarmuid"
+import sys
+
+sys.path.append("..")
+import time
+import errno
+import ctypes
+import socket
+import unittest
+import AcraNetwork.McastSocket as mcast
+
+
+class BatchTest(unittest.TestCase):
+    def setUp(self):
+        self.rx = mcast.McastSocket(timestamps=True, drop_counting=True)
+        self.rx.settimeout(1)
+        self.address = ("127.0.0.1", self.rx.getsockname()[1])
+        self.tx = mcast.McastSocket()
+        self.mmsg_available = mcast._mmsg_available
+
+    def tearDown(self):
+        self.rx.close()
+        self.tx.close()
+        mcast._mmsg_available = self.mmsg_available
+
+    def receive(self, expected, count=16, bufsize=2048):
+        datagrams = []
+        while len(datagrams) < expected:
+            batch = self.rx.recv_batch(count, bufsize)
+            self.assertLessEqual(len(batch), count)
+            datagrams.extend((bytes(data), address, timestamp) for (data, address, timestamp) in batch)
+        return datagrams
+
+    def check_batch(self):
+        packets = [i.to_bytes(2, "big") * (i + 1) for i in range(50)]
+        packets[1] = bytearray(packets[1])
+        packets[2] = memoryview(packets[2])
+        before = time.time_ns()
+        self.assertEqual(self.tx.send_batch(packets, self.address), 50)
+        datagrams = self.receive(50)
+        self.assertEqual([data for (data, address, timestamp) in datagrams], [bytes(p) for p in packets])
+        source = ("127.0.0.1", self.tx.getsockname()[1])
+        self.assertEqual({address for (data, address, timestamp) in datagrams}, {source})
+        if self.rx.timestamps:
+            for (data, address, timestamp) in datagrams:
+                self.assertLess(abs(timestamp - before), 5_000_000_000)
+
+        self.rx.settimeout(0.05)
+        self.assertRaises(socket.timeout, self.rx.recv_batch)
+
+    def test_batch(self):
+        self.check_batch()
+
+    def test_fallback(self):
+        mcast._mmsg_available = False
+        self.rx._pool_shape = (0, 0)
+        self.check_batch()
+
+    def test_pool_reused(self):
+        self.tx.send_batch([b"first", b"second"], self.address)
+        self.tx.connect(self.address)
+        self.tx.send_batch([bytes(100)])
+        datagrams = self.receive(3, count=4, bufsize=10)
+        self.assertEqual([d for (d, a, t) in datagrams], [b"first", b"second", bytes(10)])
+        self.tx.send_batch([b"third"])
+        (data, address, timestamp) = self.rx.recv_batch(4, 10)[0]
+        self.assertIs(data.obj, self.rx._pool)
+        self.assertEqual(bytes(data), b"third")
+
+
+    def check_drops(self):
+        before = self.rx.drops
+        for i in range(100):
+            self.tx.sendto(bytes(1000), self.address)
+        datagrams = self.receive(1)
+        while True:
+            try:
+                datagrams.extend(self.rx.recv_batch(16))
+            except socket.timeout:
+                break
+        self.assertLess(len(datagrams), 100)
+        # The drop count is carried by the datagrams queued after the drops
+        self.assertEqual(self.rx.drops, before)
+        self.tx.sendto(b"after", self.address)
+        self.assertEqual(self.receive(1)[0][0], b"after")
+        self.assertEqual(self.rx.drops - before, 100 - len(datagrams))
+
+    @unittest.skipUnless(sys.platform.startswith("linux"), "SO_RXQ_OVFL is Linux only")
+    def test_drops(self):
+        self.assertTrue(self.rx.drop_counting)
+        self.rx.set_receive_buffer(4096)
+        self.rx.settimeout(0.1)
+        self.check_drops()
+        mcast._mmsg_available = False
+        self.rx._pool_shape = (0, 0)
+        self.check_drops()
+
+    @unittest.skipUnless(mcast._mmsg_available, "sendmmsg is Linux only")
+    def test_send_buffer_full(self):
+        calls = []
+
+        def sendmmsg(fd, headers, count, flags):
+            # Sends one datagram, then reports a full send buffer on every other call
+            calls.append(count)
+            if len(calls) % 2:
+                return 1
+            ctypes.set_errno(errno.EAGAIN)
+            return -1
+
+        self.addCleanup(setattr, mcast, "_sendmmsg", mcast._sendmmsg)
+        mcast._sendmmsg = sendmmsg
+        self.tx.setblocking(False)
+        self.assertEqual(self.tx.send_batch([b"a", b"b", b"c"], self.address), 1)
+        self.assertEqual(calls, [3, 2])
+        # With a timeout, it waits for the socket to be writable and carries on
+        del calls[:]
+        self.tx.settimeout(0.1)
+        self.assertEqual(self.tx.send_batch([b"a", b"b", b"c"], self.address), 3)
+        self.assertEqual(calls, [3, 2, 2, 1, 1])
+
+    def test_no_ancillary_data_by_default(self):
+        rx = mcast.McastSocket()
+        rx.settimeout(1)
+        self.assertFalse(rx.timestamps or rx.drop_counting)
+        self.tx.sendto(b"plain", ("127.0.0.1", rx.getsockname()[1]))
+        if hasattr(rx, "recvmsg"):
+            self.assertEqual(rx.recvmsg(100, 100)[:2], (b"plain", []))
+        rx.close()
+
+    def test_receive_buffer(self):
+        s = mcast.McastSocket(rcvbuf=300000)
+        self.assertGreaterEqual(s.receive_buffer_size, 300000)
+        s.close()
+
+    @unittest.skipUnless(sys.platform.startswith("linux"), "net.core.rmem_max is Linux only")
+    def test_receive_buffer_limited(self):
+        with open("/proc/sys/net/core/rmem_max") as f:
+            rmem_max = int(f.read())
+        # Without SO_RCVBUFFORCE the size is capped at rmem_max, even with CAP_NET_ADMIN
+        force = mcast.SO_RCVBUFFORCE
+        mcast.SO_RCVBUFFORCE = -1
+        try:
+            with self.assertLogs(mcast.logger, "WARNING"):
+                self.assertEqual(self.rx.set_receive_buffer(rmem_max + 2**20), rmem_max)
+        finally:
+            mcast.SO_RCVBUFFORCE = force
+
+if __name__ == "__main__":
+    unittest.main()
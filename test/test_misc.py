@@ -3,6 +3,50 @@ import unittest
 from AcraNetwork import endianness_swap
 import struct
 import timeit
+import pickle
+import AcraNetwork.Pcap as pcap
+import AcraNetwork.SimpleEthernet as SimpleEthernet
+import AcraNetwork.iNetX as inetx
+import AcraNetwork.IENA as iena
+import AcraNetwork.MPEGTS as mpegts
+import AcraNetwork.IRIG106.Chapter11 as ch11
+import AcraNetwork.IRIG106.Chapter11.MILSTD1553 as milstd1553
+import AcraNetwork.IRIG106.Chapter11.UART as uart
+
+
+class SlotsTest(unittest.TestCase):
+    CLASSES = (
+        pcap.PcapRecord,
+        SimpleEthernet.Ethernet,
+        SimpleEthernet.IP,
+        SimpleEthernet.IPv4,
+        SimpleEthernet.IPv6,
+        SimpleEthernet.UDP,
+        inetx.iNetX,
+        iena.IENA,
+        iena.IENAM,
+        iena.IENAD,
+        mpegts.MPEGPacket,
+        ch11.Chapter11,
+        milstd1553.MILSTD1553Message,
+        uart.UARTDataWord,
+    )
+
+    def test_no_instance_dict(self):
+        for cls in self.CLASSES:
+            obj = cls()
+            self.assertFalse(hasattr(obj, "__dict__"), cls.__name__)
+            self.assertRaises(AttributeError, setattr, obj, "not_an_attribute", 1)
+
+    def test_pickle(self):
+        i = inetx.iNetX()
+        i.streamid = 0xDC
+        i.sequence = 5
+        i.payload = bytes(10)
+        i2 = pickle.loads(pickle.dumps(i))
+        self.assertEqual(i2.pack(), i.pack())
+        p = mpegts.MPEGPacket()
+        self.assertEqual(pickle.loads(pickle.dumps(p)).pid, p.pid)
 
 
 class MiscTest(unittest.TestCase):
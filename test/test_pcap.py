@@ -5,8 +5,11 @@ sys.path.append("..")
 import os
 
 import unittest
+from unittest import mock
 import AcraNetwork.Pcap as pcap
 import AcraNetwork.SimpleEthernet as SimpleEthernet
+import AcraNetwork.iNetX as inetx
+import AcraNetwork.IENA as iena
 import struct
 import tempfile
 
@@ -188,5 +191,460 @@ class PcapBasicTest(unittest.TestCase):
         os.unlink(fname)
 
 
+class PcapMmapTest(unittest.TestCase):
+    def test_mmap_matches_read(self):
+        with pcap.Pcap(os.path.join(THIS_DIR, "test_input.pcap")) as p:
+            expected = [(r.sec, r.usec, r.incl_len, r.payload) for r in p]
+        with pcap.Pcap(os.path.join(THIS_DIR, "test_input.pcap"), mmap=True) as p:
+            self.assertEqual(p.filesize, 704)
+            records = list(p)
+            self.assertEqual(p.rec_no, len(expected))
+            for rec, (sec, usec, incl_len, payload) in zip(records, expected):
+                self.assertIsInstance(rec.payload, memoryview)
+                self.assertEqual((rec.sec, rec.usec, rec.incl_len), (sec, usec, incl_len))
+                self.assertEqual(rec.payload, payload)
+            self.assertEqual(len(records), len(expected))
+
+    def test_mmap_getitem(self):
+        with pcap.Pcap(os.path.join(THIS_DIR, "test_input.pcap"), mmap=True) as p:
+            rec = p[0]
+            self.assertEqual(rec.sec, 1419678111)
+            self.assertEqual(rec.usec, 811463)
+            self.assertEqual(rec.incl_len, 70)
+
+    def test_mmap_inetx(self):
+        with pcap.Pcap(os.path.join(THIS_DIR, "inetx_test.pcap"), mmap=True) as p:
+            sequence = 1011
+            for rec in p:
+                i = inetx.iNetX()
+                i.unpack(rec.payload[0x2A:])
+                self.assertIsInstance(i.payload, memoryview)
+                self.assertEqual(i.sequence, sequence)
+                sequence += 1
+
+    def test_mmap_iena(self):
+        with pcap.Pcap(os.path.join(THIS_DIR, "iena_test.pcap")) as p:
+            expected = []
+            for rec in p:
+                i = iena.IENA()
+                i.unpack(rec.payload[0x2A:])
+                expected.append((i.key, i.sequence, i.endfield, i.payload))
+        with pcap.Pcap(os.path.join(THIS_DIR, "iena_test.pcap"), mmap=True) as p:
+            for rec, (key, sequence, endfield, payload) in zip(p, expected):
+                i = iena.IENA()
+                i.unpack(rec.payload[0x2A:])
+                self.assertIsInstance(i.payload, memoryview)
+                self.assertEqual((i.key, i.sequence, i.endfield), (key, sequence, endfield))
+                self.assertEqual(i.payload, payload)
+
+    def test_mmap_views_outlive_close(self):
+        p = pcap.Pcap(os.path.join(THIS_DIR, "test_input.pcap"), mmap=True)
+        rec = next(p)
+        p.close()
+        self.assertTrue(p.fopen.closed)
+        self.assertEqual(len(bytes(rec.payload)), 70)
+
+    def test_mmap_write_mode(self):
+        fname = os.path.join(TMP_DIR, "_mmap_write.pcap")
+        self.assertRaises(ValueError, lambda: pcap.Pcap(fname, mode="w", mmap=True))
+        os.unlink(fname)
+
+
+class PcapIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.fname = os.path.join(TMP_DIR, "_index_test.pcap")
+        with pcap.Pcap(self.fname, mode="w") as p:
+            for i in range(20):
+                r = pcap.PcapRecord()
+                r.sec = i
+                r.payload = getEthernetPacket(i) + bytes(i)
+                p.write(r)
+
+    def tearDown(self):
+        for f in (self.fname, self.fname + ".idx"):
+            if os.path.exists(f):
+                os.unlink(f)
+
+    def test_random_access(self):
+        for use_mmap in (False, True):
+            with pcap.Pcap(self.fname, mmap=use_mmap) as p:
+                # The index is built by len() on a freshly opened file
+                self.assertEqual(len(p), 20)
+                self.assertIsNotNone(p._index)
+                self.assertEqual(len(list(p)), 20)
+                self.assertEqual(p[5].sec, 5)
+                self.assertEqual(len(p[5]), 16 + 5)
+                self.assertEqual(p[-1].sec, 19)
+                self.assertEqual([r.sec for r in p[2:8:3]], [2, 5])
+                self.assertEqual([r.sec for r in reversed(p)], list(range(19, -1, -1)))
+                self.assertRaises(IndexError, lambda: p[20])
+
+    def test_random_access_keeps_iteration(self):
+        with pcap.Pcap(self.fname) as p:
+            self.assertEqual(next(p).sec, 0)
+            self.assertEqual(p[10].sec, 10)
+            self.assertEqual(next(p).sec, 1)
+            self.assertEqual(p.rec_no, 2)
+
+    def test_sidecar(self):
+        with pcap.Pcap(self.fname, index_file=True) as p:
+            self.assertEqual(len(p), 20)
+        self.assertTrue(os.path.exists(self.fname + ".idx"))
+        with pcap.Pcap(self.fname, index_file=True) as p:
+            self.assertIsNotNone(p._load_index())
+            # len() loads the sidecar instead of scanning the file
+            with mock.patch.object(p, "_scan_offsets", side_effect=AssertionError):
+                self.assertEqual(len(p), 20)
+            self.assertEqual(p[7].sec, 7)
+        # A sidecar from a different capture is ignored
+        with pcap.Pcap(self.fname, mode="a") as p:
+            r = pcap.PcapRecord()
+            r.sec = 20
+            r.payload = getEthernetPacket(20)
+            p.write(r)
+        with pcap.Pcap(self.fname, index_file=True) as p:
+            self.assertIsNone(p._load_index())
+            self.assertEqual(len(p.build_index()), 21)
+            self.assertEqual(p[20].sec, 20)
+
+
+class PcapBulkWriteTest(unittest.TestCase):
+    def setUp(self):
+        self.fname = os.path.join(TMP_DIR, "_bulk_ref.pcap")
+        self.fname_bulk = os.path.join(TMP_DIR, "_bulk.pcap")
+        self.records = []
+        for i in range(50):
+            r = pcap.PcapRecord()
+            r.sec = 1000 + i
+            r.usec = i * 7
+            r.payload = getEthernetPacket(i) + bytes(i * 3)
+            self.records.append(r)
+        with pcap.Pcap(self.fname, mode="w") as p:
+            for r in self.records:
+                p.write(r)
+
+    def tearDown(self):
+        for f in (self.fname, self.fname_bulk):
+            if os.path.exists(f):
+                os.unlink(f)
+
+    def _read(self, fname):
+        with open(fname, "rb") as f:
+            return f.read()
+
+    def test_write_many(self):
+        with pcap.Pcap(self.fname_bulk, mode="w") as p:
+            p.write_many(self.records)
+            self.assertEqual(p.rec_no, 50)
+        self.assertEqual(self._read(self.fname_bulk), self._read(self.fname))
+
+    def test_write_raw(self):
+        with pcap.Pcap(self.fname_bulk, mode="w") as p:
+            for r in self.records:
+                p.write_raw(r.sec, r.usec, r.payload)
+        self.assertEqual(self._read(self.fname_bulk), self._read(self.fname))
+
+    def test_write_raw_mixed_and_small_buffer(self):
+        orig_size = pcap.Pcap.WRITE_BUFFER_SIZE
+        pcap.Pcap.WRITE_BUFFER_SIZE = 100
+        try:
+            with pcap.Pcap(self.fname_bulk, mode="w") as p:
+                for i, r in enumerate(self.records):
+                    if i % 3 == 0:
+                        p.write(r)
+                    else:
+                        p.write_raw(r.sec, r.usec, r.payload)
+                self.assertEqual(p.rec_no, 50)
+        finally:
+            pcap.Pcap.WRITE_BUFFER_SIZE = orig_size
+        self.assertEqual(self._read(self.fname_bulk), self._read(self.fname))
+
+
+class PcapFormatTest(unittest.TestCase):
+    def setUp(self):
+        self.fname = os.path.join(TMP_DIR, "_format.pcap")
+
+    def tearDown(self):
+        if os.path.exists(self.fname):
+            os.unlink(self.fname)
+
+    def test_record_nsec(self):
+        r = pcap.PcapRecord()
+        r.usec = 123456
+        self.assertEqual(r.nsec, 123456000)
+        r.nsec = 987654321
+        self.assertEqual(r.usec, 987654)
+        r.set_current_time()
+        self.assertLess(r.nsec, 1000000000)
+
+    def test_variants(self):
+        for nanosecond in (False, True):
+            for byteorder in ("little", "big"):
+                with pcap.Pcap(self.fname, mode="w", nanosecond=nanosecond, byteorder=byteorder) as p:
+                    r = pcap.PcapRecord()
+                    r.sec = 1700000000
+                    r.nsec = 123456789
+                    r.payload = getEthernetPacket(1)
+                    p.write(r)
+                    p.write_raw_ns(1700000001, 5, getEthernetPacket(2))
+                    p.write_raw(1700000002, 7, getEthernetPacket(3))
+                # Append adopts the format of the existing file
+                with pcap.Pcap(self.fname, mode="a") as p:
+                    self.assertEqual((p.nanosecond, p.byteorder), (nanosecond, byteorder))
+                    p.write_many([r])
+                with open(self.fname, "rb") as f:
+                    magic = f.read(4)
+                expected_magic = pcap.Pcap.MAGIC_NSEC if nanosecond else pcap.Pcap.MAGIC_USEC
+                self.assertEqual(magic, expected_magic.to_bytes(4, byteorder))
+                for use_mmap in (False, True):
+                    with pcap.Pcap(self.fname, mmap=use_mmap) as p:
+                        self.assertEqual(p.magic, expected_magic)
+                        self.assertEqual(p.network, 1)
+                        self.assertEqual(p.snaplen, 65535)
+                        records = list(p)
+                        self.assertEqual(len(p.build_index()), 4)
+                    self.assertEqual(len(records), 4)
+                    expected_nsec = [123456789, 5, 7000, 123456789] if nanosecond else [123456000, 0, 7000, 123456000]
+                    self.assertEqual([rec.nsec for rec in records], expected_nsec)
+                    self.assertEqual([rec.sec for rec in records], [1700000000, 1700000001, 1700000002, 1700000000])
+                    self.assertEqual(records[2].payload, getEthernetPacket(3))
+
+    def test_bad_magic(self):
+        with open(self.fname, "wb") as f:
+            f.write(bytes(40))
+        self.assertRaises(ValueError, lambda: pcap.Pcap(self.fname))
+        self.assertRaises(ValueError, lambda: pcap.Pcap(self.fname, mode="w", byteorder="middle"))
+
+    def test_pcapng_nanosecond(self):
+        with pcap.PcapNg(self.fname, mode="w", nanosecond=True) as png:
+            r = pcap.PcapRecord()
+            r.sec = 1700000000
+            r.nsec = 123456789
+            r.payload = bytes(10)
+            png.write(r)
+        with pcap.PcapNg(self.fname) as png:
+            self.assertEqual(png.interfaces[0].units_per_sec, 10**9)
+            rec = next(png)
+        self.assertEqual((rec.sec, rec.nsec), (1700000000, 123456789))
+
+
+@unittest.skipUnless(pcap._numpy_available, "numpy not installed")
+class PcapArraysTest(unittest.TestCase):
+    def setUp(self):
+        self.fname = os.path.join(TMP_DIR, "_arrays.pcap")
+
+    def tearDown(self):
+        if os.path.exists(self.fname):
+            os.unlink(self.fname)
+
+    def test_matches_records(self):
+        for use_mmap in (False, True):
+            with pcap.Pcap(os.path.join(THIS_DIR, "inetx_test.pcap"), mmap=use_mmap) as p:
+                arrays = p.to_arrays(pcap.INETX_FIELDS)
+                records = list(p)
+            self.assertEqual(len(arrays), len(records))
+            for row, rec in zip(arrays, records):
+                self.assertEqual((row["sec"], row["nsec"]), (rec.sec, rec.nsec))
+                self.assertEqual((row["incl_len"], row["orig_len"]), (rec.incl_len, rec.orig_len))
+                i = inetx.iNetX()
+                i.unpack(rec.payload[0x2A:])
+                self.assertEqual((row["streamid"], row["sequence"]), (i.streamid, i.sequence))
+
+    def test_short_records_and_format(self):
+        with pcap.Pcap(self.fname, mode="w", nanosecond=True, byteorder="big") as p:
+            p.write_raw_ns(1700000000, 123456789, bytes(range(8)))
+            p.write_raw_ns(1700000001, 5, bytes(2))
+        with pcap.Pcap(self.fname) as p:
+            arrays = p.to_arrays({"word": (4, ">u4")})
+        self.assertEqual(list(arrays["offset"]), [24, 48])
+        self.assertEqual(list(arrays["nsec"]), [123456789, 5])
+        self.assertEqual(list(arrays["incl_len"]), [8, 2])
+        self.assertEqual(list(arrays["word"]), [0x04050607, 0])
+        # A truncated last record is cut short as when iterating
+        with open(self.fname, "r+b") as f:
+            f.truncate(24 + 16 + 6)
+        for use_mmap in (False, True):
+            with pcap.Pcap(self.fname, mmap=use_mmap) as p:
+                arrays = p.to_arrays({"word": (4, ">u4")})
+                self.assertEqual([r.incl_len for r in p], [6])
+            self.assertEqual((list(arrays["incl_len"]), list(arrays["word"])), ([6], [0]))
+
+    def test_empty(self):
+        with pcap.Pcap(self.fname, mode="w"):
+            pass
+        with pcap.Pcap(self.fname) as p:
+            self.assertEqual(len(p.to_arrays(pcap.INETX_FIELDS)), 0)
+
+
+class PcapIterTest(unittest.TestCase):
+    def setUp(self):
+        self.fname = os.path.join(TMP_DIR, "_iter.pcap")
+        with pcap.Pcap(self.fname, mode="w", nanosecond=True) as p:
+            for i in range(100):
+                p.write_raw_ns(1700000000 + i // 10, (i % 10) * 100000000, getEthernetPacket(i))
+
+    def tearDown(self):
+        if os.path.exists(self.fname):
+            os.unlink(self.fname)
+
+    def test_window(self):
+        for use_mmap in (False, True):
+            with pcap.Pcap(self.fname, mmap=use_mmap) as p:
+                records = list(p.iter(start_time=1700000002.25, end_time=1700000003.5))
+                self.assertEqual([(r.sec, r.nsec) for r in records][0], (1700000002, 300000000))
+                self.assertEqual(len(records), 12)
+                self.assertEqual(bytes(records[0].payload), getEthernetPacket(23))
+                self.assertEqual(len(list(p.iter(end_time=1700000001))), 10)
+                self.assertEqual(len(list(p.iter(start_time=1700000009.9))), 1)
+                self.assertEqual(list(p.iter(start_time=1700000010)), [])
+                self.assertEqual(len(list(p.iter())), 100)
+
+    def test_filter(self):
+        with pcap.Pcap(self.fname, mode="w") as p:
+            for i in range(20):
+                u = SimpleEthernet.UDP()
+                u.srcport = 5000
+                u.dstport = 3000 + i % 4
+                u.payload = struct.pack(">I", i)
+                ip = SimpleEthernet.IP()
+                ip.srcip = "192.168.1.1"
+                ip.dstip = "235.0.0.1"
+                ip.protocol = SimpleEthernet.IP.PROTOCOLS["UDP"]
+                ip.payload = u.pack()
+                e = SimpleEthernet.Ethernet()
+                e.srcmac = 0x001122334455
+                e.dstmac = 0x998877665544
+                e.type = SimpleEthernet.Ethernet.TYPE_IP
+                e.payload = ip.pack()
+                p.write_raw(1700000000, i, e.pack())
+        for use_mmap in (False, True):
+            with pcap.Pcap(self.fname, mmap=use_mmap) as p:
+                f = pcap.PayloadFilter.udp(dstport=3001, srcport=5000, dstip="235.0.0.1", srcip="192.168.1.1")
+                self.assertEqual([r.usec for r in p.iter(filter=f)], [1, 5, 9, 13, 17])
+                f.add(42, struct.pack(">I", 9))
+                self.assertEqual([r.usec for r in p.iter(filter=f)], [9])
+                self.assertEqual(list(p.iter(filter=pcap.PayloadFilter.udp(dstip="235.0.0.2"))), [])
+                self.assertEqual(len(list(p.iter(filter=pcap.PayloadFilter.udp()))), 20)
+                self.assertEqual(len(list(p.iter(filter=lambda payload: len(payload) > 1000))), 0)
+
+
+class PcapCompressionTest(unittest.TestCase):
+    def setUp(self):
+        self.fnames = []
+
+    def tearDown(self):
+        for fname in self.fnames:
+            if os.path.exists(fname):
+                os.unlink(fname)
+
+    def _roundtrip(self, fname, **kwargs):
+        self.fnames.append(fname)
+        with pcap.Pcap(fname, mode="w", **kwargs) as p:
+            for i in range(50):
+                p.write_raw(1700000000, i, getEthernetPacket(i))
+            r = pcap.PcapRecord()
+            r.payload = getEthernetPacket(50)
+            p.write(r)
+        with pcap.Pcap(fname) as p:
+            records = list(p)
+        self.assertEqual(len(records), 51)
+        self.assertEqual([r.payload for r in records], [getEthernetPacket(i) for i in range(51)])
+        self.assertEqual(records[10].usec, 10)
+        with pcap.Pcap(fname) as p:
+            return p.compression
+
+    def test_stdlib(self):
+        for ext, compression in ((".gz", "gzip"), (".bz2", "bz2"), (".xz", "xz")):
+            self.assertEqual(self._roundtrip(os.path.join(TMP_DIR, "_compressed.pcap" + ext)), compression)
+        # Detected from the contents regardless of the filename
+        self.assertEqual(self._roundtrip(os.path.join(TMP_DIR, "_compressed.pcap"), compression="gzip"), "gzip")
+
+    @unittest.skipUnless(pcap._zstandard_available, "zstandard not installed")
+    def test_zstd(self):
+        self.assertEqual(self._roundtrip(os.path.join(TMP_DIR, "_compressed.pcap.zst")), "zstd")
+
+    def test_sequential_only(self):
+        fname = os.path.join(TMP_DIR, "_compressed.pcap.gz")
+        self._roundtrip(fname)
+        with pcap.Pcap(fname) as p:
+            self.assertEqual(len(list(p.iter(filter=lambda payload: payload[-2] == 7))), 1)
+            self.assertRaises(ValueError, lambda: p[1])
+        self.assertRaises(ValueError, lambda: pcap.Pcap(fname, mmap=True))
+        self.assertRaises(ValueError, lambda: pcap.Pcap(fname, mode="a"))
+        self.assertRaises(ValueError, lambda: pcap.Pcap(fname, mode="w", compression="lz4"))
+        with pcap.Pcap(os.path.join(THIS_DIR, "test_input.pcap")) as p:
+            self.assertIsNone(p.compression)
+
+
+class PcapNgTest(unittest.TestCase):
+    def setUp(self):
+        self.fname = os.path.join(TMP_DIR, "_test.pcapng")
+
+    def tearDown(self):
+        if os.path.exists(self.fname):
+            os.unlink(self.fname)
+
+    def _be_block(self, block_type, body):
+        body += bytes(-len(body) % 4)
+        total_len = len(body) + 12
+        return struct.pack(">II", block_type, total_len) + body + struct.pack(">I", total_len)
+
+    def test_roundtrip(self):
+        with pcap.Pcap(os.path.join(THIS_DIR, "test_input.pcap")) as p:
+            records = list(p)
+        with pcap.PcapNg(self.fname, mode="w") as png:
+            for r in records:
+                png.write(r)
+            self.assertEqual(png.rec_no, len(records))
+        with pcap.PcapNg(self.fname) as png:
+            self.assertEqual(png.network, 1)
+            self.assertEqual(len(png.interfaces), 1)
+            read_back = list(png)
+            self.assertEqual(png.rec_no, len(records))
+        self.assertEqual(len(read_back), len(records))
+        for r, r2 in zip(records, read_back):
+            self.assertEqual((r.sec, r.usec, r.orig_len, r.payload), (r2.sec, r2.usec, r2.orig_len, r2.payload))
+
+    def test_big_endian_multiple_interfaces(self):
+        shb = self._be_block(pcap.PcapNg.BLOCK_TYPE_SHB, struct.pack(">IHHq", 0x1A2B3C4D, 1, 0, -1))
+        # Interface 0 has the default microsecond resolution, interface 1 nanoseconds
+        idb0 = self._be_block(pcap.PcapNg.BLOCK_TYPE_IDB, struct.pack(">HHI", 1, 0, 0))
+        idb1 = self._be_block(
+            pcap.PcapNg.BLOCK_TYPE_IDB, struct.pack(">HHIHHBxxxHH", 1, 0, 0, 9, 1, 9, 0, 0)
+        )
+        nrb = self._be_block(4, bytes(8))
+        ts_ns = 1419678111 * 10**9 + 811463123
+        epb1 = self._be_block(
+            pcap.PcapNg.BLOCK_TYPE_EPB, struct.pack(">IIIII", 1, ts_ns >> 32, ts_ns & 0xFFFFFFFF, 5, 60) + bytes(5)
+        )
+        ts_us = 1419678112 * 10**6 + 7
+        epb0 = self._be_block(
+            pcap.PcapNg.BLOCK_TYPE_EPB, struct.pack(">IIIII", 0, ts_us >> 32, ts_us & 0xFFFFFFFF, 3, 3) + b"abc"
+        )
+        spb = self._be_block(pcap.PcapNg.BLOCK_TYPE_SPB, struct.pack(">I", 2) + b"xy")
+        with open(self.fname, "wb") as f:
+            f.write(shb + idb0 + idb1 + nrb + epb1 + epb0 + spb)
+
+        with pcap.PcapNg(self.fname) as png:
+            self.assertEqual(len(png.interfaces), 2)
+            self.assertEqual(png.interfaces[1].units_per_sec, 10**9)
+            records = list(png)
+        self.assertEqual(len(records), 3)
+        self.assertEqual((records[0].sec, records[0].usec), (1419678111, 811463))
+        self.assertEqual(records[0].interface_id, 1)
+        self.assertEqual(records[0].orig_len, 60)
+        self.assertEqual(records[0].payload, bytes(5))
+        self.assertEqual((records[1].sec, records[1].usec), (1419678112, 7))
+        self.assertEqual(records[1].payload, b"abc")
+        self.assertEqual(records[2].payload, b"xy")
+
+    def test_wrong_format(self):
+        with pcap.PcapNg(self.fname, mode="w"):
+            pass
+        self.assertRaises(ValueError, lambda: pcap.Pcap(self.fname))
+        self.assertRaises(ValueError, lambda: pcap.PcapNg(os.path.join(THIS_DIR, "test_input.pcap")))
+        self.assertRaises(ValueError, lambda: pcap.PcapNg(self.fname, mode="a"))
+
+
 if __name__ == "__main__":
     unittest.main()
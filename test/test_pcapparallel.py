@@ -0,0 +1,134 @@
+__author__ = "diarmuid"
+import sys
+
+sys.path.append("..")
+import os
+import unittest
+import tempfile
+import struct
+import AcraNetwork.Pcap as pcap
+import AcraNetwork.PcapParallel as pcapparallel
+import AcraNetwork.iNetX as inetx
+
+
+TMP_DIR = tempfile.gettempdir()
+UDP_HEADERS = bytes(0x2A)
+
+
+class SequenceReducer(pcapparallel.PcapReducer):
+    """Count the iNetX sequence gaps per stream, including across chunk boundaries"""
+
+    def __init__(self):
+        self.first = {}
+        self.last = {}
+        self.gaps = {}
+        self.count = 0
+
+    def update(self, record):
+        (streamid, sequence) = struct.unpack_from(">II", record.payload, 0x2A + 4)
+        if streamid in self.last:
+            self.gaps[streamid] += sequence - self.last[streamid] - 1
+        else:
+            self.first[streamid] = sequence
+            self.gaps[streamid] = 0
+        self.last[streamid] = sequence
+        self.count += 1
+
+    def merge(self, other):
+        for streamid, first in other.first.items():
+            if streamid in self.last:
+                self.gaps[streamid] += first - self.last[streamid] - 1 + other.gaps[streamid]
+            else:
+                self.first[streamid] = first
+                self.gaps[streamid] = other.gaps[streamid]
+            self.last[streamid] = other.last[streamid]
+        self.count += other.count
+
+
+class PayloadReducer(pcapparallel.PcapReducer):
+    """Keep every payload"""
+
+    def __init__(self):
+        self.payloads = []
+
+    def update(self, record):
+        self.payloads.append(record.payload)
+
+    def merge(self, other):
+        self.payloads.extend(other.payloads)
+
+
+class PcapParallelTest(unittest.TestCase):
+    def setUp(self):
+        self.fnames = [os.path.join(TMP_DIR, f"_parallel_{i}.pcap") for i in range(2)]
+        sequence = {0xA: 0, 0xB: 0}
+        for fname in self.fnames:
+            with pcap.Pcap(fname, mode="w") as p:
+                for i in range(500):
+                    streamid = 0xA if i % 3 else 0xB
+                    sequence[streamid] += 1
+                    # Drop a few packets from stream A
+                    if streamid == 0xA and i % 97 == 0:
+                        sequence[streamid] += 1
+                    pkt = inetx.iNetX()
+                    pkt.streamid = streamid
+                    pkt.sequence = sequence[streamid]
+                    pkt.payload = bytes(20)
+                    p.write_raw(0, 0, UDP_HEADERS + pkt.pack())
+
+    def tearDown(self):
+        for fname in self.fnames:
+            os.unlink(fname)
+
+    def test_partition(self):
+        with pcap.Pcap(self.fnames[0]) as p:
+            ranges = p.partition(7)
+            self.assertEqual(len(ranges), 7)
+            self.assertEqual(ranges[0][0], pcap.Pcap.GLOBAL_HEADER_SIZE)
+            self.assertEqual(ranges[-1][1], p.filesize)
+            for (_start, end), (start, _end) in zip(ranges, ranges[1:]):
+                self.assertEqual(end, start)
+            records = [r for start, end in ranges for r in p.iter_range(start, end)]
+            self.assertEqual(len(records), 500)
+            self.assertEqual([bytes(r.payload) for r in records], [bytes(r.payload) for r in p[:]])
+
+    def test_parallel_matches_serial(self):
+        serial = SequenceReducer()
+        for fname in self.fnames:
+            with pcap.Pcap(fname) as p:
+                for r in p:
+                    serial.update(r)
+        parallel = pcapparallel.parallel_reduce(self.fnames, SequenceReducer, workers=2, chunks_per_worker=5)
+        self.assertEqual(parallel.count, 1000)
+        self.assertEqual(parallel.gaps, serial.gaps)
+        self.assertEqual(parallel.gaps[0xB], 0)
+        self.assertEqual(parallel.last, serial.last)
+
+    def test_folder(self):
+        folder = tempfile.mkdtemp()
+        self.assertIsNone(pcapparallel.parallel_reduce(folder, SequenceReducer, workers=1))
+        os.rmdir(folder)
+
+    def test_compressed_and_pcapng(self):
+        folder = tempfile.mkdtemp()
+        with pcap.Pcap(self.fnames[0]) as p:
+            expected = [bytes(r.payload) for r in p]
+        fnames = [os.path.join(folder, f) for f in ("a.pcap", "b.pcap.gz", "c.pcapng", "ignored.txt")]
+        for fname in fnames:
+            with (pcap.PcapNg if fname.endswith("ng") else pcap.Pcap)(fname, mode="w") as p:
+                for payload in expected:
+                    r = pcap.PcapRecord()
+                    r.payload = payload
+                    p.write(r)
+        try:
+            # The payloads are kept in the reducers, which are pickled by the workers
+            result = pcapparallel.parallel_reduce(folder, PayloadReducer, workers=2)
+            self.assertEqual(result.payloads, expected * 3)
+        finally:
+            for fname in fnames:
+                os.unlink(fname)
+            os.rmdir(folder)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+__author__ = "diarmuid"
+import sys
+
+sys.path.append("..")
+import os
+import glob
+import unittest
+import tempfile
+import AcraNetwork.Pcap as pcap
+import AcraNetwork.PcapWriter as pcapwriter
+
+
+class RotatingPcapWriterTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.fname = os.path.join(self.folder, "rec.pcap")
+
+    def tearDown(self):
+        for fname in glob.glob(os.path.join(self.folder, "*")):
+            os.unlink(fname)
+        os.rmdir(self.folder)
+
+    def read_all(self, filenames):
+        payloads = []
+        for fname in filenames:
+            with pcap.Pcap(fname) as p:
+                payloads.extend(bytes(r.payload) for r in p)
+        return payloads
+
+    def test_max_bytes(self):
+        payloads = [i.to_bytes(4, "big") * 10 for i in range(100)]
+        with pcapwriter.RotatingPcapWriter(self.fname, max_bytes=1024) as w:
+            for i, payload in enumerate(payloads):
+                if i % 2:
+                    w.write_raw(1700000000, i, payload)
+                else:
+                    r = pcap.PcapRecord()
+                    r.sec = 1700000000
+                    r.usec = i
+                    r.payload = payload
+                    w.write(r)
+        self.assertEqual(len(w.filenames), 6)
+        self.assertEqual(w.filenames[0], os.path.join(self.folder, "rec_00000.pcap"))
+        self.assertEqual(sorted(glob.glob(os.path.join(self.folder, "*"))), w.filenames)
+        for fname in w.filenames:
+            self.assertLessEqual(os.path.getsize(fname), 1024)
+        self.assertEqual(self.read_all(w.filenames), payloads)
+
+    def test_max_seconds(self):
+        with pcapwriter.RotatingPcapWriter(self.fname, max_seconds=10, nanosecond=True) as w:
+            for i in range(100):
+                w.write_raw_ns(1700000000 + i, 500, bytes(10))
+        self.assertEqual(len(w.filenames), 10)
+        with pcap.Pcap(w.filenames[3]) as p:
+            records = list(p)
+        self.assertTrue(p.nanosecond)
+        self.assertEqual([r.sec for r in records], list(range(1700000030, 1700000040)))
+        self.assertEqual(records[0].nsec, 500)
+
+    def test_ring_buffer(self):
+        with pcapwriter.RotatingPcapWriter(self.fname + ".gz", max_bytes=500, max_files=3) as w:
+            for i in range(200):
+                w.write_raw(1700000000, i, i.to_bytes(2, "big"))
+                self.assertLessEqual(len(w.filenames), 3)
+        self.assertEqual(sorted(glob.glob(os.path.join(self.folder, "*"))), w.filenames)
+        self.assertEqual(w.filenames[-1], os.path.join(self.folder, "rec_00007.pcap.gz"))
+        payloads = self.read_all(w.filenames)
+        self.assertEqual(payloads[-1], (199).to_bytes(2, "big"))
+        self.assertEqual(payloads, [i.to_bytes(2, "big") for i in range(200 - len(payloads), 200)])
+
+    def test_bad_arguments(self):
+        self.assertRaises(ValueError, lambda: pcapwriter.RotatingPcapWriter(self.fname))
+        self.assertRaises(ValueError, lambda: pcapwriter.RotatingPcapWriter(self.fname, max_bytes=100, max_files=0))
+        self.assertRaises(IOError, lambda: pcapwriter.RotatingPcapWriter("/nonexistent/rec.pcap", max_bytes=100))
+
+
+if __name__ == "__main__":
+    unittest.main()
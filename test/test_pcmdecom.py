@@ -0,0 +1,135 @@
+__author__ = "diarmuid"
+import sys
+
+sys.path.append("..")
+import os
+import random
+import struct
+import unittest
+import AcraNetwork.SamDec008 as samdec
+import AcraNetwork.IRIG106.Chapter11.PCM as ch10pcm
+from AcraNetwork.PCMDecom import PCMDecom, PCMParameter
+
+try:
+    import numpy
+except ImportError:
+    _numpy_available = False
+else:
+    _numpy_available = True
+
+THIS_DIR = os.path.dirname(__file__)
+SYNC = 0xFE6B2840
+
+
+def minor_frames(count, words=32, byteorder=">"):
+    rand = random.Random(1)
+    frames = []
+    for i in range(count):
+        data = [rand.getrandbits(16) for w in range(words - 3)]
+        frames.append(struct.pack("{}IH{}H".format(byteorder, words - 3), SYNC, i % 8, *data))
+    return frames
+
+
+def decom_struct(frame, parameter, byteorder=">"):
+    """Decommutate one parameter from one frame, the slow way"""
+    (sfid,) = struct.unpack_from(byteorder + "H", frame, 4)
+    if parameter.sfid is not None:
+        if parameter.interval is None and sfid != parameter.sfid:
+            return []
+        if parameter.interval is not None and (sfid - parameter.sfid) % parameter.interval:
+            return []
+    words = parameter.word if isinstance(parameter.word, list) else [parameter.word]
+    span = -(-(parameter.bits + parameter.lsb) // 16)
+    samples = []
+    for word in words:
+        value = 0
+        for w in struct.unpack_from("{}{}H".format(byteorder, span), frame, word * 2):
+            value = (value << 16) | w
+        samples.append((value >> parameter.lsb) & ((1 << parameter.bits) - 1))
+    return samples
+
+
+@unittest.skipUnless(_numpy_available, "numpy not installed")
+class PCMDecomTest(unittest.TestCase):
+    WORDMAP = {
+        "word": PCMParameter(3),
+        "last": PCMParameter(31),
+        "bits": PCMParameter(4, bits=5, lsb=3),
+        "wide": PCMParameter(5, bits=32),
+        "wide_unaligned": PCMParameter(7, bits=20, lsb=4),
+        "super": PCMParameter([10, 14, 18, 22]),
+        "sub": PCMParameter(11, sfid=3),
+        "sub_interval": PCMParameter(12, bits=8, sfid=1, interval=4),
+        "super_sub": PCMParameter([13, 29], sfid=0, interval=2),
+    }
+
+    def check(self, frames, samples, byteorder=">"):
+        self.assertEqual(set(samples), set(self.WORDMAP))
+        for name, parameter in self.WORDMAP.items():
+            expected = [s for frame in frames for s in decom_struct(frame, parameter, byteorder)]
+            self.assertEqual(samples[name].tolist(), expected, name)
+
+    def test_decom(self):
+        frames = minor_frames(50)
+        decom = PCMDecom(self.WORDMAP, 64, sfid=PCMParameter(2))
+        samples = decom.decom(frames)
+        self.check(frames, samples)
+        self.assertEqual(len(samples["super"]), 200)
+        self.assertEqual(len(samples["sub"]), 6)
+        self.assertEqual((samples["word"].dtype, samples["bits"].dtype), (numpy.uint16, numpy.uint8))
+        self.assertEqual(samples["wide"].dtype, numpy.uint32)
+
+        # The same from a buffer and from an array
+        self.check(frames, decom.decom(b"".join(frames)))
+        array = numpy.frombuffer(b"".join(frames), dtype=numpy.uint8).reshape(50, 64)
+        self.check(frames, decom.decom(array))
+        self.assertRaises(ValueError, decom.decom, frames + [bytes(10)])
+        self.assertRaises(ValueError, decom.decom, bytes(65))
+
+    def test_little_endian(self):
+        frames = minor_frames(20, byteorder="<")
+        samples = PCMDecom(self.WORDMAP, 64, sfid=PCMParameter(2), byteorder="<").decom(frames)
+        self.check(frames, samples, "<")
+
+    def test_blocks(self):
+        frames = minor_frames(100)
+        decom = PCMDecom(self.WORDMAP, 64, sfid=PCMParameter(2))
+        blocks = list(decom.blocks((memoryview(f) for f in frames), block_size=30))
+        self.assertEqual([len(b["word"]) for b in blocks], [30, 30, 30, 10])
+        samples = {name: numpy.concatenate([b[name] for b in blocks]) for name in self.WORDMAP}
+        self.check(frames, samples)
+        self.assertRaises(ValueError, lambda: list(decom.blocks([bytes(63)])))
+
+    def test_samdec(self):
+        s = samdec.SamDecPcap(os.path.join(THIS_DIR, "sample_pcap/samdec.pcap"))
+        decom = PCMDecom({"sfid": PCMParameter(2), "word3": PCMParameter(3)}, 1154)
+        (samples,) = decom.blocks(s.frames())
+        self.assertEqual(samples["sfid"].tolist(), [4, 5, 6, 7])
+        s.close()
+
+    def test_chapter10(self):
+        frames = minor_frames(4, byteorder="<")
+        p = ch10pcm.PCMDataPacket(ipts_source=None, syncword=SYNC, minor_frame_size_bytes=64)
+        for frame in frames:
+            mf = ch10pcm.PCMMinorFrame(ipts_source=None)
+            mf.intra_packet_data_header = 0
+            mf.minor_frame_data = frame
+            p.append(mf)
+        p2 = ch10pcm.PCMDataPacket(ipts_source=None, minor_frame_size_bytes=64)
+        p2.unpack(p.pack())
+        samples = PCMDecom(self.WORDMAP, 64, sfid=PCMParameter(2), byteorder="<").decom(
+            [mf.minor_frame_data for mf in p2.minor_frames]
+        )
+        self.check(frames, samples, "<")
+
+    def test_bad_wordmap(self):
+        self.assertRaises(ValueError, PCMDecom, {"a": PCMParameter(32)}, 64)
+        self.assertRaises(ValueError, PCMDecom, {"a": PCMParameter(31, bits=32)}, 64)
+        self.assertRaises(ValueError, PCMDecom, {"a": PCMParameter(3, sfid=1)}, 64)
+        self.assertRaises(ValueError, PCMDecom, {"a": PCMParameter(3, bits=0)}, 64)
+        self.assertRaises(ValueError, PCMDecom, {"a": PCMParameter(3)}, 64, word_bits=12)
+        self.assertRaises(ValueError, PCMDecom, {"a": PCMParameter(3)}, 63)
+
+
+if __name__ == "__main__":
+    unittest.main()
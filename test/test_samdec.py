@@ -0,0 +1,111 @@
+__author__ = "diarmuid"
+import sys
+
+sys.path.append("..")
+import os
+import random
+import struct
+import unittest
+import AcraNetwork.iNetX as inetx
+import AcraNetwork.McastSocket as mcast
+import AcraNetwork.SamDec008 as samdec
+
+THIS_DIR = os.path.dirname(__file__)
+SYNC = struct.pack(">I", 0xFE6B2840)
+
+
+def pcm_frames(count, length=100):
+    words = bytes(i % 256 for i in range(length - 6))
+    return [SYNC + struct.pack(">H", i % 0x10000) + words for i in range(count)]
+
+
+def chunks(data, seed=1, maxsize=300):
+    rand = random.Random(seed)
+    position = 0
+    while position < len(data):
+        size = rand.randint(1, maxsize)
+        yield data[position : position + size]
+        position += size
+
+
+class FrameAlignerTest(unittest.TestCase):
+    def feed(self, aligner, segments):
+        return [bytes(frame) for segment in segments for frame in aligner.feed(segment)]
+
+    def test_alignment(self):
+        frames = pcm_frames(200)
+        # Starting part way through a frame. The buffer is small so the data is moved many times
+        data = b"\x00\x01" + b"".join(frames)
+        aligner = samdec.FrameAligner(SYNC, buffer_size=512)
+        self.assertEqual(self.feed(aligner, chunks(data)), frames)
+        self.assertEqual((aligner.frame_length, aligner.state, aligner.discarded), (100, aligner.LOCK, 2))
+        self.assertEqual((aligner.frames, aligner.sync_losses, len(aligner)), (200, 0, 0))
+
+    def test_flywheel(self):
+        frames = pcm_frames(20)
+        frames[5] = bytes(4) + frames[5][4:]
+        frames[10] = bytes(4) + frames[10][4:]
+        frames[11] = bytes(4) + frames[11][4:]
+        aligner = samdec.FrameAligner(SYNC, frame_length=100, flywheel=1)
+        received = self.feed(aligner, chunks(b"".join(frames), maxsize=150))
+        # The first corrupt frame is kept in lock. Two in a row lose the lock until the next sync word
+        self.assertEqual(received, frames[:11] + frames[12:])
+        self.assertEqual((aligner.flywheel_frames, aligner.sync_losses, aligner.discarded), (2, 1, 100))
+
+        aligner = samdec.FrameAligner(SYNC, frame_length=100, check=3, flywheel=0)
+        received = self.feed(aligner, [b"".join(frames)])
+        self.assertEqual(received, frames[:5] + frames[6:10] + frames[12:])
+        self.assertEqual(aligner.sync_losses, 2)
+
+    def test_reset_and_overflow(self):
+        frames = pcm_frames(10)
+        aligner = samdec.FrameAligner(SYNC, frame_length=100, buffer_size=256)
+        self.assertEqual(self.feed(aligner, [frames[0] + frames[1][:50]]), frames[:1])
+        aligner.reset()
+        self.assertEqual((aligner.state, aligner.discarded), (aligner.SEARCH, 50))
+        self.assertEqual(self.feed(aligner, [frames[1][50:], frames[2], frames[3]]), frames[2:4])
+        aligner.reset()
+        self.assertRaises(ValueError, lambda: list(aligner.feed(bytes(257))))
+
+        # The buffer is too small to hold the two sync words needed to measure the frame length
+        aligner = samdec.FrameAligner(SYNC, buffer_size=256)
+        self.assertEqual(self.feed(aligner, pcm_frames(3, 200)), [])
+        self.assertEqual((aligner.frame_length, aligner.discarded), (None, 400))
+        self.assertRaises(ValueError, samdec.FrameAligner, SYNC, 3)
+
+
+class SamDecTest(unittest.TestCase):
+    def test_pcap(self):
+        s = samdec.SamDecPcap(os.path.join(THIS_DIR, "sample_pcap/samdec.pcap"))
+        sfids = [struct.unpack_from(">IH", frame) for frame in s.frames()]
+        self.assertEqual(sfids, [(0xFE6B2840, sfid) for sfid in range(4, 8)])
+        self.assertEqual(s.frame_length, 1154)
+        s.close()
+
+    def test_udp(self):
+        s = samdec.SamDec008(0, timeout=0.2, localaddress="127.0.0.1")
+        tx = mcast.McastSocket()
+        frames = pcm_frames(50, 1154)
+        data = b"".join(frames)
+        p = inetx.iNetX()
+        p.streamid = s.streamid
+        for sequence, segment in enumerate(chunks(data, maxsize=1400)):
+            p.sequence = sequence
+            p.payload = bytes(samdec.PCM_HDR_LEN) + segment
+            if sequence != 21:  # Lost
+                tx.sendto(p.pack(), s.recv_sockets.getsockname())
+        p.streamid = 0x154
+        tx.sendto(p.pack(), s.recv_sockets.getsockname())
+        received = [bytes(frame) for frame in s.frames()]
+        # The frames in the lost packet and the partial frames around it are discarded
+        self.assertGreater(len(received), 40)
+        self.assertLess(len(received), 50)
+        self.assertEqual(received, [f for f in frames if f in received])
+        self.assertEqual(received[:10], frames[:10])
+        self.assertEqual(received[-5:], frames[-5:])
+        s.close()
+        tx.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
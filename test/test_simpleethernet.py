@@ -2,9 +2,11 @@ __author__ = "diarmuid"
 import sys
 import os.path
 import unittest
+from unittest import mock
 import AcraNetwork.SimpleEthernet as SimpleEthernet
 import AcraNetwork.Pcap as pcap
 import struct
+import socket
 import logging
 import tempfile
 import timeit
@@ -417,5 +419,430 @@ class EthernetManipulation(unittest.TestCase):
         timeit.timeit("unpack_pack(ref)", setup="import unpack_pack")
 
 
+class DissectTest(unittest.TestCase):
+    def test_matches_unpack(self):
+        count = 0
+        for fname in ("inetx_test.pcap", "iena_test.pcap", "ipv4frags.pcap", "test_input.pcap"):
+            with pcap.Pcap(os.path.join(THIS_DIR, fname), mmap=True) as p:
+                for r in p:
+                    view = SimpleEthernet.dissect(r.payload)
+                    e = SimpleEthernet.Ethernet()
+                    e.unpack(bytes(r.payload))
+                    for attr in ("srcmac", "dstmac", "type", "vlan", "vlantag"):
+                        self.assertEqual(getattr(view, attr), getattr(e, attr))
+                    self.assertEqual(bytes(view.payload), e.payload)
+                    if e.type != SimpleEthernet.Ethernet.TYPE_IP:
+                        self.assertIsNone(view.ip)
+                        continue
+                    i = SimpleEthernet.IP()
+                    i.unpack(e.payload, verify_checksum=False)
+                    for attr in ("srcip", "dstip", "len", "id", "flags", "fragment_offset", "protocol", "ttl"):
+                        self.assertEqual(getattr(view.ip, attr), getattr(i, attr))
+                    self.assertEqual(bytes(view.ip.payload), i.payload)
+                    if i.protocol != SimpleEthernet.IP.PROTOCOL_UDP or i.fragment_offset != 0:
+                        self.assertIsNone(view.udp)
+                        continue
+                    u = SimpleEthernet.UDP()
+                    u.unpack(i.payload)
+                    for attr in ("srcport", "dstport", "len"):
+                        self.assertEqual(getattr(view.udp, attr), getattr(u, attr))
+                    self.assertEqual(bytes(view.udp.payload), u.payload)
+                    self.assertIsInstance(view.udp.payload, memoryview)
+                    count += 1
+        self.assertGreater(count, 0)
+
+    def test_vlan_and_short(self):
+        u = SimpleEthernet.UDP()
+        u.srcport = 1000
+        u.dstport = 2000
+        u.payload = bytes(5)
+        i = SimpleEthernet.IP()
+        i.srcip = "192.168.1.2"
+        i.dstip = "235.0.0.3"
+        i.payload = u.pack()
+        e = SimpleEthernet.Ethernet()
+        e.vlan = True
+        e.vlantag = 0x123
+        e.srcmac = 0x001122334455
+        e.payload = i.pack() + bytes(10)  # padded
+        view = SimpleEthernet.dissect(e.pack())
+        self.assertEqual((view.vlan, view.vlantag, view.type), (True, 0x123, SimpleEthernet.Ethernet.TYPE_IP))
+        self.assertEqual(view.srcmac, 0x001122334455)
+        self.assertEqual(view.ip.dstip_int, 0xEB000003)
+        self.assertEqual(view.ip.srcip, "192.168.1.2")
+        self.assertEqual((view.udp.srcport, view.udp.dstport), (1000, 2000))
+        self.assertEqual(bytes(view.udp.payload), bytes(5))
+        self.assertRaises(ValueError, lambda: SimpleEthernet.dissect(bytes(10)))
+        self.assertRaises(ValueError, lambda: SimpleEthernet.dissect(e.pack()[:30]).ip)
+
+
+@unittest.skipUnless(SimpleEthernet._numpy_available, "numpy not installed")
+class BatchUnpackTest(unittest.TestCase):
+    def frames(self):
+        frames = []
+        for fname in ("inetx_test.pcap", "ipv4frags.pcap", "test_input.pcap"):
+            with pcap.Pcap(os.path.join(THIS_DIR, fname)) as p:
+                frames.extend(r.payload for r in p)
+        e = SimpleEthernet.Ethernet()
+        e.vlan = True
+        e.vlantag = 0x55
+        e.dstmac = 0xA0B0C0D0E0F0
+        e.payload = frames[0][14:]
+        frames.append(e.pack())
+        frames.append(frames[0][:30])
+        return frames
+
+    def test_matches_unpack(self):
+        frames = self.frames()
+        headers = SimpleEthernet.batch_unpack(frames)
+        self.assertEqual(len(headers), len(frames))
+        for row, frame in zip(headers, frames):
+            e = SimpleEthernet.Ethernet()
+            e.unpack(frame)
+            self.assertEqual(row["length"], len(frame))
+            for attr in ("dstmac", "srcmac", "vlan", "type"):
+                self.assertEqual(row[attr], getattr(e, attr))
+            if e.vlan:
+                self.assertEqual(row["vlantag"], e.vlantag)
+            if not row["ipv4"]:
+                self.assertTrue(e.type != SimpleEthernet.Ethernet.TYPE_IP or len(e.payload) < 20)
+                self.assertEqual((row["srcip"], row["udp"]), (0, False))
+                continue
+            i = SimpleEthernet.IP()
+            i.unpack(e.payload, verify_checksum=False)
+            self.assertEqual(row["srcip"], struct.unpack(">I", socket.inet_aton(i.srcip))[0])
+            self.assertEqual(row["dstip"], struct.unpack(">I", socket.inet_aton(i.dstip))[0])
+            for attr in ("protocol", "id", "flags", "fragment_offset", "ttl"):
+                self.assertEqual(row[attr], getattr(i, attr))
+            self.assertEqual(row["iplen"], i.len)
+            if not row["udp"]:
+                self.assertTrue(i.protocol != SimpleEthernet.IP.PROTOCOL_UDP or i.fragment_offset != 0)
+                continue
+            u = SimpleEthernet.UDP()
+            u.unpack(i.payload)
+            self.assertEqual((row["srcport"], row["dstport"], row["udplen"]), (u.srcport, u.dstport, u.len))
+        self.assertGreater(headers["udp"].sum(), 0)
+        self.assertGreater((headers["fragment_offset"] > 0).sum(), 0)
+
+    def test_from_buffer(self):
+        frames = self.frames()
+        buffer = b"".join(frames)
+        offsets = [sum(len(f) for f in frames[:i]) for i in range(len(frames))]
+        headers = SimpleEthernet.batch_unpack_from(buffer, offsets, [len(f) for f in frames])
+        self.assertTrue((headers == SimpleEthernet.batch_unpack(frames)).all())
+        fname = os.path.join(THIS_DIR, "inetx_test.pcap")
+        with pcap.Pcap(fname) as p:
+            records = p.to_arrays()
+        with open(fname, "rb") as f:
+            contents = f.read()
+        headers = SimpleEthernet.batch_unpack_from(
+            contents, records["offset"] + pcap.Pcap.RECORD_HEADER_SIZE, records["incl_len"]
+        )
+        self.assertTrue(headers["udp"].all())
+        self.assertEqual(len(SimpleEthernet.batch_unpack([])), 0)
+
+    def test_udp_checksum(self):
+        frames = self.frames()
+        e = SimpleEthernet.Ethernet()
+        i = SimpleEthernet.IP()
+        i.srcip, i.dstip = "192.168.1.1", "235.0.0.1"
+        u = SimpleEthernet.UDP()
+        u.srcport, u.dstport = 5000, 8010
+        for length in (0, 1, 7, 100, 1001):
+            template = SimpleEthernet.PacketTemplate(e, i, u, os.urandom(length), udp_checksum=True)
+            frames.append(bytes(template.buffer))
+            corrupt = bytearray(template.buffer)
+            corrupt[-1] ^= 0x10
+            frames.append(bytes(corrupt))
+        frames.append(bytes(template.buffer[:-1]))  # Truncated
+        # Several groups of segments
+        with mock.patch.object(SimpleEthernet, "_BATCH_CHECKSUM_BYTES", 600):
+            headers = SimpleEthernet.batch_unpack(frames)
+        for row, frame in zip(headers, frames):
+            if not row["udp"]:
+                self.assertFalse(row["udpchecksum_ok"])
+                continue
+            view = SimpleEthernet.dissect(frame)
+            segment = bytes(view.ip.payload)
+            expected = row["udplen"] <= len(segment) and SimpleEthernet.udp_verify_checksum(
+                view.ip.srcip, view.ip.dstip, segment[: row["udplen"]]
+            )
+            self.assertEqual(row["udpchecksum_ok"], expected)
+        self.assertEqual(headers["udpchecksum_ok"][-11:].tolist(), [True, False] * 5 + [False])
+
+
+class IPReassemblerTest(unittest.TestCase):
+    def fragments(self, payload, size, ident=1, srcip="192.168.1.1"):
+        fragments = []
+        for offset in range(0, len(payload), size):
+            i = SimpleEthernet.IP()
+            i.srcip = srcip
+            i.dstip = "235.0.0.1"
+            i.id = ident
+            i.fragment_offset = offset
+            i.payload = payload[offset : offset + size]
+            i.flags = SimpleEthernet.IP.FLAG_MORE_FRAGMENTS if offset + size < len(payload) else 0
+            fragments.append(i)
+        return fragments
+
+    def test_out_of_order(self):
+        payload = bytes(range(256)) * 32
+        reassembler = SimpleEthernet.IPReassembler()
+        fragments_a = self.fragments(payload, 1480, ident=1)
+        fragments_b = self.fragments(payload[::-1], 1480, ident=2)
+        combined = []
+        self.assertIsNone(reassembler.add(fragments_a[1], 0))
+        for a, b in zip(reversed(fragments_a), fragments_b):
+            for fragment in (a, b):  # Interleaved, with a retransmission of fragments_a[1]
+                result = reassembler.add(fragment, 0)
+                if result is not None:
+                    combined.append(result)
+        self.assertEqual([c.id for c in combined], [1, 2])
+        self.assertEqual([c.payload for c in combined], [payload, payload[::-1]])
+        self.assertEqual((combined[0].srcip, combined[0].flags, combined[0].fragment_offset), ("192.168.1.1", 0, 0))
+        self.assertEqual((len(reassembler), reassembler.dropped), (0, 0))
+        # Packets that are not fragments pass straight through
+        i = SimpleEthernet.IP()
+        self.assertIs(reassembler.add(i), i)
+
+    def test_overlap_and_holes(self):
+        reassembler = SimpleEthernet.IPReassembler(timeout=5)
+        fragments = self.fragments(bytes(4000), 1000)
+        overlapping = self.fragments(bytes(4000), 1000)[1]
+        overlapping.fragment_offset = 1496
+        self.assertIsNone(reassembler.add(fragments[0], 100))
+        self.assertIsNone(reassembler.add(overlapping, 100))
+        self.assertIsNone(reassembler.add(fragments[1], 100))
+        self.assertEqual(reassembler.dropped, 1)
+        # A hole is never completed and times out
+        reassembler.add(fragments[0], 101)
+        reassembler.add(fragments[3], 101)
+        self.assertEqual(len(reassembler), 1)
+        reassembler.expire(105)
+        self.assertEqual(len(reassembler), 1)
+        reassembler.expire(106.5)
+        self.assertEqual((len(reassembler), reassembler.dropped), (0, 2))
+
+    def test_memory_limit(self):
+        reassembler = SimpleEthernet.IPReassembler(max_bytes=10000)
+        for ident in range(10):
+            reassembler.add(self.fragments(bytes(6000), 3000, ident=ident)[0], 0)
+        self.assertEqual(len(reassembler), 3)
+        self.assertEqual(reassembler.dropped, 7)
+        last = self.fragments(bytes(6000), 3000, ident=9)[1]
+        self.assertEqual(len(reassembler.add(last, 0).payload), 6000)
+
+    def test_combine_incomplete(self):
+        fragments = self.fragments(bytes(3000), 1000)
+        self.assertEqual(len(SimpleEthernet.combine_ip_fragments(fragments[::-1]).payload), 3000)
+        self.assertRaises(ValueError, lambda: SimpleEthernet.combine_ip_fragments(fragments[:2]))
+
+
+class ChecksumTest(unittest.TestCase):
+    def reference_checksum(self, buf):
+        if len(buf) % 2:
+            buf += b"\0"
+        total = sum(struct.unpack(">{}H".format(len(buf) // 2), buf))
+        while total >> 16:
+            total = (total >> 16) + (total & 0xFFFF)
+        return ~total & 0xFFFF
+
+    def test_ip_checksum(self):
+        for buf in (b"", b"\x00\x00", b"\xff\xff", b"\xff\xff\xff\xff", b"\x12", bytes(range(255)), bytes(1500)):
+            self.assertEqual(SimpleEthernet.ip_calc_checksum(buf), self.reference_checksum(buf))
+            self.assertEqual(SimpleEthernet.ip_calc_checksum(memoryview(buf)), self.reference_checksum(buf))
+        i = SimpleEthernet.IP()
+        i.srcip = "192.168.1.1"
+        i.dstip = "235.0.0.1"
+        view = SimpleEthernet.IPView(i.pack())
+        self.assertTrue(view.checksum_ok)
+        corrupted = bytearray(i.pack())
+        corrupted[8] ^= 1
+        self.assertFalse(SimpleEthernet.IPView(corrupted).checksum_ok)
+
+    def test_udp_checksum(self):
+        u = SimpleEthernet.UDP()
+        u.srcport = 4400
+        u.dstport = 5500
+        u.payload = bytes(range(11))
+        for srcip, dstip in (("192.168.1.1", "235.0.0.1"), ("fe80::1", "ff02::1:2")):
+            segment = u.pack(srcip, dstip)
+            self.assertNotEqual(u.checksum, 0)
+            self.assertTrue(SimpleEthernet.udp_verify_checksum(srcip, dstip, segment))
+            self.assertFalse(SimpleEthernet.udp_verify_checksum(srcip, dstip, segment[:-1] + b"\xff"))
+            family = socket.AF_INET6 if ":" in srcip else socket.AF_INET
+            packed = (socket.inet_pton(family, srcip), socket.inet_pton(family, dstip))
+            self.assertTrue(SimpleEthernet.udp_verify_checksum(*packed, segment))
+            u2 = SimpleEthernet.UDP()
+            u2.unpack(segment)
+            self.assertEqual(u2.checksum, u.checksum)
+        # The IPv4 pseudo header matches a hand built one
+        segment = u.pack()
+        self.assertEqual(u.checksum, 0)
+        self.assertTrue(SimpleEthernet.udp_verify_checksum("1.2.3.4", "5.6.7.8", segment))
+        pseudo = socket.inet_aton("1.2.3.4") + socket.inet_aton("5.6.7.8") + struct.pack(">BBH", 0, 17, len(segment))
+        self.assertEqual(
+            SimpleEthernet.udp_calc_checksum("1.2.3.4", "5.6.7.8", segment), self.reference_checksum(pseudo + segment)
+        )
+
+    @unittest.skipUnless(SimpleEthernet._numpy_available, "numpy not installed")
+    def test_batch(self):
+        frames = []
+        with pcap.Pcap(os.path.join(THIS_DIR, "inetx_test.pcap")) as p:
+            frames.extend(bytes(r.payload) for r in p)
+        corrupted = bytearray(frames[0])
+        corrupted[14 + 8] ^= 0xFF
+        frames.append(bytes(corrupted))
+        headers = SimpleEthernet.batch_unpack(frames)
+        self.assertEqual(list(headers["ipchecksum_ok"]), [True] * (len(frames) - 1) + [False])
+
+
+class IPv6Test(unittest.TestCase):
+    SRCIP = 0xFE800000000000000000000000000001
+    DSTIP = 0xFF0200000000000000000000000100FB
+
+    def fragments(self, segment, size, ident=0x1234):
+        fragments = []
+        for offset in range(0, len(segment), size):
+            more = offset + size < len(segment)
+            i = SimpleEthernet.IPv6()
+            i.srcip = self.SRCIP
+            i.dstip = self.DSTIP
+            i.traffic_class = 0xB8
+            i.flow_label = 0x12345
+            i.extension_headers = [
+                (SimpleEthernet.IPv6.NEXT_HEADER_HOP_BY_HOP, struct.pack(">BB6x", 43, 0)),
+                (SimpleEthernet.IPv6.NEXT_HEADER_ROUTING, struct.pack(">BB6x8x", 44, 1)),
+                (SimpleEthernet.IPv6.NEXT_HEADER_FRAGMENT, struct.pack(">BxHI", 60, offset | more, ident)),
+                (SimpleEthernet.IPv6.NEXT_HEADER_DESTINATION_OPTIONS, struct.pack(">BB6x", 17, 0)),
+            ]
+            i.payload = segment[offset : offset + size]
+            fragments.append(i.pack())
+        return fragments
+
+    def frame(self, packet):
+        e = SimpleEthernet.Ethernet()
+        e.type = SimpleEthernet.Ethernet.TYPE_IPv6
+        e.payload = packet + bytes(4)  # padded
+        return e.pack()
+
+    def test_unpack(self):
+        u = SimpleEthernet.UDP()
+        u.srcport = 4000
+        u.dstport = 5000
+        u.payload = bytes(range(50))
+        i = SimpleEthernet.IPv6()
+        i.srcip = self.SRCIP
+        i.dstip = self.DSTIP
+        i.next_header = SimpleEthernet.IP.PROTOCOL_UDP
+        i.traffic_class = 0x2E
+        i.payload = u.pack(i.srcip_readable, i.dstip_readable)
+        packet = i.pack()
+        i2 = SimpleEthernet.IPv6(memoryview(packet + bytes(6)))
+        for attr in ("version", "traffic_class", "flow_label", "len", "srcip", "dstip", "hop_limit"):
+            self.assertEqual(getattr(i2, attr), getattr(i, attr))
+        self.assertEqual((i2.protocol, i2.extension_headers, i2.fragment_offset), (17, [], 0))
+        self.assertIsInstance(i2.payload, memoryview)
+        self.assertEqual(bytes(i2.payload), i.payload)
+        self.assertEqual(i2.dstip_readable, "ff02::1:fb")
+        self.assertTrue(SimpleEthernet.udp_verify_checksum(i2.srcip_readable, i2.dstip_readable, i2.payload))
+
+        view = SimpleEthernet.dissect(self.frame(packet))
+        self.assertIsNone(view.ip)
+        self.assertEqual((view.ipv6.srcip, view.ipv6.traffic_class, view.ipv6.protocol), ("fe80::1", 0x2E, 17))
+        self.assertEqual((view.udp.srcport, view.udp.dstport), (4000, 5000))
+        self.assertEqual(bytes(view.udp.payload), bytes(range(50)))
+        self.assertRaises(ValueError, lambda: SimpleEthernet.IPv6(packet[:30]))
+
+    def test_extension_headers_and_reassembly(self):
+        u = SimpleEthernet.UDP()
+        u.srcport = 4000
+        u.dstport = 5000
+        u.payload = bytes(range(256)) * 12
+        segment = u.pack()
+        fragments = self.fragments(segment, 1232)
+        self.assertEqual(len(fragments), 3)
+        reassembler = SimpleEthernet.IPReassembler()
+        results = []
+        for packet in reversed(fragments):
+            i = SimpleEthernet.IPv6(packet)
+            self.assertEqual([t for (t, raw) in i.extension_headers], [0, 43, 44, 60])
+            self.assertEqual((i.protocol, i.id, i.flow_label, i.traffic_class), (17, 0x1234, 0x12345, 0xB8))
+            view = SimpleEthernet.dissect(self.frame(packet)).ipv6
+            for attr in ("protocol", "fragment_offset", "flags", "id", "len"):
+                self.assertEqual(getattr(view, attr), getattr(i, attr))
+            self.assertEqual(bytes(view.payload), bytes(i.payload))
+            self.assertEqual(
+                [bytes(raw) for (t, raw) in view.extension_headers], [raw for (t, raw) in i.extension_headers]
+            )
+            self.assertEqual(view.udp is not None, i.fragment_offset == 0)
+            results.append(reassembler.add(i, 0))
+        self.assertEqual(results[:2], [None, None])
+        combined = results[2]
+        self.assertIsInstance(combined, SimpleEthernet.IPv6)
+        self.assertEqual((combined.srcip, combined.protocol, combined.id), (self.SRCIP, 17, 0x1234))
+        self.assertEqual(combined.payload, segment)
+        combined2 = SimpleEthernet.IPv6(combined.pack())
+        self.assertEqual((combined2.protocol, bytes(combined2.payload)), (17, segment))
+
+
+class PacketTemplateTest(unittest.TestCase):
+    def headers(self, vlan=False):
+        e = SimpleEthernet.Ethernet()
+        e.srcmac = 0x001122334455
+        e.dstmac = 0x01005E000001
+        if vlan:
+            e.vlan = True
+            e.vlantag = 10
+        i = SimpleEthernet.IP()
+        i.srcip = "192.168.1.1"
+        i.dstip = "235.0.0.1"
+        u = SimpleEthernet.UDP()
+        u.srcport = 5000
+        u.dstport = 8010
+        return e, i, u
+
+    def pack(self, payload, vlan=False, udp_checksum=False, ident=None):
+        (e, i, u) = self.headers(vlan)
+        if ident is not None:
+            i.id = ident
+        u.payload = payload
+        i.payload = u.pack(i.srcip, i.dstip) if udp_checksum else u.pack()
+        e.payload = i.pack()
+        return e.pack()
+
+    def test_matches_pack(self):
+        for vlan in (False, True):
+            for udp_checksum in (False, True):
+                template = SimpleEthernet.PacketTemplate(*self.headers(vlan), bytes(range(45)), udp_checksum)
+                self.assertEqual(template.buffer, self.pack(bytes(range(45)), vlan, udp_checksum))
+                self.assertEqual(bytes(template.payload), bytes(range(45)))
+                template.set_payload(b"\xff" * 100)
+                self.assertEqual(template.buffer, self.pack(b"\xff" * 100, vlan, udp_checksum))
+
+    def test_patch(self):
+        payload = bytearray(os.urandom(101))
+        template = SimpleEthernet.PacketTemplate(*self.headers(), payload, udp_checksum=True)
+        for sequence in (1, 0xFFFF, 0x12345678, 0, 0xFFFFFFFF):
+            for offset in (0, 7, 8, 97, 100):
+                fmt = ">B" if offset == 100 else ">I"
+                value = sequence & 0xFF if offset == 100 else sequence
+                template.patch(offset, fmt, value)
+                struct.pack_into(fmt, payload, offset, value)
+                self.assertEqual(template.buffer, self.pack(bytes(payload), udp_checksum=True))
+                i = SimpleEthernet.IP(bytes(template.buffer[14:]))
+                self.assertTrue(SimpleEthernet.udp_verify_checksum(i.srcip, i.dstip, i.payload))
+        template.patch(16, ">II", 1700000000, 999)
+        struct.pack_into(">II", payload, 16, 1700000000, 999)
+        self.assertEqual(template.buffer, self.pack(bytes(payload), udp_checksum=True))
+
+    def test_set_ip_id(self):
+        template = SimpleEthernet.PacketTemplate(*self.headers(vlan=True), bytes(20))
+        for ident in (1, 0xFFFF, 0x8000, 0):
+            template.set_ip_id(ident)
+            self.assertEqual(template.buffer, self.pack(bytes(20), vlan=True, ident=ident))
+            self.assertTrue(SimpleEthernet.dissect(template.buffer).ip.checksum_ok)
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,282 @@
+__author__ = "diarmuid"
+import sys
+
+sys.path.append("..")
+import os
+import random
+import tempfile
+import unittest
+import AcraNetwork.iNetX as inetx
+import AcraNetwork.Pcap as pcap
+import AcraNetwork.SimpleEthernet as SimpleEthernet
+import AcraNetwork.StreamStatistics as streamstatistics
+from AcraNetwork.PcapParallel import parallel_reduce
+
+THIS_DIR = os.path.dirname(__file__)
+
+try:
+    import numpy
+except ImportError:
+    _numpy_available = False
+else:
+    _numpy_available = True
+
+
+def random_packets(count, seed=1, reorders=True):
+    """
+    Packets of 3 streams with losses, reorders, duplicates, restarts and a sequence number rollover. reorders also
+    adds late duplicates, of a packet a few before the last of the stream
+    """
+    rand = random.Random(seed)
+    sequences = {1: 0, 2: 0xFFFFFF00, 3: 500}
+    recent = {1: [], 2: [], 3: []}
+    packets = []
+    arrival = 1_700_000_000_000_000_000
+    for i in range(count):
+        streamid = rand.choice(list(sequences))
+        event = rand.random()
+        if event < 0.05:
+            sequences[streamid] += rand.randint(2, 5)  # Lost packets
+        elif event < 0.06:
+            sequences[streamid] -= rand.randint(5000, 100000)  # Restart
+            recent[streamid] = []
+        else:
+            sequences[streamid] += 1
+        sequences[streamid] %= 1 << 32
+        arrival += rand.randint(10_000, 20_000)
+        ptptime = arrival - rand.randint(1_000, 5_000) if streamid != 3 else None
+        packet = [streamid, sequences[streamid], rand.randint(64, 1500), arrival, ptptime]
+        if event > 0.98 and reorders:
+            # Swapped with the next packet of the stream
+            sequences[streamid] = (sequences[streamid] + 1) % (1 << 32)
+            packets.append([streamid, sequences[streamid], packet[2], arrival, ptptime])
+        packets.append(packet)
+        if 0.97 < event < 0.98:
+            packets.append(list(packet))  # Duplicate
+        recent[streamid] = recent[streamid][-4:] + [packet]
+        if 0.96 < event < 0.97 and reorders and len(recent[streamid]) == 5:
+            packets.append(list(recent[streamid][0]))  # Late duplicate
+    return packets
+
+
+def add_packets(stats, packets):
+    for packet in packets:
+        stats.add(*packet)
+
+
+def add_batch(stats, packets):
+    ptptimes = [streamstatistics._NO_LATENCY if p[4] is None else p[4] for p in packets]
+    columns = list(zip(*packets))
+    stats.add_batch(*[numpy.array(c, dtype=numpy.int64) for c in columns[:4]], numpy.array(ptptimes))
+
+
+class StreamStatisticsTest(unittest.TestCase):
+    def assertSummariesEqual(self, first, second):
+        self.assertEqual(first.streamids, second.streamids)
+        for a, b in zip(first.summaries(), second.summaries()):
+            self.assertEqual(a[:-4], b[:-4])
+            for x, y in zip(a[-4:], b[-4:]):
+                if x is None:
+                    self.assertIsNone(y)
+                else:
+                    self.assertAlmostEqual(x, y, delta=abs(x) * 1e-9)
+
+    def test_sequences(self):
+        stats = streamstatistics.StreamStatistics(reorder_window=10)
+        for sequence in (10, 11, 14, 13, 14, 15, 0xFFFFFFFF, 0, 3, 1):
+            stats.add(0xDC, sequence, 100, 1000)
+        s = stats.summary(0xDC)
+        self.assertEqual((s.packets, s.bytes, s.reorders, s.duplicates, s.restarts), (10, 1000, 2, 1, 1))
+        # 12 is lost. 2 is lost after the rollover
+        self.assertEqual(s.lost, 2)
+        self.assertIsNone(s.latency_mean)
+        self.assertRaises(KeyError, stats.summary, 0xDD)
+
+    def test_late_duplicates(self):
+        for sequences, expected in (
+            ((1, 2, 3, 2), (0, 0, 1)),
+            ((1, 3, 2, 2, 1), (0, 1, 2)),
+            ((1, 4, 2, 3, 3, 2), (0, 2, 2)),
+            ((10, 20, 15, 15, 31), (18, 1, 1)),
+            # Packets from before the first were never counted as lost
+            ((5, 3, 4, 7), (1, 2, 0)),
+        ):
+            stats = streamstatistics.StreamStatistics(reorder_window=10)
+            add_packets(stats, [(1, sequence, 100, 1000) for sequence in sequences])
+            s = stats.summary(1)
+            self.assertEqual((s.lost, s.reorders, s.duplicates), expected, sequences)
+            if _numpy_available:
+                batch = streamstatistics.StreamStatistics(reorder_window=10)
+                add_batch(batch, [(1, sequence, 100, 1000, None) for sequence in sequences])
+                self.assertSummariesEqual(stats, batch)
+
+    def test_latency(self):
+        stats = streamstatistics.StreamStatistics()
+        for i, latency in enumerate((1000, 1200, 900, 1000)):
+            stats.add(1, i, 100, 2_000_000_000 + i * 1_000_000_000, 2_000_000_000 + i * 1_000_000_000 - latency)
+        s = stats.summary(1)
+        self.assertEqual((s.latency_min, s.latency_mean, s.latency_max), (900, 1025, 1200))
+        jitter = 0.0
+        for d in (200, 300, 100):
+            jitter += (d - jitter) / 16
+        self.assertAlmostEqual(s.jitter, jitter)
+        self.assertEqual((s.duration, s.pps, s.bitrate), (3.0, 4 / 3, 3200 / 3))
+
+    def test_socket_payloads(self):
+        stats = streamstatistics.StreamStatistics()
+        p = inetx.iNetX()
+        p.streamid = 0xDC
+        p.payload = bytes(10)
+        for sequence in (1, 2, 4):
+            p.sequence = sequence
+            (p.ptptimeseconds, p.ptptimenanoseconds) = (100, 500)
+            self.assertTrue(stats.add_inetx(p.pack(), 100_000_001_000))
+        self.assertFalse(stats.add_inetx(b"short"))
+        p.inetxcontrol = 0x12000000
+        self.assertFalse(stats.add_inetx(p.pack()))
+        s = stats.summary(0xDC)
+        self.assertEqual((s.packets, s.bytes, s.lost, s.latency_max, stats.ignored), (3, 114, 1, 500, 2))
+
+    def test_pcap_records(self):
+        stats = streamstatistics.StreamStatistics()
+        with pcap.Pcap(os.path.join(THIS_DIR, "inetx_test.pcap")) as p:
+            records = list(p)
+        for r in records:
+            stats.update(r)
+        # The same packet with a VLAN tag, read through the slower path
+        e = SimpleEthernet.Ethernet(records[-1].payload)
+        e.vlan = True
+        e.vlantag = 5
+        r = pcap.PcapRecord()
+        (r.sec, r.nsec, r.payload) = (records[-1].sec + 1, 0, e.pack())
+        stats.update(r)
+        r.payload = bytes(20)
+        stats.update(r)
+        s = stats.summary(0xCA)
+        self.assertEqual((s.packets, s.lost, s.duplicates, stats.ignored), (11, 0, 1, 1))
+
+        # The bytes are the UDP payloads, the same as when the packets are received on a socket
+        from_socket = streamstatistics.StreamStatistics()
+        for r in records:
+            from_socket.add_inetx(r.payload[42:], r.sec * 1_000_000_000 + r.nsec)
+        expected = streamstatistics.StreamStatistics()
+        for r in records:
+            expected.update(r)
+        self.assertSummariesEqual(expected, from_socket)
+        self.assertEqual(from_socket.summary(0xCA).bytes, sum(len(r.payload) - 42 for r in records))
+
+    @unittest.skipUnless(_numpy_available, "numpy not installed")
+    def test_batch_matches_packets(self):
+        packets = random_packets(5000)
+        expected = streamstatistics.StreamStatistics(reorder_window=200)
+        add_packets(expected, packets)
+        batch = streamstatistics.StreamStatistics(reorder_window=200)
+        add_batch(batch, packets)
+        self.assertSummariesEqual(expected, batch)
+        self.assertGreater(expected.summary(1).restarts, 0)
+        self.assertGreater(expected.summary(2).reorders, 0)
+
+        # In several batches, and mixed with single packets
+        batches = streamstatistics.StreamStatistics(reorder_window=200)
+        for start in range(0, len(packets), 700):
+            add_batch(batches, packets[start : start + 350])
+            add_packets(batches, packets[start + 350 : start + 700])
+        self.assertSummariesEqual(expected, batches)
+
+    @unittest.skipUnless(_numpy_available, "numpy not installed")
+    def test_arrays(self):
+        expected = streamstatistics.StreamStatistics()
+        stats = streamstatistics.StreamStatistics()
+        with pcap.Pcap(os.path.join(THIS_DIR, "inetx_test.pcap")) as p:
+            for r in p:
+                expected.update(r)
+            stats.add_arrays(p.to_arrays(pcap.INETX_FIELDS))
+        self.assertSummariesEqual(expected, stats)
+
+    def assertMergeEqual(self, packets, splits, reorder_window=1024):
+        expected = streamstatistics.StreamStatistics(reorder_window=reorder_window)
+        add_packets(expected, packets)
+        merged = streamstatistics.StreamStatistics(reorder_window=reorder_window)
+        for i, (start, end) in enumerate(zip([0] + splits, splits + [len(packets)])):
+            chunk = streamstatistics.StreamStatistics(reorder_window=reorder_window)
+            if i % 2 and _numpy_available:
+                add_batch(chunk, packets[start:end])
+            else:
+                add_packets(chunk, packets[start:end])
+            merged.merge(chunk)
+        self.assertSummariesEqual(expected, merged)
+
+    def test_merge(self):
+        for sequences, split in (([1, 2, 3, 4, 5, 3, 6], 4), ([1, 2, 3, 5, 4, 6, 7], 4)):
+            self.assertMergeEqual([(1, sequence, 100, 1000, None) for sequence in sequences], [split])
+        rand = random.Random(1)
+        for seed in range(20):
+            packets = random_packets(2000, seed=seed)
+            splits = sorted(rand.sample(range(1, len(packets)), rand.randint(1, 10)))
+            self.assertMergeEqual(packets, splits, reorder_window=200)
+
+    def test_merge_small_window(self):
+        # Reorders, duplicates and restarts of one stream within a few packets of the boundaries
+        rand = random.Random(2)
+        for _trial in range(200):
+            window = rand.choice((3, 10))
+            sequence = 100
+            packets = []
+            for arrival in range(rand.randint(2, 100)):
+                event = rand.random()
+                if event < 0.6:
+                    sequence += rand.choice((1, 1, 1, 2, 3))
+                    packets.append((1, sequence, 100, arrival, None))
+                elif event < 0.95:
+                    packets.append((1, sequence - rand.randint(0, window + 2), 100, arrival, None))
+                else:
+                    sequence -= rand.randint(window + 1, 3 * window)
+                    packets.append((1, sequence, 100, arrival, None))
+            splits = sorted(rand.sample(range(1, len(packets)), min(len(packets) - 1, rand.randint(1, 5))))
+            self.assertMergeEqual(packets, splits, reorder_window=window)
+
+    def test_parallel_reduce(self):
+        filename = os.path.join(THIS_DIR, "inetx_test.pcap")
+        stats = parallel_reduce(filename, streamstatistics.StreamStatistics, workers=2)
+        expected = streamstatistics.StreamStatistics()
+        with pcap.Pcap(filename) as p:
+            for r in p:
+                expected.update(r)
+        self.assertSummariesEqual(expected, stats)
+
+    def test_parallel_reduce_reorders(self):
+        # Small chunks, so that there are reorders and duplicates close to many of the partition points
+        filename = os.path.join(tempfile.gettempdir(), "_streamstatistics.pcap")
+        e = SimpleEthernet.Ethernet()
+        e.type = SimpleEthernet.Ethernet.TYPE_IP
+        i = SimpleEthernet.IP()
+        (i.srcip, i.dstip) = ("192.168.1.1", "235.0.0.1")
+        u = SimpleEthernet.UDP()
+        (u.srcport, u.dstport) = (5000, 8010)
+        pkt = inetx.iNetX()
+        with pcap.Pcap(filename, mode="w", nanosecond=True) as p:
+            for streamid, sequence, size, arrival, ptptime in random_packets(3000, seed=3):
+                (pkt.streamid, pkt.sequence, pkt.payload) = (streamid, sequence, bytes(size))
+                (pkt.ptptimeseconds, pkt.ptptimenanoseconds) = divmod(ptptime or 0, 1_000_000_000)
+                u.payload = pkt.pack()
+                i.payload = u.pack()
+                e.payload = i.pack()
+                p.write_raw_ns(arrival // 1_000_000_000, arrival % 1_000_000_000, e.pack())
+        try:
+            expected = streamstatistics.StreamStatistics()
+            with pcap.Pcap(filename) as p:
+                for r in p:
+                    expected.update(r)
+            self.assertGreater(sum(s.reorders for s in expected.summaries()), 50)
+            self.assertGreater(sum(s.duplicates for s in expected.summaries()), 50)
+            for workers, chunks_per_worker in ((1, 1), (2, 3), (3, 40)):
+                stats = parallel_reduce(
+                    filename, streamstatistics.StreamStatistics, workers=workers, chunks_per_worker=chunks_per_worker
+                )
+                self.assertSummariesEqual(expected, stats)
+        finally:
+            os.unlink(filename)
+
+
+if __name__ == "__main__":
+    unittest.main()